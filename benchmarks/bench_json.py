@@ -0,0 +1,97 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+Benchmark of the JSON encoding of getInteractions responses
+
+Compares encoding the list of interactions as dicts with the standard library
+json module, the same dicts with orjson (when it is installed) and encoding
+straight from the columns.
+
+.. code-block:: none
+   :linenos:
+
+   python benchmarks/bench_json.py --interactions 1000000
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bench_links import synthetic_columns  # pylint: disable=wrong-import-position
+from rest.serializers import AdjacencyJSONEncoder, iter_values_json  # pylint: disable=wrong-import-position
+from rest.serializers import json_dumps, orjson  # pylint: disable=wrong-import-position
+
+
+def encode_stdlib(values):
+    """
+    The encoding used before the columnar encoder
+    """
+    return json.dumps(values.records(), cls=AdjacencyJSONEncoder).encode('utf-8')
+
+
+def encode_orjson(values):
+    """
+    Dicts for each interaction encoded with orjson
+    """
+    return json_dumps(values.records())
+
+
+def encode_columns(values):
+    """
+    Encoded straight from the columns
+    """
+    return b''.join(iter_values_json(values))
+
+
+def main():
+    """
+    Run the benchmark and print the size and time for each encoder
+    """
+    parser = argparse.ArgumentParser(description='JSON encoding benchmark')
+    parser.add_argument('--interactions', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    values = synthetic_columns(args.interactions)
+    encoders = [('stdlib_records', encode_stdlib)]
+    if orjson is not None:
+        encoders.append(('orjson_records', encode_orjson))
+    encoders.append(('columns', encode_columns))
+
+    expected = json.loads(encode_stdlib(values))
+    results = {}
+    for name, encoder in encoders:
+        body = encoder(values)
+        assert json.loads(body) == expected
+        seconds = min(timeit.repeat(
+            lambda e=encoder: e(values), number=1, repeat=args.repeat))
+        results[name] = seconds
+        print('{0:15s} {1:12d} bytes {2:8.3f} s'.format(name, len(body), seconds))
+
+    for name, seconds in results.items():
+        if name != 'stdlib_records':
+            print('{0:15s} {1:5.1f}x faster than stdlib_records'.format(
+                name, results['stdlib_records'] / seconds))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+Benchmark of the cost of per interaction getValue links
+
+Compares the JSON body for a set of interactions with a link on every row
+against the default of a single URI template for the response.
+
+.. code-block:: none
+   :linenos:
+
+   python benchmarks/bench_links.py --interactions 200000
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from rest.columnar import InteractionColumns  # pylint: disable=wrong-import-position
+from rest.serializers import AdjacencyJSONEncoder  # pylint: disable=wrong-import-position
+
+VALUE_URL = 'http://localhost:5002/mug/api/adjacency/getValue?file_id=test_file&res=10000'
+
+
+def synthetic_columns(count, seed=0):
+    """
+    Random interactions for chr1 against the whole of a 3 chromosome genome
+    """
+    random = np.random.RandomState(seed)
+    pos_x = np.sort(random.randint(0, 25000, size=count))
+    pos_y = random.randint(0, 75000, size=count)
+    chr_b = pos_y // 25000
+    return InteractionColumns(
+        ['chr1', 'chr2', 'chr3'],
+        np.zeros(count, dtype=np.int32), pos_x * 10000,
+        chr_b, (pos_y % 25000) * 10000,
+        random.randint(1, 100, size=count), pos_x, pos_y)
+
+
+def encode(values, link_base, template):
+    """
+    Encode a getInteractions style response
+    """
+    values.link_base = link_base
+    links = {'_self': 'http://localhost:5002/mug/api/adjacency/getInteractions'}
+    if template:
+        links['_getValue'] = VALUE_URL + '&pos_x={pos_x}&pos_y={pos_y}'
+    return json.dumps(
+        {'_links': links, 'interaction_count': len(values), 'values': values},
+        cls=AdjacencyJSONEncoder)
+
+
+def main():
+    """
+    Run the benchmark and print the size and time for both modes
+    """
+    parser = argparse.ArgumentParser(description='Per row link benchmark')
+    parser.add_argument('--interactions', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    values = synthetic_columns(args.interactions)
+    results = {}
+    for name, link_base, template in (
+            ('per_row_links', VALUE_URL, False), ('uri_template', None, True)):
+        body = encode(values, link_base, template)
+        seconds = min(timeit.repeat(
+            lambda lb=link_base, t=template: encode(values, lb, t),
+            number=1, repeat=args.repeat))
+        results[name] = (len(body), seconds)
+        print('{0:14s} {1:12d} bytes {2:8.3f} s'.format(name, len(body), seconds))
+
+    rows, template = results['per_row_links'], results['uri_template']
+    print('Saved {0:.1f}% of the bytes and {1:.1f}% of the encoding time'.format(
+        100.0 * (rows[0] - template[0]) / rows[0],
+        100.0 * (rows[1] - template[1]) / rows[1]))
+
+
+if __name__ == '__main__':
+    main()
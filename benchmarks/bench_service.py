@@ -0,0 +1,319 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+Benchmark of the service against a synthetic adjacency file
+
+Drives details, getInteractions (JSON with the URI template, JSON with per
+interaction links and TSV) and getValue through the Flask test client and
+through a waitress server, and reports the throughput, the p50 and p99
+latencies and the peak RSS of the process for each. The synthetic file is
+written with rest.synthetic when it does not exist yet, so runs with the same
+parameters are reproducible. The results can be saved as a baseline that later
+runs are compared against.
+
+.. code-block:: none
+   :linenos:
+
+   python benchmarks/bench_service.py --save-baseline baseline.json
+   python benchmarks/bench_service.py --baseline baseline.json
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from rest.chrom_index import ChromosomeIndex  # pylint: disable=wrong-import-position
+from rest.synthetic import SyntheticAdjacency  # pylint: disable=wrong-import-position
+from rest.synthetic import synthetic_chromosomes, write_synthetic  # pylint: disable=wrong-import-position
+
+FILE_ID = 'synthetic'
+
+HEADERS = {'Authorization': 'Bearer teststring'}
+
+# Metrics where a larger value is better, the rest are better when smaller
+HIGHER_IS_BETTER = ('throughput',)
+
+
+def prepare_fixture(args):
+    """
+    Write the synthetic file for the parameters unless it already exists
+
+    Returns
+    -------
+    tuple
+        (path, chromosomes)
+    """
+    chromosomes = synthetic_chromosomes(args.genome_size, args.chromosomes)
+    path = args.fixture or os.path.join(
+        tempfile.gettempdir(), 'mg-rest-adjacency-bench-{0}-{1}-{2}-{3}-{4}.hdf5'.format(
+            args.genome_size, args.chromosomes, args.resolution, args.density, args.seed))
+    if not os.path.isfile(path):
+        print('Writing', path)
+        write_synthetic(path, chromosomes, [args.resolution], args.density, args.seed)
+    return path, chromosomes
+
+
+def build_cases(chromosomes, resolution, window, count, seed=0):
+    """
+    Requests for each case, spread over random windows of the genome
+
+    Returns
+    -------
+    list
+        List of (case name, list of (url, headers)) pairs
+    """
+    random = np.random.RandomState(seed)
+    index = ChromosomeIndex(chromosomes, resolution)
+    base = '/mug/api/adjacency/'
+
+    regions = []
+    for _ in range(count):
+        code = random.randint(len(chromosomes))
+        chr_id, length = chromosomes[code]
+        start = int(random.randint(0, max(length - window, 1)))
+        regions.append((chr_id, start, start + window))
+    interactions = [
+        '{0}getInteractions?file_id={1}&chr={2}&start={3}&end={4}&res={5}'.format(
+            base, FILE_ID, chr_id, start, end, resolution)
+        for chr_id, start, end in regions
+    ]
+
+    pos_x = random.randint(0, index.bin_count, size=count)
+    pos_y = random.randint(0, index.bin_count, size=count)
+    json_headers = dict(HEADERS, Accept='application/json')
+    tsv_headers = dict(HEADERS, Accept='application/tsv')
+    return [
+        ('details', [(base + 'details?file_id=' + FILE_ID, json_headers)] * count),
+        ('interactions_json', [(url, json_headers) for url in interactions]),
+        ('interactions_json_links', [(url + '&links=1', json_headers) for url in interactions]),
+        ('interactions_tsv', [(url, tsv_headers) for url in interactions]),
+        ('value', [
+            ('{0}getValue?file_id={1}&res={2}&pos_x={3}&pos_y={4}'.format(
+                base, FILE_ID, resolution, x, y), json_headers)
+            for x, y in zip(pos_x.tolist(), pos_y.tolist())
+        ])
+    ]
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of the process in MB
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and in kB elsewhere
+    return peak / (1024.0 * 1024.0) if sys.platform == 'darwin' else peak / 1024.0
+
+
+def summarise(latencies, elapsed, errors):
+    """
+    Throughput and latency percentiles for a case
+
+    Parameters
+    ----------
+    latencies : list
+        Seconds taken by each request
+    elapsed : float
+        Wall clock seconds for all of the requests
+    errors : int
+        Number of requests that did not return 200
+
+    Returns
+    -------
+    dict
+    """
+    latencies = np.asarray(latencies, dtype=np.float64)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput': len(latencies) / elapsed if elapsed > 0 else 0.0,
+        'p50_ms': float(np.percentile(latencies, 50)) * 1000.0,
+        'p99_ms': float(np.percentile(latencies, 99)) * 1000.0,
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+def run_test_client(flask_app, requests):
+    """
+    Send requests one at a time through the Flask test client
+    """
+    client = flask_app.test_client()
+    latencies = []
+    errors = 0
+    started = time.perf_counter()
+    for url, headers in requests:
+        request_started = time.perf_counter()
+        response = client.get(url, headers=headers)
+        response.get_data()
+        latencies.append(time.perf_counter() - request_started)
+        errors += response.status_code != 200
+    return summarise(latencies, time.perf_counter() - started, errors)
+
+
+def run_http(port, requests, concurrency):
+    """
+    Send requests over HTTP with a number of concurrent keep-alive
+    connections
+    """
+    local = threading.local()
+
+    def send(request):
+        """
+        Send one request, returning (seconds, status)
+        """
+        if getattr(local, 'connection', None) is None:
+            local.connection = HTTPConnection('127.0.0.1', port, timeout=300)
+        url, headers = request
+        request_started = time.perf_counter()
+        local.connection.request('GET', url, headers=headers)
+        response = local.connection.getresponse()
+        response.read()
+        return time.perf_counter() - request_started, response.status
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(send, requests))
+    elapsed = time.perf_counter() - started
+    return summarise(
+        [r[0] for r in results], elapsed, sum(1 for r in results if r[1] != 200))
+
+
+def start_waitress(flask_app, threads):
+    """
+    Serve the app with waitress on a free local port in a background thread
+
+    Returns
+    -------
+    tuple
+        (server, port)
+    """
+    from waitress.server import create_server
+    server = create_server(flask_app, host='127.0.0.1', port=0, threads=threads)
+    thread = threading.Thread(target=server.run)
+    thread.daemon = True
+    thread.start()
+    return server, server.effective_port
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compare results with a baseline
+
+    Returns
+    -------
+    list
+        List of (case, metric, baseline, current, relative change, regressed)
+        tuples. A metric has regressed when it is worse than the baseline by
+        more than the tolerance
+    """
+    rows = []
+    for case, metrics in sorted(results.items()):
+        if case not in baseline:
+            continue
+        for metric in ('throughput', 'p50_ms', 'p99_ms', 'peak_rss_mb'):
+            before = baseline[case].get(metric)
+            after = metrics.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            rows.append((case, metric, before, after, change, worse > tolerance))
+    return rows
+
+
+def main():
+    """
+    Run the benchmark and print a table of the results
+    """
+    parser = argparse.ArgumentParser(description='Service benchmark on synthetic data')
+    parser.add_argument('--fixture', help='Synthetic file, written if it does not exist')
+    parser.add_argument('--genome-size', type=int, default=100000000)
+    parser.add_argument('--chromosomes', type=int, default=3)
+    parser.add_argument('--resolution', type=int, default=10000)
+    parser.add_argument('--density', type=float, default=0.01)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--window', type=int, default=1000000, help='Size of the regions in bp')
+    parser.add_argument('--requests', type=int, default=200, help='Requests for each case')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent HTTP connections')
+    parser.add_argument(
+        '--server', choices=('client', 'waitress', 'both'), default='both',
+        help='Flask test client, waitress or both')
+    parser.add_argument('--baseline', help='Compare with the results in this file')
+    parser.add_argument('--save-baseline', help='Save the results to this file')
+    parser.add_argument(
+        '--tolerance', type=float, default=0.1,
+        help='Relative change beyond which a metric is reported as a regression')
+    args = parser.parse_args()
+
+    path, chromosomes = prepare_fixture(args)
+
+    from rest import app  # pylint: disable=import-outside-toplevel
+    app.APP.config['TESTING'] = True
+    app.use_reader(
+        lambda user_id, file_id, resolution=None: SyntheticAdjacency(path, resolution),
+        lambda user_id, file_id: path)
+
+    cases = build_cases(chromosomes, args.resolution, args.window, args.requests, args.seed)
+    results = {}
+    if args.server in ('client', 'both'):
+        for name, requests in cases:
+            results['client_' + name] = run_test_client(app.APP, requests)
+    if args.server in ('waitress', 'both'):
+        server, port = start_waitress(app.APP, args.concurrency)
+        try:
+            for name, requests in cases:
+                results['waitress_' + name] = run_http(port, requests, args.concurrency)
+        finally:
+            server.close()
+
+    print('{0:32s} {1:>10s} {2:>10s} {3:>10s} {4:>10s} {5:>7s}'.format(
+        'case', 'req/s', 'p50 ms', 'p99 ms', 'rss MB', 'errors'))
+    for case, metrics in sorted(results.items()):
+        print('{0:32s} {1:10.1f} {2:10.2f} {3:10.2f} {4:10.1f} {5:7d}'.format(
+            case, metrics['throughput'], metrics['p50_ms'], metrics['p99_ms'],
+            metrics['peak_rss_mb'], metrics['errors']))
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)['results']
+        print()
+        for case, metric, before, after, change, regressed in compare(
+                results, baseline, args.tolerance):
+            print('{0:32s} {1:12s} {2:10.2f} -> {3:10.2f} {4:+7.1f}% {5}'.format(
+                case, metric, before, after, 100.0 * change, 'REGRESSION' if regressed else ''))
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as baseline_file:
+            json.dump(
+                {'parameters': vars(args), 'results': results},
+                baseline_file, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,413 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+Load test of the service with many concurrent clients
+
+Replays an access log of getInteractions and getValue calls against the
+service. The log is either recorded, any file with one request path per line
+such as a web server access log, or synthetic, in which case the requests are
+concentrated on a few hot regions so that concurrent clients hit overlapping
+parts of the matrix. Without --url the service is started with waitress in
+this process against a synthetic file, see bench_service.py.
+
+The test has two phases:
+
+1. Saturation, where --concurrency clients send requests back to back to find
+   the highest throughput the service sustains.
+2. Replay at --rate requests per second. The requests are sent on schedule
+   whether or not the earlier ones have finished and the latency is measured
+   from the scheduled time, so queueing in the service shows up in the tail
+   latency.
+
+The run fails, with exit status 1, when the report exceeds the regression
+budget given with --budget, a JSON file with any of:
+
+.. code-block:: none
+   :linenos:
+
+   {
+       "max_error_rate": 0.001,
+       "max_p99_ms": 500,
+       "min_saturation_throughput": 200,
+       "max_p99_regression": 0.2,
+       "max_throughput_regression": 0.1
+   }
+
+The regression limits are relative to the report given with --baseline.
+
+.. code-block:: none
+   :linenos:
+
+   python benchmarks/load_test.py --rate 100 --duration 60 --save-report baseline.json
+   python benchmarks/load_test.py --rate 100 --duration 60 \\
+       --baseline baseline.json --budget budget.json
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection
+from urllib.parse import urlparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bench_service import FILE_ID, HEADERS, peak_rss_mb  # pylint: disable=wrong-import-position
+from bench_service import prepare_fixture, start_waitress  # pylint: disable=wrong-import-position
+from rest.chrom_index import ChromosomeIndex  # pylint: disable=wrong-import-position
+from rest.synthetic import SyntheticAdjacency, synthetic_chromosomes  # pylint: disable=wrong-import-position
+
+REQUEST_PATH = re.compile(r'(/mug/api/adjacency/(?:getInteractions|getValue)\?[^\s"]+)')
+
+
+def load_log(path):
+    """
+    Read the request paths from a recorded access log
+
+    Any line with a getInteractions or getValue path is used, so plain lists
+    of paths and the usual access log formats can both be replayed.
+
+    Returns
+    -------
+    list
+        Request paths in the order they were logged
+    """
+    paths = []
+    with open(path) as log_file:
+        for line in log_file:
+            match = REQUEST_PATH.search(line)
+            if match is not None:
+                paths.append(match.group(1))
+    return paths
+
+
+def synthetic_log(chromosomes, resolution, count, hot_regions=20, window=1000000,
+                  value_fraction=0.3, seed=0):
+    """
+    Access log of getInteractions and getValue calls on overlapping regions
+
+    The regions are drawn from a few hot regions with a Zipf like popularity
+    and jittered by a few bins, so that concurrent requests read overlapping
+    parts of the matrix.
+
+    Returns
+    -------
+    list
+        Request paths
+    """
+    random = np.random.RandomState(seed)
+    index = ChromosomeIndex(chromosomes, resolution)
+    hot = []
+    for _ in range(hot_regions):
+        chr_id, length = chromosomes[random.randint(len(chromosomes))]
+        hot.append((chr_id, int(random.randint(0, max(length - window, 1)))))
+    popularity = 1.0 / np.arange(1, hot_regions + 1)
+    popularity /= popularity.sum()
+
+    paths = []
+    for _ in range(count):
+        chr_id, start = hot[random.choice(hot_regions, p=popularity)]
+        start = max(0, start + int(random.randint(-10, 11)) * resolution)
+        if random.random_sample() < value_fraction:
+            pos_x = index.bin_for(chr_id, start + int(random.randint(window)))
+            pos_y = index.bin_for(chr_id, start + int(random.randint(window)))
+            paths.append(
+                '/mug/api/adjacency/getValue?file_id={0}&res={1}&pos_x={2}&pos_y={3}'.format(
+                    FILE_ID, resolution, pos_x, pos_y))
+        else:
+            paths.append(
+                '/mug/api/adjacency/getInteractions?file_id={0}&chr={1}&start={2}&end={3}'
+                '&res={4}'.format(FILE_ID, chr_id, start, start + window, resolution))
+    return paths
+
+
+class Client(object):
+    """
+    Keep-alive HTTP connection for each client thread
+    """
+
+    def __init__(self, host, port, timeout):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def get(self, path):
+        """
+        Send a request and read the whole response
+
+        Returns
+        -------
+        int
+            HTTP status, 0 if the request failed without a response
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self._local.connection = connection
+        try:
+            connection.request('GET', path, headers=HEADERS)
+            response = connection.getresponse()
+            response.read()
+            return response.status
+        except Exception:  # pylint: disable=broad-except
+            connection.close()
+            self._local.connection = None
+            return 0
+
+
+def report(latencies, statuses, elapsed):
+    """
+    Throughput, latency percentiles and error rate of a phase
+
+    Returns
+    -------
+    dict
+    """
+    latencies = np.asarray(latencies, dtype=np.float64) * 1000.0
+    statuses = np.asarray(statuses)
+    errors = int(np.count_nonzero(statuses != 200))
+    return {
+        'requests': len(statuses),
+        'errors': errors,
+        'error_rate': errors / float(max(len(statuses), 1)),
+        'connection_errors': int(np.count_nonzero(statuses == 0)),
+        'throughput': len(statuses) / elapsed if elapsed > 0 else 0.0,
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+        'p999_ms': float(np.percentile(latencies, 99.9)),
+        'max_ms': float(latencies.max())
+    }
+
+
+def saturate(client, paths, concurrency, count):
+    """
+    Send requests back to back from concurrent clients
+
+    Returns
+    -------
+    dict
+        See report
+    """
+    requests = [paths[i % len(paths)] for i in range(count)]
+
+    def send(path):
+        """
+        Time one request
+        """
+        started = time.perf_counter()
+        status = client.get(path)
+        return time.perf_counter() - started, status
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(send, requests))
+    return report(
+        [r[0] for r in results], [r[1] for r in results], time.perf_counter() - started)
+
+
+def replay(client, paths, rate, duration, concurrency):
+    """
+    Send requests at a fixed rate whether or not earlier requests have
+    finished
+
+    The latency of each request is measured from the time it was scheduled
+    rather than the time it was sent, so that time spent waiting for a free
+    client is included.
+
+    Returns
+    -------
+    dict
+        See report
+    """
+    count = max(1, int(rate * duration))
+
+    def send(scheduled, path):
+        """
+        Time one request from its scheduled time
+        """
+        status = client.get(path)
+        return time.perf_counter() - scheduled, status
+
+    futures = []
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for i in range(count):
+            scheduled = started + i / float(rate)
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(executor.submit(send, scheduled, paths[i % len(paths)]))
+        results = [f.result() for f in futures]
+    result = report(
+        [r[0] for r in results], [r[1] for r in results], time.perf_counter() - started)
+    result['target_rate'] = rate
+    return result
+
+
+def check_budget(result, budget, baseline=None):
+    """
+    Compare a load test report with a regression budget
+
+    Parameters
+    ----------
+    result : dict
+        saturation and replay reports
+    budget : dict
+        Limits, see the module documentation
+    baseline : dict
+        Report of an earlier run, needed for the relative limits
+
+    Returns
+    -------
+    list
+        Description of each limit that was exceeded
+    """
+    failures = []
+    replayed = result['replay']
+    saturation = result['saturation']
+
+    error_rate = max(replayed['error_rate'], saturation['error_rate'])
+    if 'max_error_rate' in budget and error_rate > budget['max_error_rate']:
+        failures.append('error rate {0:.4f} > {1}'.format(error_rate, budget['max_error_rate']))
+    if 'max_p99_ms' in budget and replayed['p99_ms'] > budget['max_p99_ms']:
+        failures.append('p99 {0:.1f} ms > {1} ms'.format(replayed['p99_ms'], budget['max_p99_ms']))
+    if ('min_saturation_throughput' in budget and
+            saturation['throughput'] < budget['min_saturation_throughput']):
+        failures.append('saturation throughput {0:.1f} req/s < {1} req/s'.format(
+            saturation['throughput'], budget['min_saturation_throughput']))
+
+    if baseline is not None:
+        if 'max_p99_regression' in budget:
+            limit = baseline['replay']['p99_ms'] * (1.0 + budget['max_p99_regression'])
+            if replayed['p99_ms'] > limit:
+                failures.append('p99 {0:.1f} ms > {1:.1f} ms, baseline {2:.1f} ms'.format(
+                    replayed['p99_ms'], limit, baseline['replay']['p99_ms']))
+        if 'max_throughput_regression' in budget:
+            limit = baseline['saturation']['throughput'] * (
+                1.0 - budget['max_throughput_regression'])
+            if saturation['throughput'] < limit:
+                failures.append(
+                    'saturation throughput {0:.1f} req/s < {1:.1f} req/s, '
+                    'baseline {2:.1f} req/s'.format(
+                        saturation['throughput'], limit, baseline['saturation']['throughput']))
+    return failures
+
+
+def main():
+    """
+    Run the load test, print the report and check the budget
+    """
+    parser = argparse.ArgumentParser(description='Load test with concurrent clients')
+    parser.add_argument('--url', help='Service to test, started locally when not given')
+    parser.add_argument('--log', help='Recorded access log to replay, synthetic by default')
+    parser.add_argument('--fixture', help='Synthetic file, written if it does not exist')
+    parser.add_argument('--genome-size', type=int, default=100000000)
+    parser.add_argument('--chromosomes', type=int, default=3)
+    parser.add_argument('--resolution', type=int, default=10000)
+    parser.add_argument('--density', type=float, default=0.01)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--window', type=int, default=1000000, help='Size of the regions in bp')
+    parser.add_argument('--hot-regions', type=int, default=20)
+    parser.add_argument('--threads', type=int, default=8, help='waitress threads')
+    parser.add_argument('--concurrency', type=int, default=32, help='Concurrent clients')
+    parser.add_argument(
+        '--saturation-requests', type=int, default=2000,
+        help='Requests sent back to back to find the saturation throughput')
+    parser.add_argument('--rate', type=float, default=50.0, help='Replay rate in req/s')
+    parser.add_argument('--duration', type=float, default=30.0, help='Replay duration in s')
+    parser.add_argument('--timeout', type=float, default=60.0, help='Request timeout in s')
+    parser.add_argument('--budget', help='Regression budget, a JSON file')
+    parser.add_argument('--baseline', help='Report of an earlier run')
+    parser.add_argument('--save-report', help='Save the report to this file')
+    args = parser.parse_args()
+
+    if args.log:
+        paths = load_log(args.log)
+    else:
+        paths = synthetic_log(
+            synthetic_chromosomes(args.genome_size, args.chromosomes), args.resolution,
+            10000, args.hot_regions, args.window, seed=args.seed)
+    if not paths:
+        parser.error('No getInteractions or getValue requests in ' + args.log)
+
+    server = None
+    if args.url:
+        url = urlparse(args.url)
+        host, port = url.hostname, url.port or 80
+    else:
+        path, _ = prepare_fixture(args)
+        from rest import app  # pylint: disable=import-outside-toplevel
+        app.APP.config['TESTING'] = True
+        app.use_reader(
+            lambda user_id, file_id, resolution=None: SyntheticAdjacency(path, resolution),
+            lambda user_id, file_id: path)
+        server, port = start_waitress(app.APP, args.threads)
+        host = '127.0.0.1'
+
+    client = Client(host, port, args.timeout)
+    try:
+        result = {
+            'saturation': saturate(client, paths, args.concurrency, args.saturation_requests),
+            'replay': replay(client, paths, args.rate, args.duration, args.concurrency),
+        }
+    finally:
+        if server is not None:
+            server.close()
+    if server is not None:
+        result['peak_rss_mb'] = peak_rss_mb()
+
+    print('{0:12s} {1:>10s} {2:>10s} {3:>10s} {4:>10s} {5:>10s}'.format(
+        'phase', 'req/s', 'p50 ms', 'p99 ms', 'p99.9 ms', 'errors'))
+    for phase in ('saturation', 'replay'):
+        metrics = result[phase]
+        print('{0:12s} {1:10.1f} {2:10.2f} {3:10.2f} {4:10.2f} {5:10.4f}'.format(
+            phase, metrics['throughput'], metrics['p50_ms'], metrics['p99_ms'],
+            metrics['p999_ms'], metrics['error_rate']))
+    if 'peak_rss_mb' in result:
+        print('Peak RSS {0:.1f} MB'.format(result['peak_rss_mb']))
+
+    if args.save_report:
+        with open(args.save_report, 'w') as report_file:
+            json.dump(dict(result, parameters=vars(args)), report_file, indent=2, sort_keys=True)
+
+    if args.budget:
+        with open(args.budget) as budget_file:
+            budget = json.load(budget_file)
+        baseline = None
+        if args.baseline:
+            with open(args.baseline) as baseline_file:
+                baseline = json.load(baseline_file)
+        failures = check_budget(result, budget, baseline)
+        for failure in failures:
+            print('Budget exceeded:', failure)
+        if failures:
+            sys.exit(1)
+        print('Within budget')
+
+
+if __name__ == '__main__':
+    main()
@@ -17,37 +17,1052 @@
 
 from __future__ import print_function
 
+import hashlib
+import hmac
+import io
+import itertools
+import json
 import os
 import sys
+import tempfile
+import time
 
-from flask import Flask, make_response, request
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+from urllib.parse import urlencode
+
+import numpy as np
+
+from flask import Flask, Response, g, has_request_context, make_response, request, send_file
+from flask import stream_with_context
 from flask_restful import Api, Resource
+from werkzeug.http import http_date, is_resource_modified
 
 from dmp import dmp
 from reader.hdf5_adjacency import adjacency
 
 from mg_rest_util.mg_auth import authorized
 
+from rest.chunks import chunked
+from rest.columnar import InteractionColumns, filter_values, hdf5_dataset, page_slice, range_bins
+from rest.columnar import read_range, read_range_page
+from rest.compression import choose_encoding, coded_etag, compress, etag_variants, iter_compress
+from rest.compression import peek
+from rest.handle_pool import HandlePool
+from rest.jobs import EXPORT_FORMATS, ExportJobs, SpoolFull
+from rest.lru import LRUCache
+from rest.matrix import MatrixBlock, matrix_from_columns, read_matrix, read_points
+from rest.metadata import MetadataCache
+from rest.metrics import CONTENT_TYPE, Gauge, Histogram, Registry, RequestTimer
+from rest.metrics import timed_blocks
+from rest.pagination import InvalidCursor, decode_cursor, encode_cursor
+from rest.pagination import partition_cursors, query_fingerprint
+from rest.profiler import ProfileStore, SamplingProfiler
+from rest.pyramid import open_pyramid, plan_level, pyramid_levels, pyramid_path
+from rest.response_cache import CachedResponse, ResponseCache
+from rest.serializers import AdjacencyJSONEncoder, iter_arrow, iter_npy, iter_tsv
+from rest.serializers import json_dumps, values_json
+from rest.serializers import pyarrow
+from rest.sidecar import MappedMatrices
+from rest.singleflight import SingleFlight
+
 APP = Flask(__name__)
 # APP.config['DEBUG'] = True
 
+APP.config.update(
+    # Maximum number of open HDF5 handles kept between requests
+    ADJACENCY_POOL_SIZE=32,
+    # Seconds after which an unused HDF5 handle is closed
+    ADJACENCY_POOL_IDLE_TIMEOUT=300,
+    # Maximum number of files to hold chromosome and resolution meta data for
+    ADJACENCY_METADATA_CACHE_SIZE=256,
+    # Maximum number of user and file id pairs to hold the file location for
+    ADJACENCY_LOCATION_CACHE_SIZE=4096,
+    # Seconds that the location of a file is held for before it is looked up
+    # again
+    ADJACENCY_LOCATION_TTL=300,
+    # Number of rows in each block of a streamed TSV response
+    ADJACENCY_TSV_BLOCK_SIZE=4096,
+    # Number of rows in each block of a streamed binary response
+    ADJACENCY_BINARY_BLOCK_SIZE=65536,
+    # Maximum number of cells that can be requested from getMatrix
+    ADJACENCY_MATRIX_MAX_CELLS=1 << 24,
+    # Maximum number of bin pairs in a single batched getValue request
+    ADJACENCY_BATCH_MAX_POINTS=1000000,
+    # Default maximum number of matrix cells read by getInteractions before a
+    # coarser pyramid level is used. None only uses the requested resolution
+    ADJACENCY_CELL_BUDGET=None,
+    # Number of interactions in a page when a cursor is given without a
+    # page_size
+    ADJACENCY_PAGE_SIZE=100000,
+    # Number of bins along each side of a tile
+    ADJACENCY_TILE_SIZE=256,
+    # Maximum number of bytes of tiles kept in memory
+    ADJACENCY_TILE_CACHE_BYTES=256 * 1024 * 1024,
+    # Cache-Control header sent with tiles, private as the file behind a
+    # tile URL depends on the user
+    ADJACENCY_TILE_CACHE_CONTROL='private, max-age=3600',
+    # Directory that export jobs are written to
+    ADJACENCY_EXPORT_SPOOL=os.path.join(tempfile.gettempdir(), 'mg-rest-adjacency-export'),
+    # Number of worker processes running export jobs
+    ADJACENCY_EXPORT_WORKERS=2,
+    # Maximum total size of the export spool directory, None for no limit
+    ADJACENCY_EXPORT_SPOOL_BYTES=50 * 1024 * 1024 * 1024,
+    # Seconds that a finished export is kept for
+    ADJACENCY_EXPORT_RETENTION=86400,
+    # Read matrices from memory mapped .npy sidecars when they are available
+    ADJACENCY_SIDECARS=True,
+    # Maximum number of bytes of decompressed HDF5 chunks kept in memory, 0
+    # reads straight from the file
+    ADJACENCY_CHUNK_CACHE_BYTES=512 * 1024 * 1024,
+    # Reads larger than this bypass the chunk cache
+    ADJACENCY_CHUNK_CACHE_MAX_READ_BYTES=64 * 1024 * 1024,
+    # Maximum number of bytes of encoded getInteractions responses kept in
+    # memory, 0 disables the response cache
+    ADJACENCY_RESPONSE_CACHE_BYTES=0,
+    # Seconds that a cached response is served for, None for no limit
+    ADJACENCY_RESPONSE_CACHE_TTL=300,
+    # Directory for a second tier of cached responses on disk, None to only
+    # cache in memory
+    ADJACENCY_RESPONSE_CACHE_DIR=None,
+    # Maximum size of the disk tier
+    ADJACENCY_RESPONSE_CACHE_DISK_BYTES=10 * 1024 * 1024 * 1024,
+    # Encode JSON responses with orjson when it is installed
+    ADJACENCY_JSON_ACCELERATED=True,
+    # Compress responses for clients that accept gzip or zstd
+    ADJACENCY_COMPRESSION=True,
+    # Compression levels for each content coding
+    ADJACENCY_GZIP_LEVEL=6,
+    ADJACENCY_ZSTD_LEVEL=3,
+    # Bodies smaller than this are sent uncompressed
+    ADJACENCY_COMPRESSION_MIN_BYTES=1024,
+    # Time each request and expose the metrics at /mug/api/adjacency/metrics
+    ADJACENCY_METRICS=True,
+    # Profile every request and keep the profiles of the slow ones
+    ADJACENCY_PROFILE=False,
+    # Requests that take at least this many seconds have their profile kept
+    ADJACENCY_PROFILE_THRESHOLD=1.0,
+    # Seconds between the stack samples of a profiled request
+    ADJACENCY_PROFILE_INTERVAL=0.005,
+    # Secret that enables profiling of a single request when it is sent in
+    # the X-Adjacency-Profile header, None disables the header
+    ADJACENCY_PROFILE_TOKEN=None,
+    # Directory that profiles are written to and its limits
+    ADJACENCY_PROFILE_DIR=os.path.join(tempfile.gettempdir(), 'mg-rest-adjacency-profiles'),
+    ADJACENCY_PROFILE_MAX_FILES=100,
+    ADJACENCY_PROFILE_MAX_BYTES=100 * 1024 * 1024,
+    # Threads running requests when served with rest.asgi
+    ADJACENCY_ASGI_WORKERS=16,
+    # Requests running or waiting for a thread beyond which rest.asgi
+    # responds with a 503
+    ADJACENCY_ASGI_MAX_PENDING=64,
+    # Blocks of a streamed body held for a client before the thread producing
+    # them waits
+    ADJACENCY_ASGI_STREAM_BUFFER=8,
+)
+APP.config.from_envvar('MG_REST_ADJACENCY_SETTINGS', silent=True)
+
 REST_API = Api(APP)
 
+HANDLE_POOL = HandlePool(
+    adjacency,
+    max_size=APP.config['ADJACENCY_POOL_SIZE'],
+    idle_timeout=APP.config['ADJACENCY_POOL_IDLE_TIMEOUT']
+)
+
+TILE_CACHE = LRUCache(APP.config['ADJACENCY_TILE_CACHE_BYTES'])
+
+CHUNK_CACHE = LRUCache(APP.config['ADJACENCY_CHUNK_CACHE_BYTES'])
+
+COALESCER = SingleFlight()
+
+RESPONSE_CACHE = None
+if APP.config['ADJACENCY_RESPONSE_CACHE_BYTES']:
+    RESPONSE_CACHE = ResponseCache(
+        APP.config['ADJACENCY_RESPONSE_CACHE_BYTES'],
+        ttl=APP.config['ADJACENCY_RESPONSE_CACHE_TTL'],
+        disk_dir=APP.config['ADJACENCY_RESPONSE_CACHE_DIR'],
+        disk_max_bytes=APP.config['ADJACENCY_RESPONSE_CACHE_DISK_BYTES']
+    )
+
+EXPORT_JOBS = ExportJobs(
+    APP.config['ADJACENCY_EXPORT_SPOOL'],
+    max_workers=APP.config['ADJACENCY_EXPORT_WORKERS'],
+    max_spool_bytes=APP.config['ADJACENCY_EXPORT_SPOOL_BYTES'],
+    retention=APP.config['ADJACENCY_EXPORT_RETENTION']
+)
+
+def locate_file(user_id, file_id):
+    """
+    Resolve the location of a file from the DM API
+
+    Parameters
+    ----------
+    user_id : str
+        User ID
+    file_id : str
+        Identifier of the file
+
+    Returns
+    -------
+    str
+        Path to the file, None if the file could not be found
+    """
+    try:
+        file_obj = dmp().get_file_by_id(user_id, file_id)
+    except Exception:  # pylint: disable=broad-except
+        return None
+
+    if not file_obj:
+        return None
+    return file_obj.get('file_path')
+
+PYRAMID_POOL = HandlePool(
+    open_pyramid,
+    max_size=APP.config['ADJACENCY_POOL_SIZE'],
+    idle_timeout=APP.config['ADJACENCY_POOL_IDLE_TIMEOUT']
+)
+
+METADATA_CACHE = MetadataCache(
+    locate_file,
+    max_size=APP.config['ADJACENCY_METADATA_CACHE_SIZE'],
+    location_size=APP.config['ADJACENCY_LOCATION_CACHE_SIZE'],
+    location_ttl=APP.config['ADJACENCY_LOCATION_TTL']
+)
+
+MAPPED_MATRICES = MappedMatrices()
+
+PROFILER = SamplingProfiler(APP.config['ADJACENCY_PROFILE_INTERVAL'])
+
+PROFILE_STORE = ProfileStore(
+    APP.config['ADJACENCY_PROFILE_DIR'],
+    max_files=APP.config['ADJACENCY_PROFILE_MAX_FILES'],
+    max_bytes=APP.config['ADJACENCY_PROFILE_MAX_BYTES']
+)
+
+METRICS = Registry()
+
+REQUEST_SECONDS = METRICS.register(Histogram(
+    'adjacency_request_seconds', 'Time taken to handle a request, including streaming the body',
+    ('endpoint', 'resolution', 'format')))
+
+PHASE_SECONDS = METRICS.register(Histogram(
+    'adjacency_request_phase_seconds', 'Time spent in each phase of handling a request',
+    ('endpoint', 'phase')))
+
+METRICS.register(Gauge(
+    'adjacency_handle_pool_handles', 'Number of open handles held by each pool',
+    lambda: {('matrix',): HANDLE_POOL.stats()['size'], ('pyramid',): PYRAMID_POOL.stats()['size']},
+    ('pool',)))
+
+METRICS.register(Gauge(
+    'adjacency_handle_pool_max_handles', 'Maximum number of handles held by each pool',
+    lambda: {('matrix',): HANDLE_POOL.max_size, ('pyramid',): PYRAMID_POOL.max_size},
+    ('pool',)))
+
+def cache_stats():
+    """
+    Usage of the in-memory caches by name
+    """
+    stats = {'chunks': CHUNK_CACHE.stats(), 'tiles': TILE_CACHE.stats()}
+    if RESPONSE_CACHE is not None:
+        stats['responses'] = RESPONSE_CACHE.memory.stats()
+    return stats
+
+METRICS.register(Gauge(
+    'adjacency_cache_bytes', 'Size of the values held by each cache',
+    lambda: dict(((name,), stats['bytes']) for name, stats in cache_stats().items()),
+    ('cache',)))
+
+METRICS.register(Gauge(
+    'adjacency_cache_max_bytes', 'Size budget of each cache',
+    lambda: dict(((name,), stats['max_bytes']) for name, stats in cache_stats().items()),
+    ('cache',)))
+
+METRICS.register(Gauge(
+    'adjacency_cache_entries', 'Number of values held by each cache',
+    lambda: dict(((name,), stats['entries']) for name, stats in cache_stats().items()),
+    ('cache',)))
+
+METRICS.register(Gauge(
+    'adjacency_metadata_cache_entries', 'Number of files with cached meta data',
+    lambda: METADATA_CACHE.stats()['size']))
+
+METRICS.register(Gauge(
+    'adjacency_coalesced_in_flight', 'Number of reads currently shared by concurrent requests',
+    lambda: COALESCER.stats()['in_flight']))
+
+@contextmanager
+def timed_phase(phase):
+    """
+    Count the time spent in a with block towards a phase of the current
+    request, see rest.metrics.RequestTimer
+    """
+    timer = g.get('request_timer') if has_request_context() else None
+    if timer is None:
+        yield
+        return
+    with timer.span(phase):
+        yield
+
+def timed(phase):
+    """
+    Decorator that counts the time spent in a function towards a phase of the
+    current request
+    """
+    def decorator(func):
+        """
+        Wrap func in timed_phase
+        """
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            """
+            Call func within the phase
+            """
+            with timed_phase(phase):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def reset_after_fork():
+    """
+    Drop the state inherited from the parent process
+
+    Called in each worker of a pre-fork server straight after it has been
+    forked, see rest/gunicorn_conf.py. HDF5 handles, memory maps and the
+    export worker pool are opened again by the worker on first use.
+    """
+    HANDLE_POOL.reset()
+    PYRAMID_POOL.reset()
+    MAPPED_MATRICES.reset()
+    EXPORT_JOBS.reset()
+
+def use_reader(opener, locator):
+    """
+    Replace the reader and the DM API look up of files
+
+    Call before serving any requests, for example to serve the synthetic
+    files from rest.synthetic in benchmarks.
+
+    Parameters
+    ----------
+    opener : function
+        Called as opener(user_id, file_id, resolution) or opener(user_id,
+        file_id), returns an object with the interface of
+        reader.hdf5_adjacency.adjacency
+    locator : function
+        Called as locator(user_id, file_id), returns the path to the file
+    """
+    HANDLE_POOL.close_all()
+    HANDLE_POOL.opener = opener
+    METADATA_CACHE.locator = locator
+    METADATA_CACHE.clear_locations()
+
+@contextmanager
+def matrix_dataset(user_id, file_id, resolution):
+    """
+    Check out the matrix for a resolution for the duration of a with block
+
+    The memory mapped sidecar is used when there is an up to date one, in
+    which case no HDF5 handle is needed. Otherwise the dataset is taken from
+    a pooled handle, which stays locked until the end of the block, and read
+    a chunk at a time through CHUNK_CACHE.
+
+    Direct reads assume a matrix of one bin per resolution of each
+    chromosome, a matrix of any other shape is left to the reader.
+
+    Returns
+    -------
+    tuple
+        (matrix, hdf5_handle). The matrix is None when the reader does not
+        expose the HDF5 file or the matrix has an unexpected shape, and the
+        handle is None for a sidecar.
+    """
+    index = get_metadata(user_id, file_id).index(resolution)
+    path, version = METADATA_CACHE.file_identity(user_id, file_id)
+    if APP.config['ADJACENCY_SIDECARS'] and isinstance(path, str):
+        mapped = MAPPED_MATRICES.get(path, resolution)
+        if mapped is not None and mapped.shape == (index.bin_count, index.bin_count):
+            yield mapped, None
+            return
+
+    with ExitStack() as stack:
+        with timed_phase('open'):
+            hdf5_handle = stack.enter_context(
+                HANDLE_POOL.acquire(user_id, file_id, resolution))
+        dset = hdf5_dataset(hdf5_handle, resolution, index)
+        if dset is not None and CHUNK_CACHE.max_bytes:
+            dset = chunked(
+                dset, CHUNK_CACHE, (path, version, resolution),
+                APP.config['ADJACENCY_CHUNK_CACHE_MAX_READ_BYTES'])
+        yield dset, hdf5_handle
+
+def get_metadata(user_id, file_id):
+    """
+    Get the chromosomes, resolutions and bin offsets for a file
+
+    The meta data is only read from the HDF5 file the first time that it is
+    requested or after the file has been modified.
+
+    Parameters
+    ----------
+    user_id : str
+        User ID
+    file_id : str
+        Identifier of the file
+
+    Returns
+    -------
+    rest.metadata.DatasetMetadata
+    """
+    def loader():
+        """
+        Load the details from the HDF5 file
+        """
+        with HANDLE_POOL.acquire(user_id, file_id) as hdf5_handle:
+            return hdf5_handle.get_details()
+
+    with timed_phase('metadata'):
+        return METADATA_CACHE.get(user_id, file_id, loader)
+
+@timed('read')
+def read_interactions(user_id, file_id, resolution, meta, chr_id, start, end,
+                      limit_chr=None, limit_start=None, limit_end=None,
+                      value_filter=None):
+    """
+    Get the interactions for a region as columns
+
+    The matrix is read directly from the HDF5 file when the reader exposes
+    it, otherwise the results from adjacency.get_range are converted.
+
+    Parameters
+    ----------
+    user_id : str
+        User ID
+    file_id : str
+        Identifier of the file to retrieve data from
+    resolution : int
+        Resolution of the dataset requested
+    meta : rest.metadata.DatasetMetadata
+        Meta data for the file
+    chr_id : str
+        Chromosome identifier
+    start : int
+        Start position for a selected region
+    end : int
+        End position for a selected region
+    limit_chr : str
+        Limit the interactions returned to those between chr and limit_chr
+    limit_start : int
+        Start position for a specific interacting chromosomal region
+    limit_end : int
+        End position for a specific interacting chromosomal region
+    value_filter : dict
+        min_value, max_value and top_n selection applied while reading, see
+        rest.columnar.read_range
+
+    Returns
+    -------
+    tuple
+        (InteractionColumns, log)
+    """
+    value_filter = value_filter or {}
+    with matrix_dataset(user_id, file_id, resolution) as (dset, hdf5_handle):
+        if dset is not None:
+            values = read_range(
+                dset, meta.index(resolution),
+                chr_id, start, end, limit_chr, limit_start, limit_end,
+                **value_filter)
+            return values, []
+
+        h5_data = hdf5_handle.get_range(
+            chr_id, start, end, limit_chr, limit_start, limit_end, '', True)
+    values = InteractionColumns.from_records(h5_data["results"])
+    return filter_values(values, **value_filter), h5_data["log"]
+
+@timed('read')
+def read_interactions_page(user_id, file_id, resolution, meta, region,
+                           x_bins, y_bins, position, page_size, value_filter=None):
+    """
+    Get a page of the interactions for a region in row major order
+
+    Parameters
+    ----------
+    user_id : str
+        User ID
+    file_id : str
+        Identifier of the file to retrieve data from
+    resolution : int
+        Resolution of the dataset requested
+    meta : rest.metadata.DatasetMetadata
+        Meta data for the file
+    region : tuple
+        (chr_id, start, end, limit_chr, limit_start, limit_end)
+    x_bins : tuple
+        (first bin, last bin + 1) for the rows of the scan
+    y_bins : tuple
+        (first bin, last bin + 1) for the columns of the scan
+    position : tuple
+        (row, column) of the first cell of the page, None for the first page
+    page_size : int
+        Maximum number of interactions in the page
+    value_filter : dict
+        min_value and max_value thresholds applied while reading
+
+    Returns
+    -------
+    tuple
+        (InteractionColumns, position of the next page or None, log)
+    """
+    value_filter = value_filter or {}
+    with matrix_dataset(user_id, file_id, resolution) as (dset, _):
+        if dset is not None:
+            values, next_position = read_range_page(
+                dset, meta.index(resolution), x_bins, y_bins, position, page_size,
+                **value_filter)
+            return values, next_position, []
+
+    values, log = read_interactions(
+        user_id, file_id, resolution, meta, *region, value_filter=value_filter)
+    values = values.take(np.lexsort((values.pos_y, values.pos_x)))
+    values, next_position = page_slice(values, page_size, position, x_bins[1])
+    return values, next_position, log
+
+@timed('read')
+def read_planned_interactions(user_id, file_id, resolution, meta, cell_budget,
+                              chr_id, start, end,
+                              limit_chr=None, limit_start=None, limit_end=None,
+                              value_filter=None):
+    """
+    Get the interactions for a region from the finest zoom level that keeps
+    the number of cells read within a budget
+
+    The zoom levels are read from the pyramid sidecar of the file, see
+    rest.pyramid. If there is no sidecar the requested resolution is used.
+
+    Returns
+    -------
+    tuple
+        (InteractionColumns, log, resolution that was used)
+    """
+    path, _ = METADATA_CACHE.file_identity(user_id, file_id)
+    if isinstance(path, str) and os.path.isfile(pyramid_path(path)):
+        with PYRAMID_POOL.acquire(None, pyramid_path(path)) as pyramid_file:
+            level = plan_level(
+                meta, [resolution] + pyramid_levels(pyramid_file, resolution),
+                cell_budget, chr_id, start, end, limit_chr, limit_start, limit_end)
+            if level != resolution:
+                values = read_range(
+                    pyramid_file[str(level)], meta.index(level),
+                    chr_id, start, end, limit_chr, limit_start, limit_end,
+                    **(value_filter or {}))
+                return values, [], level
+
+    values, log = read_interactions(
+        user_id, file_id, resolution, meta,
+        chr_id, start, end, limit_chr, limit_start, limit_end, value_filter)
+    return values, log, resolution
+
+@timed('read')
+def read_matrix_block(user_id, file_id, resolution, meta, x_region, y_region):
+    """
+    Get a dense block of the adjacency matrix
+
+    Parameters
+    ----------
+    user_id : str
+        User ID
+    file_id : str
+        Identifier of the file to retrieve data from
+    resolution : int
+        Resolution of the dataset requested
+    meta : rest.metadata.DatasetMetadata
+        Meta data for the file
+    x_region : tuple
+        (chromosome, start, end) for the rows
+    y_region : tuple
+        (chromosome, start, end) for the columns
+
+    Returns
+    -------
+    rest.matrix.MatrixBlock
+    """
+    index = meta.index(resolution)
+    x_bins = index.region_bins(*x_region)
+    y_bins = index.region_bins(*y_region)
+
+    with matrix_dataset(user_id, file_id, resolution) as (dset, _):
+        if dset is not None:
+            return read_matrix(dset, x_bins, y_bins)
+
+    values, _ = read_interactions(
+        user_id, file_id, resolution, meta,
+        x_region[0], x_region[1], x_region[2],
+        y_region[0], y_region[1], y_region[2])
+    return matrix_from_columns(values, x_bins, y_bins)
+
+@timed('read')
+def read_values(user_id, file_id, resolution, meta, pos_x, pos_y):
+    """
+    Get the values for many bin pairs
+
+    Parameters
+    ----------
+    user_id : str
+        User ID
+    file_id : str
+        Identifier of the file to retrieve data from
+    resolution : int
+        Resolution of the dataset requested
+    meta : rest.metadata.DatasetMetadata
+        Meta data for the file
+    pos_x : numpy.ndarray
+        Row bins
+    pos_y : numpy.ndarray
+        Column bins
+
+    Returns
+    -------
+    InteractionColumns
+        The requested pairs in the order they were given
+    """
+    index = meta.index(resolution)
+
+    with matrix_dataset(user_id, file_id, resolution) as (dset, hdf5_handle):
+        if dset is not None:
+            value = read_points(dset, pos_x, pos_y)
+        else:
+            value = np.array(
+                [int(hdf5_handle.get_value(x, y)) for x, y in zip(pos_x.tolist(), pos_y.tolist())],
+                dtype=np.int64)
+
+    chr_a, start_a = index.locate_many(pos_x)
+    chr_b, start_b = index.locate_many(pos_y)
+    return InteractionColumns(
+        index.names, chr_a, start_a, chr_b, start_b, value, pos_x, pos_y)
+
+@timed('read')
+def read_value(user_id, file_id, resolution, pos_x, pos_y):
+    """
+    Get the value for a single bin pair
+    """
+    with matrix_dataset(user_id, file_id, resolution) as (dset, hdf5_handle):
+        if dset is not None:
+            return int(dset[pos_x, pos_y])
+        return hdf5_handle.get_value(pos_x, pos_y)
+
+@timed('read')
+def read_tile(user_id, file_id, resolution, meta, chr_id, tile_x, tile_y, tile_size):
+    """
+    Get an aligned square tile of the matrix for a chromosome
+
+    Tile (x, y) covers the bins x * tile_size to (x + 1) * tile_size of the
+    chromosome along the rows and the same for y along the columns. Tiles at
+    the end of the chromosome are padded with zeros so that every tile has the
+    same shape. Resolutions that are not in the adjacency file are read from
+    the pyramid sidecar.
+
+    Returns
+    -------
+    rest.matrix.MatrixBlock
+        None if the resolution is not available
+    """
+    span = tile_size * resolution
+    x_region = (chr_id, tile_x * span, (tile_x + 1) * span)
+    y_region = (chr_id, tile_y * span, (tile_y + 1) * span)
+
+    if resolution in meta.resolutions:
+        block = read_matrix_block(user_id, file_id, resolution, meta, x_region, y_region)
+    else:
+        path, _ = METADATA_CACHE.file_identity(user_id, file_id)
+        if not isinstance(path, str) or not os.path.isfile(pyramid_path(path)):
+            return None
+        with PYRAMID_POOL.acquire(None, pyramid_path(path)) as pyramid_file:
+            if str(resolution) not in pyramid_file:
+                return None
+            index = meta.index(resolution)
+            dset = chunked(
+                pyramid_file[str(resolution)], CHUNK_CACHE,
+                (pyramid_path(path), os.path.getmtime(pyramid_path(path)), resolution))
+            block = read_matrix(
+                dset, index.region_bins(*x_region), index.region_bins(*y_region))
+
+    if block.shape != (tile_size, tile_size):
+        data = np.zeros((tile_size, tile_size), dtype=block.data.dtype)
+        data[:block.shape[0], :block.shape[1]] = block.data
+        block = MatrixBlock(data, block.row_offset, block.col_offset)
+    return block
+
+@APP.before_request
+def start_timer():
+    """
+    Start timing the request
+    """
+    if APP.config['ADJACENCY_METRICS']:
+        g.request_timer = RequestTimer()
+
+def record_request(timer, endpoint, resolution, mediatype):
+    """
+    Add the timings of a finished request to the histograms
+
+    The time that is not in any phase, parsing and checking the parameters,
+    authorisation and the framework, is recorded as the phase other.
+    """
+    elapsed = timer.elapsed()
+    REQUEST_SECONDS.observe(elapsed, endpoint, resolution, mediatype)
+    for phase, seconds in timer.phases.items():
+        PHASE_SECONDS.observe(seconds, endpoint, phase)
+    PHASE_SECONDS.observe(max(elapsed - sum(timer.phases.values()), 0.0), endpoint, 'other')
+
+# Registered first so that it runs last and also times the response cache
+# and compression
+@APP.after_request
+def time_response(response):
+    """
+    Record the timings of the request once the body has been sent
+
+    Requests are only labelled with the resolution once it has been checked
+    against the resolutions of the file, and help_usage errors are sent with
+    a 200 status, so the resolution is set on g by the resources rather than
+    taken from the parameters. Otherwise the number of series would depend on
+    the values sent by clients.
+    """
+    timer = g.pop('request_timer', None)
+    if timer is None:
+        return response
+
+    endpoint = request.endpoint or ''
+    resolution = g.get('metrics_resolution', '') if response.status_code == 200 else ''
+    if response.is_streamed:
+        response.response = timed_blocks(response.response, timer, 'stream')
+    response.call_on_close(lambda: record_request(
+        timer, endpoint, resolution, response.mimetype or ''))
+    return response
+
+def profile_requested():
+    """
+    Check whether the current request should be profiled
+
+    Either every request is profiled, with ADJACENCY_PROFILE, or the request
+    carries the ADJACENCY_PROFILE_TOKEN secret in the X-Adjacency-Profile
+    header.
+
+    Returns
+    -------
+    str
+        'config' or 'header', None to not profile the request
+    """
+    token = APP.config['ADJACENCY_PROFILE_TOKEN']
+    header = request.headers.get('X-Adjacency-Profile')
+    if token and header and hmac.compare_digest(header.encode('utf-8'), token.encode('utf-8')):
+        return 'header'
+    if APP.config['ADJACENCY_PROFILE']:
+        return 'config'
+    return None
+
+@APP.before_request
+def start_profile():
+    """
+    Start sampling the stack of the thread handling the request
+    """
+    trigger = profile_requested()
+    if trigger is not None:
+        g.profile = (PROFILER.start(), trigger)
+
+def save_profile(profile, trigger, details):
+    """
+    Stop sampling a request and keep the profile if the request was slow
+
+    Profiles requested with the header are always kept.
+    """
+    PROFILER.stop(profile)
+    elapsed = time.time() - profile.started
+    if trigger == 'header' or elapsed >= APP.config['ADJACENCY_PROFILE_THRESHOLD']:
+        details['elapsed'] = elapsed
+        try:
+            PROFILE_STORE.write(profile, details)
+        except (IOError, OSError) as err:
+            APP.logger.warning('Unable to write profile: %s', err)
+
+@APP.after_request
+def profile_response(response):
+    """
+    Finish the profile once the body has been sent, so that the time spent
+    streaming the body is included
+    """
+    profile = g.pop('profile', None)
+    if profile is None:
+        return response
+
+    details = {
+        'endpoint': request.endpoint,
+        'method': request.method,
+        'path': request.path,
+        'args': request.args.to_dict(flat=False),
+        'view_args': request.view_args,
+        'status': response.status_code,
+        'format': response.mimetype,
+        'trigger': profile[1],
+        'interval': PROFILER.interval,
+        'pid': os.getpid()
+    }
+    response.call_on_close(lambda: save_profile(profile[0], profile[1], details))
+    return response
+
+# Flask runs the after_request functions in the reverse order to which they
+# are registered, so this runs after store_response and the response cache
+# holds uncompressed bodies
+@APP.after_request
+def compress_response(response):
+    """
+    Compress the body with the best content coding in Accept-Encoding
+
+    Streamed bodies are compressed block by block as they are sent. Bodies
+    below ADJACENCY_COMPRESSION_MIN_BYTES are sent as they are, for streamed
+    bodies this is decided from the first blocks.
+    """
+    if (not APP.config['ADJACENCY_COMPRESSION'] or response.status_code != 200 or
+            response.direct_passthrough or 'Content-Encoding' in response.headers):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    level = APP.config['ADJACENCY_ZSTD_LEVEL' if encoding == 'zstd' else 'ADJACENCY_GZIP_LEVEL']
+    min_size = APP.config['ADJACENCY_COMPRESSION_MIN_BYTES']
+    if response.is_streamed:
+        head, rest, complete = peek(response.response, min_size)
+        if complete and sum(len(block) for block in head) < min_size:
+            response.response = head
+            return response
+        response.response = iter_compress(itertools.chain(head, rest), encoding, level)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        with timed_phase('compress'):
+            response.set_data(compress(data, encoding, level))
+
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag is not None:
+        response.set_etag(coded_etag(etag, encoding), weak)
+    return response
+
+def not_modified(etag, headers, last_modified=None):
+    """
+    304 response when the client already holds the current body
+
+    Compressed bodies are sent with the content coding added to their ETag by
+    compress_response, so the ETag in If-None-Match can be in either form.
+    The 304 carries the form that matched.
+
+    Parameters
+    ----------
+    etag : str
+        Unquoted ETag of the uncompressed body
+    headers : dict
+        Headers to send with the 304
+    last_modified : datetime
+        Time that the resource was last modified
+
+    Returns
+    -------
+    flask.Response
+        None if the body has to be sent
+    """
+    for tag in etag_variants(etag):
+        if not is_resource_modified(request.environ, etag=tag, last_modified=last_modified):
+            return Response(status=304, headers=dict(headers, ETag='"' + tag + '"'))
+    return None
+
+def cached_response(user_id, file_id):
+    """
+    Look up the encoded response for the current request
+
+    The key is made of the normalised query, the representation that will be
+    returned and the identity of the file as resolved for the user, which
+    includes the version of the file. On a miss the key is kept on the request
+    so that the response is stored by store_response once it is encoded.
+
+    Returns
+    -------
+    flask.Response
+        None if the response is not cached
+    """
+    if RESPONSE_CACHE is None or file_id is None:
+        return None
+
+    mediatype = request.accept_mimetypes.best_match(
+        list(REST_API.representations), default=REST_API.default_mediatype)
+    key = (
+        request.endpoint, METADATA_CACHE.file_identity(user_id, file_id), mediatype,
+        request.url_root, tuple(sorted(request.args.items(multi=True))))
+
+    entry = RESPONSE_CACHE.get(key)
+    if entry is None:
+        g.response_cache_key = key
+        return None
+
+    resp = Response(entry.body, 200, entry.headers)
+    resp.headers['X-Adjacency-Cache'] = 'hit'
+    return resp
+
+def tee_body(body, key, headers):
+    """
+    Pass a streamed body through, storing it in the response cache once it has
+    been sent completely
+    """
+    blocks = []
+    size = 0
+    for block in body:
+        if size <= RESPONSE_CACHE.memory.max_bytes:
+            blocks.append(block if isinstance(block, bytes) else block.encode('utf-8'))
+            size += len(blocks[-1])
+        yield block
+
+    if size <= RESPONSE_CACHE.memory.max_bytes:
+        RESPONSE_CACHE.put(key, CachedResponse(b''.join(blocks), headers))
+
+@APP.after_request
+def store_response(response):
+    """
+    Store the encoded body of a response that missed the response cache
+    """
+    key = g.pop('response_cache_key', None)
+    if key is None or response.status_code != 200:
+        return response
+
+    headers = [
+        (name, value) for name, value in response.headers.items()
+        if name == 'Content-Type' or name.startswith('X-Adjacency-')
+    ]
+    if response.is_streamed:
+        response.response = tee_body(response.response, key, headers)
+    else:
+        RESPONSE_CACHE.put(key, CachedResponse(response.get_data(), headers))
+    return response
+
+@REST_API.representation('application/json')
+@timed('serialize')
+def output_json(data, code, headers=None):
+    """
+    JSON representation that serialises interaction columns as a list of
+    interactions
+
+    The list of interactions is encoded straight from the columns, see
+    rest.serializers.iter_values_json, and the rest of the response with
+    orjson when it is installed. Setting RESTFUL_JSON options or running in
+    debug mode uses the standard library json module for the whole response.
+    """
+    settings = APP.config.get('RESTFUL_JSON', {}).copy()
+    if APP.debug:
+        settings.setdefault('indent', 4)
+    accelerated = APP.config['ADJACENCY_JSON_ACCELERATED']
+
+    if settings:
+        body = json.dumps(data, cls=AdjacencyJSONEncoder, **settings).encode('utf-8')
+    elif isinstance(data, dict) and isinstance(data.get('values'), InteractionColumns):
+        # The interactions are encoded once and spliced into the response so
+        # that coalesced requests share the encoding
+        body = json_dumps(
+            dict((k, v) for k, v in data.items() if k != 'values'), accelerated)
+        body = (
+            body[:-1] + (b',' if len(body) > 2 else b'') +
+            b'"values":' + values_json(data['values'], accelerated) + b'}')
+    else:
+        body = json_dumps(data, accelerated)
+
+    resp = make_response(body + b"\n", code)
+    resp.headers.extend(headers or {})
+    return resp
+
 @REST_API.representation('application/tsv')
+@timed('serialize')
 def output_tsv(data, code, headers=None):
     """
     TSV representation for interactions
+
+    The rows are streamed to the client in blocks of ADJACENCY_TSV_BLOCK_SIZE
+    rows so that the memory used does not depend on the size of the result.
     """
     if request.endpoint == "values":
-        outstr = ''
-        for value in data["values"]:
-            outstr += str(value["chrA"]) + "\t" + str(value["startA"]) + "\t"
-            outstr += str(value["chrB"]) + "\t" + str(value["startB"]) + "\t"
-            outstr += str(value["value"]) + "\n"
-        resp = make_response(outstr, code)
+        body = iter_tsv(data["values"], APP.config['ADJACENCY_TSV_BLOCK_SIZE'])
+        resp = Response(stream_with_context(body), code)
         resp.headers.extend(headers or {})
         return resp
 
+def binary_headers(data, headers=None):
+    """
+    Headers describing a binary interaction response
+
+    The chromosome table is sent as a JSON list so that the chromosome codes
+    in the body can be resolved.
+    """
+    bin_headers = {
+        'X-Adjacency-Chromosomes': json.dumps(data["values"].chromosomes),
+        'X-Adjacency-Interaction-Count': str(len(data["values"])),
+        'X-Adjacency-Resolution': str(data["resolution"])
+    }
+    bin_headers.update(headers or {})
+    return bin_headers
+
+@REST_API.representation('application/x-npy')
+@timed('serialize')
+def output_npy(data, code, headers=None):
+    """
+    NumPy .npy representation for interactions and matrix blocks
+
+    For interactions the body is a 1D structured array with the fields chrA,
+    startA, chrB, startB and value that can be loaded with numpy.load. chrA
+    and chrB are codes into the list of chromosomes in the
+    X-Adjacency-Chromosomes header.
+
+    For matrix blocks the body is the 2D array, with the bins of the first row
+    and column in the X-Adjacency-Row-Offset and X-Adjacency-Col-Offset
+    headers.
+    """
+    if request.endpoint in ("values", "value") and isinstance(data.get("values"), InteractionColumns):
+        body = iter_npy(data["values"], APP.config['ADJACENCY_BINARY_BLOCK_SIZE'])
+        return Response(
+            stream_with_context(body), code, headers=binary_headers(data, headers))
+    if request.endpoint in ("matrix", "tile") and isinstance(data.get("matrix"), MatrixBlock):
+        matrix_headers = {
+            'X-Adjacency-Row-Offset': str(data["matrix"].row_offset),
+            'X-Adjacency-Col-Offset': str(data["matrix"].col_offset),
+            'X-Adjacency-Resolution': str(data["resolution"])
+        }
+        matrix_headers.update(headers or {})
+        return Response(data["matrix"].to_npy(), code, headers=matrix_headers)
+    return output_json(data, code, headers)
+
+@timed('serialize')
+def output_arrow(data, code, headers=None):
+    """
+    Apache Arrow IPC stream representation for interactions
+
+    chrA and chrB are dictionary encoded, the resolution and region are
+    attached to the schema meta data.
+    """
+    if request.endpoint in ("values", "value") and isinstance(data.get("values"), InteractionColumns):
+        metadata = {
+            k: str(data[k]) for k in (
+                'resolution', 'chr', 'start', 'end',
+                'limit_chr', 'limit_start', 'limit_end') if k in data
+        }
+        body = iter_arrow(
+            data["values"], APP.config['ADJACENCY_BINARY_BLOCK_SIZE'], metadata)
+        return Response(
+            stream_with_context(body), code, headers=binary_headers(data, headers))
+    return output_json(data, code, headers)
+
+# pyarrow is optional, Arrow streams are only offered when it is installed
+if pyarrow is not None:
+    REST_API.representation('application/vnd.apache.arrow.stream')(output_arrow)
+
 def help_usage(error_message, status_code,
                parameters_required, parameters_provided):
     """
@@ -95,6 +1110,32 @@ def help_usage(error_message, status_code,
             "int", "OPTIONAL"],
         "pos_x" : ["Position i", "int", "REQUIRED"],
         "pos_y" : ["Position j", "int", "REQUIRED"],
+        "links" : [
+            "Add a getValue link to every interaction. By default a single URI template is given in _links._getValue",
+            "bool", "OPTIONAL"],
+        "page_size" : [
+            "Maximum number of interactions to return. Further pages are fetched by passing the returned cursor",
+            "int", "OPTIONAL"],
+        "cursor" : [
+            "Continuation cursor from a previous page of the same query",
+            "str", "OPTIONAL"],
+        "partitions" : [
+            "Split the region into this many independent cursors that can be paged through in parallel",
+            "int", "OPTIONAL"],
+        "cell_budget" : [
+            "Maximum number of matrix cells to read. Coarser pre-computed zoom levels are used for regions that would exceed it",
+            "int", "OPTIONAL"],
+        "min_value" : [
+            "Only return interactions with a value of at least min_value",
+            "float", "OPTIONAL"],
+        "max_value" : [
+            "Only return interactions with a value of at most max_value",
+            "float", "OPTIONAL"],
+        "top_n" : [
+            "Only return the top_n interactions with the highest values. Cannot be combined with paging",
+            "int", "OPTIONAL"],
+        "format" : ["tsv|npy|hdf5", "str", "REQUIRED"],
+        "job_id" : ["Export job ID", "str", "REQUIRED"],
         "type" : ["add_meta|remove_meta", "str", "REQUIRED"]
     }
 
@@ -117,6 +1158,9 @@ def help_usage(error_message, status_code,
 
     if error_message != None:
         message['error'] = error_message
+        # The message is sent with a 200 status, so store_response has to be
+        # told not to cache it
+        g.pop('response_cache_key', None)
 
     return message
 
@@ -145,8 +1189,12 @@ class GetEndPoints(Resource):
                 '_self': request.base_url,
                 '_details': request.url_root + 'mug/api/adjacency/details',
                 '_getInteractions': request.url_root + 'mug/api/adjacency/getInteractions',
+                '_getMatrix': request.url_root + 'mug/api/adjacency/getMatrix',
+                '_tile': request.url_root + 'mug/api/adjacency/tile',
                 '_getValue': request.url_root + 'mug/api/adjacency/getValue',
+                '_export': request.url_root + 'mug/api/adjacency/export',
                 '_ping': request.url_root + 'mug/api/adjacency/ping',
+                '_metrics': request.url_root + 'mug/api/adjacency/metrics',
                 '_parent': request.url_root + 'mug/api'
             }
         }
@@ -211,9 +1259,15 @@ class GetDetails(Resource):
             #request_path = request.path
             #rp = request_path.split("/")
 
-            hdf5_handle = adjacency(user_id["user_id"], file_id)
-            h5_data = hdf5_handle.get_details()
-            hdf5_handle.close()
+            meta = get_metadata(user_id["user_id"], file_id)
+
+            headers = {'ETag': '"' + meta.etag + '"'}
+            if meta.last_modified is not None:
+                headers['Last-Modified'] = http_date(meta.last_modified)
+
+            unchanged = not_modified(meta.etag, headers, meta.last_modified)
+            if unchanged is not None:
+                return unchanged
 
             return {
                 '_links': {
@@ -221,10 +1275,10 @@ class GetDetails(Resource):
                     '_parent': request.url_root + 'mug/api/adjacency'
                 },
                 'chromosomes' : [
-                    {'chromosome' : c[0], 'length' : c[1]} for c in h5_data["chromosomes"]
+                    {'chromosome' : c[0], 'length' : c[1]} for c in meta.chromosomes
                 ],
-                'resolutions' : h5_data['resolutions']
-            }
+                'resolutions' : meta.resolutions
+            }, 200, headers
 
         return help_usage('Forbidden', 403, params_required, {})
 
@@ -265,6 +1319,33 @@ class GetInteractions(Resource):
         limit_end : int
             End position for a specific interacting chromosomal region This
             is to be used in conjunction with the limit_chr parameter
+        links : bool
+            Add a _links getValue URL to every interaction. Without it the
+            response carries a single URI template in _links._getValue with
+            {pos_x} and {pos_y} placeholders
+        cell_budget : int
+            Maximum number of matrix cells to read. When the region would
+            exceed it at the requested resolution the finest pre-computed zoom
+            level within the budget is used instead. Defaults to the
+            ADJACENCY_CELL_BUDGET setting. Cannot be combined with paging
+        page_size : int
+            Return at most this many interactions, ordered by pos_x then pos_y.
+            If there are more the response includes a cursor and a _links._next
+            URL for the next page
+        cursor : str
+            Opaque continuation cursor from a previous page of the same query.
+            Only the rows needed for the page are read
+        partitions : int
+            Instead of returning interactions, split the rows of the region
+            into this many bands and return a starting cursor for each in
+            cursors. The bands can then be paged through in parallel
+        min_value : float
+            Only return interactions with a value of at least min_value
+        max_value : float
+            Only return interactions with a value of at most max_value
+        top_n : int
+            Only return the top_n interactions with the highest values, ordered
+            by descending value. Cannot be combined with paging
 
         Returns
         -------
@@ -278,7 +1359,8 @@ class GetInteractions(Resource):
             end : int
                 End position for a selected region
             res : int
-                Resolution of the dataset requested
+                Resolution of the returned interactions. This is coarser than
+                the requested resolution when a zoom level has been used
             limit_chr : str
                 Limit the interactions returned to those between chr and
             limit_start : int
@@ -325,9 +1407,37 @@ class GetInteractions(Resource):
         4. Starting position for chromosome 2
         5. Value
 
+        For analysis clients the interactions can also be returned as typed
+        binary columns by requesting either ``application/x-npy`` (a NumPy
+        .npy file holding a structured array) or
+        ``application/vnd.apache.arrow.stream`` (an Apache Arrow IPC stream,
+        only available when pyarrow is installed):
+
+        .. code-block:: none
+           :linenos:
+
+           curl -X GET
+               -H "Accept: application/x-npy"
+               -H "Authorization: Bearer teststring"
+               http://localhost:5001/mug/api/adjacency/getInteractions?file_id=test_file&chr=<chr_id>&res=<res>
+
+        Both have the columns chrA, startA, chrB, startB and value. The
+        chromosome columns are codes into the JSON list of chromosome names in
+        the X-Adjacency-Chromosomes header. In the .npy file they are 16 bit
+        unsigned integers, or 32 bit for files of more than 65536 chromosomes.
+
+        When the response cache is enabled with ADJACENCY_RESPONSE_CACHE_BYTES
+        the encoded responses are cached, keyed on the query, the
+        representation and the version of the file. Responses served from the
+        cache have an X-Adjacency-Cache: hit header.
+
         """
         if user_id is not None:
             file_id = request.args.get('file_id')
+
+            cached = cached_response(user_id["user_id"], file_id)
+            if cached is not None:
+                return cached
             chr_id = request.args.get('chr')
             start = request.args.get('start')
             end = request.args.get('end')
@@ -335,11 +1445,21 @@ class GetInteractions(Resource):
             limit_chr = request.args.get('limit_chr')
             limit_start = request.args.get('limit_start')
             limit_end = request.args.get('limit_end')
-            no_links = request.args.get('no_links')
+            links = request.args.get('links')
+
+            cell_budget = request.args.get('cell_budget', APP.config['ADJACENCY_CELL_BUDGET'])
+            page_size = request.args.get('page_size')
+            cursor = request.args.get('cursor')
+            partitions = request.args.get('partitions')
+            min_value = request.args.get('min_value')
+            max_value = request.args.get('max_value')
+            top_n = request.args.get('top_n')
 
             params_required = [
                 'user_id', 'file_id', 'chr_id', 'start', 'end', 'res',
-                'limit_chr', 'limit_start', 'limit_end']
+                'limit_chr', 'limit_start', 'limit_end', 'links', 'cell_budget',
+                'page_size', 'cursor', 'partitions', 'min_value', 'max_value',
+                'top_n']
             params = [user_id, file_id, chr_id, start, end, resolution]
 
             # Display the parameters available
@@ -373,12 +1493,10 @@ class GetInteractions(Resource):
                     }
                 )
 
-            hdf5_handle = adjacency(user_id["user_id"], file_id, resolution)
-            details = hdf5_handle.get_details()
-            #print("Details:", details)
+            meta = get_metadata(user_id["user_id"], file_id)
 
             # ERROR - the requested resolution is not available
-            if resolution not in details["resolutions"]:
+            if resolution not in meta.resolutions:
                 return help_usage(
                     'Resolution Not Available', 400, params_required,
                     {
@@ -388,6 +1506,7 @@ class GetInteractions(Resource):
                         'limit_start' : limit_start, 'limit_end' : limit_end
                     }
                 )
+            g.metrics_resolution = str(resolution)
 
             if limit_start is not None or limit_end is not None:
                 if limit_chr is None:
@@ -415,19 +1534,146 @@ class GetInteractions(Resource):
                         }
                     )
 
-            value_url = request.url_root + 'mug/api/adjacency/getValue'
+            index = meta.index(resolution)
 
-            h5_data = hdf5_handle.get_range(
-                chr_id, start, end, limit_chr, limit_start, limit_end,
-                value_url, no_links)
-            hdf5_handle.close()
-            #app.logger.warn(h5_data["log"])
+            # ERROR - the requested chromosome is not in the dataset
+            if chr_id not in index or (limit_chr is not None and limit_chr not in index):
+                return help_usage(
+                    'Chromosome Not Available', 400, params_required,
+                    {
+                        'file_id' : file_id,
+                        'chr' : chr_id, 'start' : start, 'end' : end,
+                        'res' : resolution, 'limit_chr' : limit_chr,
+                        'limit_start' : limit_start, 'limit_end' : limit_end
+                    }
+                )
 
-            return {
-                '_links': {
-                    '_self': request.url,
-                    '_parent': request.url_root + 'mug/api/adjacency'
-                },
+            value_filter = {
+                'min_value' : min_value, 'max_value' : max_value, 'top_n' : top_n
+            }
+            try:
+                min_value = None if min_value is None else float(min_value)
+                max_value = None if max_value is None else float(max_value)
+                top_n = None if top_n is None else int(top_n)
+            except ValueError:
+                # ERROR - one of the parameters is not of numeric type
+                return help_usage('IncorrectParameterType', 400, params_required, value_filter)
+
+            if top_n is not None and top_n < 1:
+                return help_usage('IncorrectParameterType', 400, params_required, value_filter)
+            value_filter = {
+                'min_value' : min_value, 'max_value' : max_value, 'top_n' : top_n
+            }
+
+            # Concurrent requests for the same query share a single read
+            flight_key = (
+                'interactions', METADATA_CACHE.file_identity(user_id["user_id"], file_id),
+                resolution, chr_id, start, end, limit_chr, limit_start, limit_end,
+                min_value, max_value, top_n)
+
+            page = None
+            if page_size is not None or cursor is not None or partitions is not None:
+                provided = {
+                    'file_id' : file_id,
+                    'chr' : chr_id, 'start' : start, 'end' : end,
+                    'res' : resolution, 'limit_chr' : limit_chr,
+                    'limit_start' : limit_start, 'limit_end' : limit_end,
+                    'page_size' : page_size, 'cursor' : cursor,
+                    'partitions' : partitions, 'top_n' : top_n
+                }
+
+                # ERROR - zoom levels and top_n selections cannot be paged through
+                if request.args.get('cell_budget') is not None or top_n is not None:
+                    return help_usage('IncompatibleParameters', 400, params_required, provided)
+
+                try:
+                    page_size = int(page_size or APP.config['ADJACENCY_PAGE_SIZE'])
+                    partitions = None if partitions is None else int(partitions)
+                except ValueError:
+                    # ERROR - one of the parameters is not of integer type
+                    return help_usage('IncorrectParameterType', 400, params_required, provided)
+
+                # ERROR - an empty page would return the same cursor forever
+                if page_size < 1 or (partitions is not None and partitions < 1):
+                    return help_usage('IncorrectParameterType', 400, params_required, provided)
+
+                x_bins, y_bins = range_bins(
+                    index, chr_id, start, end, limit_chr, limit_start, limit_end)
+                fingerprint = query_fingerprint(
+                    file_id, resolution, chr_id, start, end,
+                    limit_chr, limit_start, limit_end, min_value, max_value)
+
+                position = None
+                if cursor is not None:
+                    try:
+                        row, column, end_row = decode_cursor(cursor, fingerprint)
+                    except InvalidCursor:
+                        # ERROR - the cursor is not from this query
+                        return help_usage('InvalidCursor', 400, params_required, provided)
+                    position = (row, column)
+                    x_bins = (x_bins[0], min(x_bins[1], end_row))
+
+                page = {'page_size': page_size, 'cursor': None}
+                if partitions is not None and cursor is None:
+                    # Only plan the scan, each cursor is then paged through
+                    # independently
+                    page['cursors'] = partition_cursors(
+                        fingerprint, x_bins, y_bins[0], partitions)
+                    values, log = InteractionColumns.empty(index.names), []
+                else:
+                    values, next_position, log = COALESCER.do(
+                        flight_key + (x_bins, position, page_size),
+                        read_interactions_page,
+                        user_id["user_id"], file_id, resolution, meta,
+                        (chr_id, start, end, limit_chr, limit_start, limit_end),
+                        x_bins, y_bins, position, page_size,
+                        {'min_value': min_value, 'max_value': max_value})
+                    if next_position is not None:
+                        page['cursor'] = encode_cursor(
+                            fingerprint, next_position[0], next_position[1], x_bins[1])
+            elif cell_budget is not None:
+                try:
+                    cell_budget = int(cell_budget)
+                except ValueError:
+                    # ERROR - one of the parameters is not of integer type
+                    return help_usage(
+                        'IncorrectParameterType', 400, params_required,
+                        {
+                            'file_id' : file_id,
+                            'chr' : chr_id, 'start' : start, 'end' : end,
+                            'res' : resolution, 'cell_budget' : cell_budget
+                        }
+                    )
+
+                values, log, resolution = COALESCER.do(
+                    flight_key + (cell_budget,), read_planned_interactions,
+                    user_id["user_id"], file_id, resolution, meta, cell_budget,
+                    chr_id, start, end, limit_chr, limit_start, limit_end,
+                    value_filter)
+            else:
+                values, log = COALESCER.do(
+                    flight_key, read_interactions,
+                    user_id["user_id"], file_id, resolution, meta,
+                    chr_id, start, end, limit_chr, limit_start, limit_end,
+                    value_filter)
+            #app.logger.warn(log)
+
+            response_links = {
+                '_self': request.url,
+                '_parent': request.url_root + 'mug/api/adjacency'
+            }
+
+            # Zoom levels are not available from getValue
+            if resolution in meta.resolutions:
+                value_url = (
+                    request.url_root + 'mug/api/adjacency/getValue?file_id=' +
+                    str(file_id) + '&res=' + str(resolution))
+                response_links['_getValue'] = value_url + '&pos_x={pos_x}&pos_y={pos_y}'
+                if links is not None:
+                    values = values.with_links(value_url)
+
+            response = {
+                '_links': response_links,
                 'resolution': resolution,
                 'chr': chr_id,
                 'start': start,
@@ -435,11 +1681,25 @@ class GetInteractions(Resource):
                 'limit_chr': limit_chr,
                 'limit_start' : limit_start,
                 'limit_end' : limit_end,
-                'interaction_count': len(h5_data["results"]),
-                'values': h5_data["results"],
-                'log': h5_data["log"]
+                'interaction_count': len(values),
+                'values': values,
+                'log': log
             }
 
+            if top_n is not None:
+                response['top_n'] = top_n
+
+            if page is not None:
+                response.update(page)
+                if page['cursor'] is not None:
+                    next_args = request.args.to_dict()
+                    next_args.pop('partitions', None)
+                    next_args['cursor'] = page['cursor']
+                    next_args['page_size'] = page_size
+                    response_links['_next'] = request.base_url + '?' + urlencode(next_args)
+
+            return response
+
         return help_usage(
             'Forbidden', 403,
             [
@@ -447,18 +1707,19 @@ class GetInteractions(Resource):
                 'limit_chr', 'limit_start', 'limit_end'
             ], {})
 
-class GetValue(Resource):
+class GetMatrix(Resource):
     """
-    Class to handle the http requests for retrieving a single value from a given
-    dataset
+    Class to handle the http requests for retrieving a dense block of the
+    adjacency matrix for a region
     """
 
     @authorized
     def get(self, user_id):
         """
-        GET single value
+        GET dense matrix block
 
-        Call to get a single value for a spcific bin x bin location
+        Call to get the values for every bin x bin pair between two regions as
+        a single contiguous block.
 
         Parameters
         ----------
@@ -466,10 +1727,303 @@ class GetValue(Resource):
             User ID
         file_id : str
             Identifier of the file to retrieve data from
-        pos_x : int
-            Location of the window on the first region of interest
-        pos_y : int
-            Location of the window on the second region of interest
+        chrom : str
+            Chromosome identifier for the rows of the block
+        start : int
+            Start position for the rows of the block
+        end : int
+            End position for the rows of the block
+        res : int
+            Resolution of the dataset requested
+        limit_chr : str
+            Chromosome identifier for the columns of the block. If not given
+            the columns cover the same region as the rows
+        limit_start : int
+            Start position for the columns of the block. This is to be used in
+            conjunction with the limit_chr parameter
+        limit_end : int
+            End position for the columns of the block. This is to be used in
+            conjunction with the limit_chr parameter
+
+        Returns
+        -------
+        dict
+            resolution : int
+                Resolution of the dataset requested
+            chr, start, end : str, int, int
+                Region for the rows
+            limit_chr, limit_start, limit_end : str, int, int
+                Region for the columns
+            matrix : dict
+                dtype : str
+                    NumPy type string of the values
+                shape : list
+                    Number of rows and columns
+                row_offset : int
+                    Bin of the first row, matches pos_x from getValue
+                col_offset : int
+                    Bin of the first column, matches pos_y from getValue
+                encoding : str
+                    base64
+                data : str
+                    Row major values of the block
+
+        Examples
+        --------
+        .. code-block:: none
+           :linenos:
+
+           curl -X GET
+               -H "Authorization: Bearer teststring"
+               http://localhost:5001/mug/api/adjacency/getMatrix?file_id=test_file&chr=<chr_id>&start=<start>&end=<end>&res=<res>
+
+        Notes
+        -----
+        The block can be returned as a NumPy .npy file by requesting
+        ``application/x-npy``. The bins of the first row and column are then
+        in the X-Adjacency-Row-Offset and X-Adjacency-Col-Offset headers.
+        """
+        params_required = [
+            'file_id', 'chr_id', 'start', 'end', 'res',
+            'limit_chr', 'limit_start', 'limit_end']
+
+        if user_id is not None:
+            file_id = request.args.get('file_id')
+            chr_id = request.args.get('chr')
+            start = request.args.get('start')
+            end = request.args.get('end')
+            resolution = request.args.get('res')
+            limit_chr = request.args.get('limit_chr')
+            limit_start = request.args.get('limit_start')
+            limit_end = request.args.get('limit_end')
+
+            params = [user_id, file_id, chr_id, start, end, resolution]
+            provided = {
+                'file_id' : file_id,
+                'chr' : chr_id, 'start' : start, 'end' : end,
+                'res' : resolution, 'limit_chr' : limit_chr,
+                'limit_start' : limit_start, 'limit_end' : limit_end
+            }
+
+            # Display the parameters available
+            if sum([x is None for x in params]) == len(params):
+                return help_usage(None, 200, params_required, {})
+
+            # ERROR - one of the required parameters is NoneType
+            if sum([x is not None for x in params]) != len(params):
+                return help_usage('MissingParameters', 400, params_required, provided)
+
+            if limit_chr is None:
+                limit_chr = chr_id
+                if limit_start is None and limit_end is None:
+                    limit_start = start
+                    limit_end = end
+
+            try:
+                start = int(start)
+                end = int(end)
+                resolution = int(resolution)
+                limit_start = None if limit_start is None else int(limit_start)
+                limit_end = None if limit_end is None else int(limit_end)
+            except ValueError:
+                # ERROR - one of the parameters is not of integer type
+                return help_usage('IncorrectParameterType', 400, params_required, provided)
+
+            meta = get_metadata(user_id["user_id"], file_id)
+
+            # ERROR - the requested resolution is not available
+            if resolution not in meta.resolutions:
+                return help_usage('Resolution Not Available', 400, params_required, provided)
+            g.metrics_resolution = str(resolution)
+
+            index = meta.index(resolution)
+
+            # ERROR - the requested chromosome is not in the dataset
+            if chr_id not in index or limit_chr not in index:
+                return help_usage('Chromosome Not Available', 400, params_required, provided)
+
+            x_bins = index.region_bins(chr_id, start, end)
+            y_bins = index.region_bins(limit_chr, limit_start, limit_end)
+            cells = (x_bins[1] - x_bins[0]) * (y_bins[1] - y_bins[0])
+
+            # ERROR - the block is too large to return in one go
+            if cells > APP.config['ADJACENCY_MATRIX_MAX_CELLS']:
+                return help_usage('RegionTooLarge', 400, params_required, provided)
+
+            matrix = read_matrix_block(
+                user_id["user_id"], file_id, resolution, meta,
+                (chr_id, start, end), (limit_chr, limit_start, limit_end))
+
+            return {
+                '_links': {
+                    '_self': request.url,
+                    '_parent': request.url_root + 'mug/api/adjacency'
+                },
+                'resolution': resolution,
+                'chr': chr_id,
+                'start': start,
+                'end': end,
+                'limit_chr': limit_chr,
+                'limit_start' : limit_start,
+                'limit_end' : limit_end,
+                'matrix': matrix
+            }
+
+        return help_usage('Forbidden', 403, params_required, {})
+
+class GetTile(Resource):
+    """
+    Class to handle the http requests for fixed size tiles of the matrix for
+    heatmap viewers
+    """
+
+    @authorized
+    def get(self, user_id, file_id, res, chr_id, tile_x, tile_y):  # pylint: disable=too-many-arguments
+        """
+        GET matrix tile
+
+        Call to get an aligned square block of ADJACENCY_TILE_SIZE x
+        ADJACENCY_TILE_SIZE bins of the matrix for a chromosome. As the tiles
+        only depend on the URL and the user they are sent with a strong ETag,
+        a private Cache-Control header and Vary: Authorization and are held in
+        a server side cache.
+
+        Parameters
+        ----------
+        user_id : str
+            User ID
+        file_id : str
+            Identifier of the file to retrieve data from
+        res : int
+            Resolution of the dataset requested, either one of the resolutions
+            in the file or a pre-computed zoom level
+        chr_id : str
+            Chromosome identifier
+        tile_x : int
+            Tile along the rows, covering bins tile_x * size to
+            (tile_x + 1) * size of the chromosome
+        tile_y : int
+            Tile along the columns
+
+        Returns
+        -------
+        dict
+            resolution : int
+                Resolution of the tile
+            chr : str
+                Chromosome ID
+            x, y : int
+                Tile coordinates
+            tile_size : int
+                Number of bins along each side of the tile
+            matrix : dict
+                Values of the tile, see GetMatrix
+
+        Examples
+        --------
+        .. code-block:: none
+           :linenos:
+
+           curl -X GET
+               -H "Accept: application/x-npy"
+               -H "Authorization: Bearer teststring"
+               http://localhost:5001/mug/api/adjacency/tile/test_file/10000/chr1/0/1
+        """
+        params_required = ['file_id', 'res', 'chr_id']
+        provided = {
+            'file_id' : file_id, 'res' : res, 'chr' : chr_id,
+            'x' : tile_x, 'y' : tile_y
+        }
+
+        if user_id is not None:
+            tile_size = APP.config['ADJACENCY_TILE_SIZE']
+            meta = get_metadata(user_id["user_id"], file_id)
+            index = meta.index(res)
+
+            # ERROR - the requested chromosome is not in the dataset
+            if chr_id not in index:
+                return help_usage('Chromosome Not Available', 400, params_required, provided)
+
+            bin_count = int(index.bin_counts[index.code(chr_id)])
+            if max(tile_x, tile_y) * tile_size >= bin_count:
+                return help_usage('TileOutOfRange', 400, params_required, provided)
+
+            # Tiles of the zoom levels are read from the pyramid sidecar,
+            # which can be rebuilt without the adjacency file changing
+            path, _ = METADATA_CACHE.file_identity(user_id["user_id"], file_id)
+            pyramid_version = None
+            if res not in meta.resolutions and isinstance(path, str):
+                try:
+                    stat = os.stat(pyramid_path(path))
+                    pyramid_version = (stat.st_mtime, stat.st_size)
+                except OSError:
+                    pass
+
+            etag = hashlib.sha1(repr(
+                (file_id, meta.etag, pyramid_version, res, chr_id, tile_x, tile_y, tile_size)
+            ).encode('utf-8')).hexdigest()
+            headers = {
+                'ETag': '"' + etag + '"',
+                'Cache-Control': APP.config['ADJACENCY_TILE_CACHE_CONTROL'],
+                'Vary': 'Authorization'
+            }
+
+            unchanged = not_modified(etag, headers)
+            if unchanged is not None:
+                return unchanged
+
+            cache_key = (path, etag)
+            block = TILE_CACHE.get(cache_key)
+            if block is None:
+                block = read_tile(
+                    user_id["user_id"], file_id, res, meta,
+                    chr_id, tile_x, tile_y, tile_size)
+
+                # ERROR - the requested resolution is not available
+                if block is None:
+                    return help_usage('Resolution Not Available', 400, params_required, provided)
+
+                TILE_CACHE.put(cache_key, block, block.data.nbytes)
+            g.metrics_resolution = str(res)
+
+            return {
+                '_links': {
+                    '_self': request.base_url,
+                    '_parent': request.url_root + 'mug/api/adjacency'
+                },
+                'resolution': res,
+                'chr': chr_id,
+                'x': tile_x,
+                'y': tile_y,
+                'tile_size': tile_size,
+                'matrix': block
+            }, 200, headers
+
+        return help_usage('Forbidden', 403, params_required, {})
+
+class GetValue(Resource):
+    """
+    Class to handle the http requests for retrieving a single value from a given
+    dataset
+    """
+
+    @authorized
+    def get(self, user_id):
+        """
+        GET single value
+
+        Call to get a single value for a spcific bin x bin location
+
+        Parameters
+        ----------
+        user_id : str
+            User ID
+        file_id : str
+            Identifier of the file to retrieve data from
+        pos_x : int
+            Location of the window on the first region of interest
+        pos_y : int
+            Location of the window on the second region of interest
         res : int
             Resolution of the dataset requested
 
@@ -537,15 +2091,38 @@ class GetValue(Resource):
                     }
                 )
 
-            h5_handle = adjacency(user_id["user_id"], file_id, resolution)
-            #meta_data = h5.get_details()
-            #print("chr_param:", meta_data["chr_param"])
-            value = h5_handle.get_value(pos_x, pos_y)
+            meta = get_metadata(user_id["user_id"], file_id)
 
-            chr_a_id = h5_handle.get_chromosome_from_array_index(pos_x)
-            chr_b_id = h5_handle.get_chromosome_from_array_index(pos_y)
+            # ERROR - the requested resolution is not available
+            if resolution not in meta.resolutions:
+                return help_usage(
+                    'Resolution Not Available', 400, params_required,
+                    {
+                        'file_id' : file_id,
+                        'resolution' : resolution, 'pos_x' : pos_x, 'pos_y' : pos_y
+                    }
+                )
+            g.metrics_resolution = str(resolution)
 
-            h5_handle.close()
+            index = meta.index(resolution)
+
+            # ERROR - the requested bins are outside of the matrix
+            if min(pos_x, pos_y) < 0 or max(pos_x, pos_y) >= index.bin_count:
+                return help_usage(
+                    'PositionOutOfRange', 400, params_required,
+                    {
+                        'file_id' : file_id,
+                        'resolution' : resolution, 'pos_x' : pos_x, 'pos_y' : pos_y
+                    }
+                )
+
+            value = COALESCER.do(
+                ('value', METADATA_CACHE.file_identity(user_id["user_id"], file_id),
+                 resolution, pos_x, pos_y),
+                read_value, user_id["user_id"], file_id, resolution, pos_x, pos_y)
+
+            chr_a_id = index.locate(pos_x)[0]
+            chr_b_id = index.locate(pos_y)[0]
 
             return {
                 "_links": {
@@ -561,6 +2138,353 @@ class GetValue(Resource):
 
         return help_usage("Forbidden", 403, ["file_id", "res", "pos_x", "pos_y"], {})
 
+    @authorized
+    def post(self, user_id):
+        """
+        POST batch of values
+
+        Call to get the values for many bin x bin locations in a single
+        request. The locations can be sent either as JSON:
+
+        .. code-block:: none
+           :linenos:
+
+           {"file_id": "test_file", "res": 10000, "pos_x": [1, 2, 3], "pos_y": [4, 5, 6]}
+
+        or as the body of an ``application/x-npy`` request holding either a
+        structured array with the fields pos_x and pos_y or an (n, 2) integer
+        array, in which case file_id and res are passed as query parameters.
+
+        Parameters
+        ----------
+        user_id : str
+            User ID
+        file_id : str
+            Identifier of the file to retrieve data from
+        res : int
+            Resolution of the dataset requested
+        pos_x : list
+            Locations of the windows on the first region of interest
+        pos_y : list
+            Locations of the windows on the second region of interest
+
+        Returns
+        -------
+        dict
+            resolution : int
+                Resolution of the bins
+            value_count : int
+                Number of values returned
+            values : list
+                chrA, startA, chrB, startB, pos_x, pos_y and value for each
+                location in the order that they were requested
+
+        Examples
+        --------
+        .. code-block:: none
+           :linenos:
+
+           curl -X POST
+               -H "Authorization: Bearer teststring"
+               -H "Content-Type: application/json"
+               -d '{"file_id": "test_file", "res": 10000, "pos_x": [1, 2], "pos_y": [4, 5]}'
+               http://localhost:5001/mug/api/adjacency/getValue
+
+        Notes
+        -----
+        The values can be returned as a .npy file by requesting
+        ``application/x-npy``, see GetInteractions for the layout.
+        """
+        params_required = ['user_id', 'file_id', 'res', 'pos_x', 'pos_y']
+
+        if user_id is not None:
+            if request.mimetype == 'application/x-npy':
+                body = dict(request.args.items())
+                try:
+                    positions = np.load(io.BytesIO(request.get_data()), allow_pickle=False)
+                except (ValueError, EOFError, OSError):
+                    # ERROR - the body is empty, truncated or not a .npy file
+                    return help_usage('IncorrectParameterType', 400, params_required, body)
+                if not isinstance(positions, np.ndarray):
+                    # .npz archives load as a mapping of arrays
+                    return help_usage('IncorrectParameterType', 400, params_required, body)
+                if positions.dtype.names is not None:
+                    if 'pos_x' in positions.dtype.names and 'pos_y' in positions.dtype.names:
+                        body['pos_x'] = positions['pos_x']
+                        body['pos_y'] = positions['pos_y']
+                elif positions.ndim == 2 and positions.shape[1] == 2:
+                    body['pos_x'] = positions[:, 0]
+                    body['pos_y'] = positions[:, 1]
+            else:
+                body = request.get_json(silent=True)
+                # ERROR - the body is missing or is not a JSON object
+                if not isinstance(body, dict):
+                    return help_usage('MissingParameters', 400, params_required, {})
+
+            file_id = body.get('file_id')
+            resolution = body.get('res')
+            pos_x = body.get('pos_x')
+            pos_y = body.get('pos_y')
+
+            provided = {'file_id' : file_id, 'resolution' : resolution}
+
+            # ERROR - one of the required parameters is NoneType
+            if file_id is None or resolution is None or pos_x is None or pos_y is None:
+                return help_usage('MissingParameters', 400, params_required, provided)
+
+            try:
+                resolution = int(resolution)
+                pos_x = np.asarray(pos_x, dtype=np.int64).ravel()
+                pos_y = np.asarray(pos_y, dtype=np.int64).ravel()
+            except (TypeError, ValueError, OverflowError):
+                # ERROR - one of the parameters is not of integer type
+                return help_usage('IncorrectParameterType', 400, params_required, provided)
+
+            if len(pos_x) != len(pos_y):
+                return help_usage('MismatchedPositions', 400, params_required, provided)
+
+            if len(pos_x) > APP.config['ADJACENCY_BATCH_MAX_POINTS']:
+                return help_usage('TooManyPositions', 400, params_required, provided)
+
+            meta = get_metadata(user_id["user_id"], file_id)
+
+            # ERROR - the requested resolution is not available
+            if resolution not in meta.resolutions:
+                return help_usage('Resolution Not Available', 400, params_required, provided)
+            g.metrics_resolution = str(resolution)
+
+            bin_count = meta.index(resolution).bin_count
+            if len(pos_x) and (
+                    min(pos_x.min(), pos_y.min()) < 0 or
+                    max(pos_x.max(), pos_y.max()) >= bin_count):
+                return help_usage('PositionOutOfRange', 400, params_required, provided)
+
+            values = read_values(
+                user_id["user_id"], file_id, resolution, meta, pos_x, pos_y)
+
+            return {
+                '_links': {
+                    '_self': request.base_url,
+                    '_parent': request.url_root + 'mug/api/adjacency'
+                },
+                'resolution': resolution,
+                'value_count': len(values),
+                'values': values
+            }
+
+        return help_usage("Forbidden", 403, ["file_id", "res", "pos_x", "pos_y"], {})
+
+def export_status(status):
+    """
+    Status of an export job as returned to the client
+    """
+    job_url = request.url_root + 'mug/api/adjacency/export/' + status['job_id']
+    response = {k: v for k, v in status.items() if k != 'user_id'}
+    response['_links'] = {
+        '_self': job_url,
+        '_parent': request.url_root + 'mug/api/adjacency'
+    }
+    if status['status'] == 'done':
+        response['_links']['_download'] = job_url + '/download'
+    return response
+
+class Export(Resource):
+    """
+    Class to handle the http requests for starting exports of whole
+    resolutions that are too large to be returned from getInteractions
+    """
+
+    @authorized
+    def post(self, user_id):
+        """
+        POST start an export
+
+        Queues an export of every interaction at a resolution, or of a single
+        chromosome, to a file. The export runs in a background worker process,
+        its progress can be followed from the _self link that is returned and
+        the file is available from the _download link once the status is done.
+
+        Parameters
+        ----------
+        user_id : str
+            User ID
+        file_id : str
+            Identifier of the file to export
+        res : int
+            Resolution of the dataset to export
+        format : str
+            tsv, npy (structured array with the same columns as the
+            application/x-npy representation) or hdf5 (cooler style chroms,
+            bins, pixels and indexes groups holding the upper triangle)
+        chr : str
+            Only export the interactions of this chromosome
+
+        Returns
+        -------
+        dict
+            job_id : str
+                ID of the export
+            status : str
+                queued, running, done or failed
+            progress : float
+                Fraction of the rows that have been exported
+
+        Examples
+        --------
+        .. code-block:: none
+           :linenos:
+
+           curl -X POST
+               -H "Content-Type: application/json"
+               -H "Authorization: Bearer teststring"
+               -d '{"file_id": "test_file", "res": 10000, "format": "npy"}'
+               http://localhost:5001/mug/api/adjacency/export
+        """
+        params_required = ['file_id', 'res', 'format', 'chr_id']
+        body = request.get_json(silent=True) or request.args.to_dict()
+        if not isinstance(body, dict):
+            body = {}
+
+        if user_id is not None:
+            file_id = body.get('file_id')
+            resolution = body.get('res')
+            fmt = body.get('format')
+            chr_id = body.get('chr')
+
+            # ERROR - one of the required parameters is NoneType
+            if file_id is None or resolution is None or fmt is None:
+                return help_usage('MissingParameters', 400, params_required, body)
+
+            try:
+                resolution = int(resolution)
+            except (TypeError, ValueError, OverflowError):
+                # ERROR - one of the parameters is not of integer type
+                return help_usage('IncorrectParameterType', 400, params_required, body)
+
+            # ERROR - the format is not one that can be exported
+            if fmt not in EXPORT_FORMATS:
+                return help_usage('Format Not Available', 400, params_required, body)
+
+            meta = get_metadata(user_id["user_id"], file_id)
+            if resolution not in meta.resolutions:
+                return help_usage('Resolution Not Available', 400, params_required, body)
+            g.metrics_resolution = str(resolution)
+            if chr_id is not None and chr_id not in meta.index(resolution):
+                return help_usage('Chromosome Not Available', 400, params_required, body)
+
+            # The key falls back on the ids when the file cannot be located
+            path, _ = METADATA_CACHE.file_identity(user_id["user_id"], file_id)
+            if not isinstance(path, str):
+                return help_usage('File Not Available', 404, params_required, body)
+
+            try:
+                status = EXPORT_JOBS.submit(
+                    user_id["user_id"], path, meta.chromosomes, resolution, fmt, chr_id)
+            except SpoolFull:
+                # ERROR - no space for the export, try again later
+                return help_usage('SpoolFull', 503, params_required, body)
+
+            response = export_status(status)
+            return response, 202, {'Location': response['_links']['_self']}
+
+        return help_usage('Forbidden', 403, params_required, {})
+
+class GetExport(Resource):
+    """
+    Class to handle the http requests for the status of an export
+    """
+
+    @authorized
+    def get(self, user_id, job_id):
+        """
+        GET export status
+
+        Parameters
+        ----------
+        user_id : str
+            User ID
+        job_id : str
+            ID returned when the export was started
+
+        Returns
+        -------
+        dict
+            job_id : str
+                ID of the export
+            status : str
+                queued, running, done or failed
+            progress : float
+                Fraction of the rows that have been exported
+            interaction_count : int
+                Number of interactions written so far
+            size : int
+                Size of the file in bytes once the export is done
+            error : str
+                Reason that the export failed
+
+        Examples
+        --------
+        .. code-block:: none
+           :linenos:
+
+           curl -X GET
+               -H "Authorization: Bearer teststring"
+               http://localhost:5001/mug/api/adjacency/export/<job_id>
+        """
+        if user_id is not None:
+            status = EXPORT_JOBS.status(user_id["user_id"], job_id)
+            if status is None:
+                return help_usage('Job Not Found', 404, ['job_id'], {'job_id' : job_id})
+            return export_status(status)
+
+        return help_usage('Forbidden', 403, ['job_id'], {})
+
+class GetExportFile(Resource):
+    """
+    Class to handle the http requests for downloading a finished export
+    """
+
+    @authorized
+    def get(self, user_id, job_id):
+        """
+        GET export file
+
+        The file supports HTTP Range requests so that large downloads can be
+        resumed or fetched in parallel parts.
+
+        Parameters
+        ----------
+        user_id : str
+            User ID
+        job_id : str
+            ID returned when the export was started
+
+        Examples
+        --------
+        .. code-block:: none
+           :linenos:
+
+           curl -X GET
+               -H "Range: bytes=0-1048575"
+               -H "Authorization: Bearer teststring"
+               http://localhost:5001/mug/api/adjacency/export/<job_id>/download
+        """
+        if user_id is not None:
+            status = EXPORT_JOBS.status(user_id["user_id"], job_id)
+            if status is None:
+                return help_usage('Job Not Found', 404, ['job_id'], {'job_id' : job_id})
+
+            # ERROR - the export has not finished
+            if status['status'] != 'done':
+                return help_usage('Export Not Ready', 409, ['job_id'], {'job_id' : job_id})
+
+            return send_file(
+                EXPORT_JOBS.output_path(status),
+                mimetype=EXPORT_FORMATS[status['format']][1],
+                as_attachment=True, conditional=True)
+
+        return help_usage('Forbidden', 403, ['job_id'], {})
+
 class Ping(Resource):
     """
     Class to handle the http requests to ping a service
@@ -572,7 +2496,9 @@ class Ping(Resource):
         GET Status
 
         List the current status of the service along with the relevant
-        information about the version.
+        information about the version, the usage and hit rates of the chunk,
+        tile and response caches and the number of requests that shared a
+        read with a concurrent identical request.
 
         Examples
         --------
@@ -590,6 +2516,12 @@ class Ping(Resource):
             "license": release.__license__,
             "name":    release.__rest_name__,
             "description": release.__description__,
+            "caches": {
+                "chunks": CHUNK_CACHE.stats(),
+                "tiles": TILE_CACHE.stats()
+            },
+            "coalescing": COALESCER.stats(),
+            "response_cache": None if RESPONSE_CACHE is None else RESPONSE_CACHE.stats(),
             "_links" : {
                 '_self' : request.url_root + 'mug/api/adjacency/ping',
                 '_parent' : request.url_root + 'mug/api/adjacency'
@@ -597,6 +2529,34 @@ class Ping(Resource):
         }
         return res
 
+class Metrics(Resource):
+    """
+    Class to handle the http requests for the metrics of the service
+    """
+
+    @staticmethod
+    def get():
+        """
+        GET Metrics
+
+        Latency histograms for each endpoint, resolution and format and for
+        each phase of handling a request (metadata, open, read, serialize,
+        compress, stream and other), along with the occupancy of the handle
+        pools and caches, in the Prometheus text exposition format. The
+        metrics are for the process that handles the request.
+
+        Examples
+        --------
+        .. code-block:: none
+           :linenos:
+
+           curl -X GET http://localhost:5001/mug/api/adjacency/metrics
+
+        """
+        if not APP.config['ADJACENCY_METRICS']:
+            return help_usage('MetricsDisabled', 404, [], {})
+        return Response(METRICS.render(), 200, content_type=CONTENT_TYPE)
+
 #
 # For the services where there needs to be an extra layer (adjacency lists),
 # then there needs to be a way of forwarding for this. But the majority of
@@ -616,12 +2576,31 @@ REST_API.add_resource(GetDetails, "/mug/api/adjacency/details", endpoint='meta_d
 #   List the interactions for a given region
 REST_API.add_resource(GetInteractions, "/mug/api/adjacency/getInteractions", endpoint='values')
 
+#   Get a dense block of the matrix for a region
+REST_API.add_resource(GetMatrix, "/mug/api/adjacency/getMatrix", endpoint='matrix')
+
+#   Get fixed size tiles of the matrix for heatmap viewers
+REST_API.add_resource(
+    GetTile,
+    "/mug/api/adjacency/tile/<file_id>/<int:res>/<chr_id>/<int:tile_x>/<int:tile_y>",
+    endpoint='tile')
+
 #   Get a specific edge value for an interaction
 REST_API.add_resource(GetValue, "/mug/api/adjacency/getValue", endpoint="value")
 
+#   Start export jobs, poll their status and download the results
+REST_API.add_resource(Export, "/mug/api/adjacency/export", endpoint='export')
+REST_API.add_resource(
+    GetExport, "/mug/api/adjacency/export/<job_id>", endpoint='export_status')
+REST_API.add_resource(
+    GetExportFile, "/mug/api/adjacency/export/<job_id>/download", endpoint='export_download')
+
 #   Service ping
 REST_API.add_resource(Ping, "/mug/api/adjacency/ping", endpoint='adjacency-ping')
 
+#   Latency histograms and cache occupancy for monitoring
+REST_API.add_resource(Metrics, "/mug/api/adjacency/metrics", endpoint='adjacency-metrics')
+
 
 # Initialise the server
 if __name__ == "__main__":
@@ -0,0 +1,39 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+ASGI entry point for the service
+
+Serves the same endpoints, with the same URL layout and authorisation, as
+rest.app:APP. The requests are run on a bounded pool of threads, see
+rest.asgi_adapter.ASGIAdapter, sized with the ADJACENCY_ASGI_* settings.
+
+.. code-block:: none
+   :linenos:
+
+   uvicorn --host 127.0.0.1 --port 5002 rest.asgi:ASGI_APP
+"""
+
+from __future__ import print_function
+
+from rest.app import APP
+from rest.asgi_adapter import ASGIAdapter
+
+ASGI_APP = ASGIAdapter(
+    APP,
+    max_workers=APP.config['ADJACENCY_ASGI_WORKERS'],
+    max_pending=APP.config['ADJACENCY_ASGI_MAX_PENDING'],
+    stream_buffer=APP.config['ADJACENCY_ASGI_STREAM_BUFFER']
+)
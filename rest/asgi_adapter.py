@@ -0,0 +1,370 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+Serve a WSGI application from an ASGI server
+
+Each request is run, including iterating over the body, on a bounded pool of
+threads so that the event loop is never blocked by HDF5 reads. Requests
+beyond the capacity of the pool and its queue are turned away with a 503
+rather than queueing without limit. Bodies are passed to the server through
+a small queue, so a thread producing a large body waits for a slow client
+instead of buffering the whole body, and the work for a request is abandoned
+when its client disconnects.
+"""
+
+from __future__ import print_function
+
+import asyncio
+import io
+import json
+import sys
+import threading
+import traceback
+
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+
+class Disconnected(Exception):
+    """
+    Raised in the worker thread when the client of the request has gone
+    """
+
+
+def wsgi_environ(scope, body):
+    """
+    Build the WSGI environ for an ASGI HTTP scope
+
+    Parameters
+    ----------
+    scope : dict
+        ASGI HTTP connection scope
+    body : bytes
+        Request body
+
+    Returns
+    -------
+    dict
+    """
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            key = 'CONTENT_TYPE'
+        elif name == 'CONTENT_LENGTH':
+            continue
+        else:
+            key = 'HTTP_' + name
+        if key in environ and key != 'CONTENT_TYPE':
+            value = environ[key] + ',' + value
+        environ[key] = value
+    return environ
+
+
+class ASGIAdapter(object):
+    """
+    ASGI application that runs a WSGI application on a bounded thread pool
+    """
+
+    def __init__(self, wsgi_app, max_workers=16, max_pending=64, stream_buffer=8):
+        """
+        Parameters
+        ----------
+        wsgi_app : function
+            WSGI application
+        max_workers : int
+            Number of threads running requests
+        max_pending : int
+            Maximum number of requests that are running or waiting for a
+            thread, further requests get a 503
+        stream_buffer : int
+            Number of blocks of a body held between the thread producing them
+            and the server
+        """
+        self.wsgi_app = wsgi_app
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.stream_buffer = stream_buffer
+
+        self.pending = 0
+        self.rejected = 0
+        self.cancelled = 0
+        self._executor = None
+
+    @property
+    def executor(self):
+        """
+        The thread pool, created on first use so that it is not inherited by
+        forked workers
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    def shutdown(self):
+        """
+        Stop the thread pool once the running requests have finished
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.http(scope, receive, send)
+        else:
+            raise ValueError('Unsupported ASGI scope type: ' + scope['type'])
+
+    async def lifespan(self, receive, send):
+        """
+        Handle the start up and shut down of the server
+        """
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def http(self, scope, receive, send):
+        """
+        Handle an HTTP request
+
+        Requests are turned away before their body is read, so that a full
+        pool does not buffer the bodies of the requests it refuses. The slot
+        is taken straight away as the body may take a while to arrive.
+        """
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            await self.busy(send)
+            return
+
+        self.pending += 1
+        try:
+            body = await self.read_body(receive)
+        except BaseException:
+            self.pending -= 1
+            raise
+        if body is None:
+            self.pending -= 1
+            return
+
+        loop = asyncio.get_running_loop()
+        blocks = asyncio.Queue(maxsize=self.stream_buffer)
+        disconnected = threading.Event()
+        response = {}
+
+        worker = loop.run_in_executor(
+            self.executor, self.run, wsgi_environ(scope, body),
+            loop, blocks, disconnected, response)
+        worker.add_done_callback(self._finished)
+        watcher = asyncio.ensure_future(self.watch(receive, disconnected))
+
+        try:
+            await self.respond(send, blocks, response, watcher)
+        except (OSError, asyncio.CancelledError):
+            disconnected.set()
+            raise
+        finally:
+            watcher.cancel()
+            if disconnected.is_set():
+                self.cancelled += 1
+
+    @staticmethod
+    async def read_body(receive):
+        """
+        Read the whole body of a request
+
+        Returns
+        -------
+        bytes
+            None if the client disconnected before sending all of it
+        """
+        body = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            body.append(message.get('body', b''))
+            if not message.get('more_body', False):
+                return b''.join(body)
+
+    def _finished(self, _):
+        """
+        Release the slot of a request once its thread has finished
+        """
+        self.pending -= 1
+
+    @staticmethod
+    async def busy(send):
+        """
+        Turn a request away when the pool and its queue are full
+        """
+        body = json.dumps({'status_code': 503, 'error': 'ServiceBusy'}).encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': 503,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode('latin-1')),
+                (b'retry-after', b'1')
+            ]
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    @staticmethod
+    async def watch(receive, disconnected):
+        """
+        Flag the request as abandoned when the client disconnects
+        """
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                disconnected.set()
+                return
+
+    @staticmethod
+    async def respond(send, blocks, response, watcher):
+        """
+        Send the blocks of the body produced by the worker thread
+
+        Each block is only taken from the queue once the server has accepted
+        the previous one, which holds the worker thread back when the client
+        reads slowly. Stops when the client disconnects, which is when the
+        watcher finishes.
+        """
+        started = False
+        while True:
+            get = asyncio.ensure_future(blocks.get())
+            await asyncio.wait((get, watcher), return_when=asyncio.FIRST_COMPLETED)
+            if not get.done():
+                get.cancel()
+                return
+            kind, block = get.result()
+            if kind == 'error' and not started:
+                body = b'Internal Server Error'
+                await send({
+                    'type': 'http.response.start',
+                    'status': 500,
+                    'headers': [
+                        (b'content-type', b'text/plain'),
+                        (b'content-length', str(len(body)).encode('latin-1'))
+                    ]
+                })
+                await send({'type': 'http.response.body', 'body': body})
+                return
+            if kind == 'error':
+                # Too late to report the error, end the body early
+                await send({'type': 'http.response.body', 'body': b''})
+                return
+
+            if not started:
+                await send({
+                    'type': 'http.response.start',
+                    'status': int(response['status'].split(' ', 1)[0]),
+                    'headers': [
+                        (name.lower().encode('latin-1'), value.encode('latin-1'))
+                        for name, value in response['headers']
+                    ]
+                })
+                started = True
+            if kind == 'end':
+                await send({'type': 'http.response.body', 'body': b''})
+                return
+            await send({'type': 'http.response.body', 'body': block, 'more_body': True})
+
+    def run(self, environ, loop, blocks, disconnected, response):
+        """
+        Run the WSGI application for a request in a worker thread
+
+        The blocks of the body are put on the queue for respond. Iterating
+        stops as soon as the client has disconnected, the body is then closed
+        so that the resources held by it are released.
+        """
+        def put(kind, block=None):
+            """
+            Put a block on the queue, waiting while the queue is full
+            """
+            future = asyncio.run_coroutine_threadsafe(blocks.put((kind, block)), loop)
+            while True:
+                try:
+                    return future.result(timeout=0.1)
+                except FutureTimeout:
+                    if disconnected.is_set():
+                        future.cancel()
+                        raise Disconnected()
+
+        def start_response(status, headers, exc_info=None):
+            """
+            WSGI start_response
+            """
+            if exc_info is not None and response.get('sent'):
+                raise exc_info[1].with_traceback(exc_info[2])
+            response['status'] = status
+            response['headers'] = headers
+            return lambda data: put('body', data)
+
+        # The client may have gone while the request was waiting for a thread
+        if disconnected.is_set():
+            return
+
+        result = None
+        try:
+            result = self.wsgi_app(environ, start_response)
+            for block in result:
+                if disconnected.is_set():
+                    return
+                if block:
+                    response['sent'] = True
+                    put('body', block)
+            put('end')
+        except Disconnected:
+            pass
+        except Exception:  # pylint: disable=broad-except
+            traceback.print_exc(file=environ['wsgi.errors'])
+            if not disconnected.is_set():
+                try:
+                    put('error')
+                except Disconnected:
+                    pass
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
@@ -0,0 +1,172 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+from __future__ import print_function
+
+import numpy as np
+
+
+class ChromosomeIndex(object):
+    """
+    Mapping between genomic coordinates and genome wide bins
+
+    The adjacency matrix for a resolution is stored genome wide with the
+    chromosomes laid out one after the other in the order that they are listed
+    in the file. Each chromosome occupies (length // resolution) + 1 bins. The
+    index holds the cumulative bin offsets so that bins can be mapped back to
+    a chromosome with a binary search.
+    """
+
+    def __init__(self, chromosomes, resolution):
+        """
+        Parameters
+        ----------
+        chromosomes : list
+            List of (chromosome, length) pairs in the order they are stored
+        resolution : int
+            Resolution of the dataset
+        """
+        self.resolution = int(resolution)
+        self.names = [c[0] for c in chromosomes]
+        self.lengths = np.array([c[1] for c in chromosomes], dtype=np.int64)
+        self.bin_counts = self.lengths // self.resolution + 1
+        self.first_bins = np.concatenate(([0], np.cumsum(self.bin_counts)[:-1])).astype(np.int64)
+        self.bin_count = int(self.bin_counts.sum())
+        self._codes = dict((name, i) for i, name in enumerate(self.names))
+
+    def __contains__(self, chr_id):
+        return chr_id in self._codes
+
+    def __len__(self):
+        return len(self.names)
+
+    def code(self, chr_id):
+        """
+        Position of a chromosome in the index
+
+        Raises
+        ------
+        KeyError
+            If the chromosome is not in the dataset
+        """
+        return self._codes[chr_id]
+
+    def bin_for(self, chr_id, position):
+        """
+        Genome wide bin for a position on a chromosome
+
+        Positions beyond the end of the chromosome are clipped to its last bin.
+
+        Parameters
+        ----------
+        chr_id : str
+            Chromosome
+        position : int
+            Position on the chromosome
+
+        Returns
+        -------
+        int
+        """
+        code = self._codes[chr_id]
+        local_bin = min(max(0, int(position) // self.resolution), int(self.bin_counts[code]) - 1)
+        return int(self.first_bins[code]) + local_bin
+
+    def bins_for(self, chr_id, positions):
+        """
+        Genome wide bins for many positions on a chromosome
+
+        Parameters
+        ----------
+        chr_id : str
+            Chromosome
+        positions : numpy.ndarray
+            Positions on the chromosome
+
+        Returns
+        -------
+        numpy.ndarray
+        """
+        code = self._codes[chr_id]
+        local_bins = np.clip(
+            np.asarray(positions, dtype=np.int64) // self.resolution,
+            0, self.bin_counts[code] - 1)
+        return self.first_bins[code] + local_bins
+
+    def region_bins(self, chr_id, start=None, end=None):
+        """
+        Range of genome wide bins covered by a region of a chromosome
+
+        Parameters
+        ----------
+        chr_id : str
+            Chromosome
+        start : int
+            Start of the region, None for the start of the chromosome
+        end : int
+            End of the region, None for the end of the chromosome
+
+        Returns
+        -------
+        tuple
+            (first bin, last bin + 1)
+        """
+        code = self._codes[chr_id]
+        bin_count = int(self.bin_counts[code])
+        bin_start = 0 if start is None else max(0, start // self.resolution)
+        # The bin that the end falls in is only partly covered but still
+        # part of the region
+        bin_end = bin_count if end is None else min(bin_count, -(-end // self.resolution))
+        bin_end = max(bin_start, bin_end)
+        first_bin = int(self.first_bins[code])
+        return first_bin + bin_start, first_bin + bin_end
+
+    def locate(self, bin_id):
+        """
+        Chromosome and start position of a genome wide bin
+
+        Parameters
+        ----------
+        bin_id : int
+            Genome wide bin
+
+        Returns
+        -------
+        tuple
+            (chromosome, start position)
+        """
+        code = int(np.searchsorted(self.first_bins, bin_id, side='right')) - 1
+        return self.names[code], (int(bin_id) - int(self.first_bins[code])) * self.resolution
+
+    def locate_many(self, bins):
+        """
+        Chromosome codes and start positions for many genome wide bins
+
+        Parameters
+        ----------
+        bins : numpy.ndarray
+            Genome wide bins
+
+        Returns
+        -------
+        tuple
+            (chromosome codes, start positions) as arrays. Codes index into
+            names.
+        """
+        bins = np.asarray(bins, dtype=np.int64)
+        codes = np.searchsorted(self.first_bins, bins, side='right') - 1
+        return codes, (bins - self.first_bins[codes]) * self.resolution
@@ -0,0 +1,189 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+Chunk aligned reads of compressed HDF5 matrices
+
+HDF5 decompresses a whole chunk for every read that touches it, so narrow
+windows that fall across chunk boundaries, or neighbouring windows from
+separate requests, decompress the same chunks again and again. Reads are
+instead expanded to the chunk grid, each chunk is decompressed once and the
+decompressed chunks are kept in a cache that is shared between requests.
+"""
+
+from __future__ import print_function
+
+import numpy as np
+
+
+def chunk_runs(chunk_columns):
+    """
+    Split a sorted list of chunk columns into runs of consecutive columns
+
+    Each run is read from the file as a single rectangle.
+
+    Returns
+    -------
+    list
+        List of lists of chunk columns
+    """
+    runs = []
+    for column in chunk_columns:
+        if runs and runs[-1][-1] + 1 == column:
+            runs[-1].append(column)
+        else:
+            runs.append([column])
+    return runs
+
+
+class ChunkedMatrix(object):
+    """
+    Read-only view of a chunked HDF5 dataset that reads whole chunks through a
+    cache
+
+    Supports the slicing used by the readers in rest.columnar and
+    rest.matrix: dset[rows, columns] with two slices, or with a single row and
+    either a single column or a list of columns.
+    """
+
+    def __init__(self, dset, cache, key, max_read_bytes=None):
+        """
+        Parameters
+        ----------
+        dset : h5py.Dataset
+            Chunked 2D dataset
+        cache : rest.lru.LRUCache
+            Cache for the decompressed chunks
+        key : tuple
+            Identifies the dataset and its version within the cache
+        max_read_bytes : int
+            Reads larger than this already touch each chunk once and are
+            passed straight to the dataset without filling the cache. None to
+            cache every read.
+        """
+        self.dset = dset
+        self.cache = cache
+        self.key = key
+        self.max_read_bytes = max_read_bytes
+
+        self.shape = dset.shape
+        self.dtype = dset.dtype
+        self.chunks = dset.chunks
+
+    def __getitem__(self, selection):
+        rows, columns = selection
+        if isinstance(rows, slice) and isinstance(columns, slice):
+            row_start, row_end, _ = rows.indices(self.shape[0])
+            col_start, col_end, _ = columns.indices(self.shape[1])
+            return self.read(row_start, row_end, col_start, col_end)
+
+        row = int(rows)
+        if np.isscalar(columns):
+            return self.read(row, row + 1, int(columns), int(columns) + 1)[0, 0]
+        columns = np.asarray(columns, dtype=np.int64)
+        if len(columns) == 0:
+            return np.zeros(0, dtype=self.dtype)
+        col_start = int(columns.min())
+        block = self.read(row, row + 1, col_start, int(columns.max()) + 1)
+        return block[0, columns - col_start]
+
+    def read(self, row_start, row_end, col_start, col_end):
+        """
+        Read a rectangle of the matrix
+
+        Parameters
+        ----------
+        row_start, row_end : int
+            First row and last row + 1
+        col_start, col_end : int
+            First column and last column + 1
+
+        Returns
+        -------
+        numpy.ndarray
+        """
+        height = max(row_end - row_start, 0)
+        width = max(col_end - col_start, 0)
+        if height == 0 or width == 0:
+            return np.zeros((height, width), dtype=self.dtype)
+        if (self.max_read_bytes is not None and
+                height * width * self.dtype.itemsize > self.max_read_bytes):
+            return self.dset[row_start:row_end, col_start:col_end]
+
+        chunk_height, chunk_width = self.chunks
+        data = np.empty((height, width), dtype=self.dtype)
+        for chunk_row in range(row_start // chunk_height, (row_end - 1) // chunk_height + 1):
+            chunk_columns = range(col_start // chunk_width, (col_end - 1) // chunk_width + 1)
+            band = self._band(chunk_row, chunk_columns)
+
+            top = chunk_row * chunk_height
+            band_rows = slice(max(row_start, top) - top, min(row_end, top + chunk_height) - top)
+            out_rows = slice(max(row_start, top) - row_start, min(row_end, top + chunk_height) - row_start)
+            for chunk_column in chunk_columns:
+                left = chunk_column * chunk_width
+                first = max(col_start, left)
+                last = min(col_end, left + chunk_width)
+                data[out_rows, first - col_start:last - col_start] = (
+                    band[chunk_column][band_rows, first - left:last - left])
+        return data
+
+    def _band(self, chunk_row, chunk_columns):
+        """
+        Get a row of chunks, reading the missing ones from the file
+
+        Consecutive missing chunks are read with a single aligned read so
+        that each chunk is decompressed exactly once.
+
+        Returns
+        -------
+        dict
+            Chunk column to decompressed chunk
+        """
+        chunk_height, chunk_width = self.chunks
+        band = {}
+        missing = []
+        for chunk_column in chunk_columns:
+            chunk = self.cache.get((self.key, chunk_row, chunk_column))
+            if chunk is None:
+                missing.append(chunk_column)
+            else:
+                band[chunk_column] = chunk
+
+        top = chunk_row * chunk_height
+        bottom = min(top + chunk_height, self.shape[0])
+        for run in chunk_runs(missing):
+            left = run[0] * chunk_width
+            right = min((run[-1] + 1) * chunk_width, self.shape[1])
+            block = self.dset[top:bottom, left:right]
+            for chunk_column in run:
+                offset = chunk_column * chunk_width - left
+                chunk = np.ascontiguousarray(block[:, offset:offset + chunk_width])
+                self.cache.put((self.key, chunk_row, chunk_column), chunk, chunk.nbytes)
+                band[chunk_column] = chunk
+        return band
+
+
+def chunked(dset, cache, key, max_read_bytes=None):
+    """
+    Wrap a dataset in a ChunkedMatrix if it is stored in chunks
+
+    Returns
+    -------
+    ChunkedMatrix | h5py.Dataset
+        The dataset itself if it is not chunked
+    """
+    if getattr(dset, 'chunks', None) is None or len(dset.shape) != 2:
+        return dset
+    return ChunkedMatrix(dset, cache, key, max_read_bytes)
@@ -0,0 +1,547 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+from __future__ import print_function
+
+import numpy as np
+
+# Maximum number of matrix cells read from the HDF5 file in one go
+READ_BLOCK_CELLS = 1 << 22
+
+
+class InteractionColumns(object):
+    """
+    Columnar set of interactions
+
+    Each interaction is held as a position in a set of parallel NumPy arrays
+    rather than as a dict. Chromosomes are stored as codes into the
+    chromosomes table.
+    """
+
+    def __init__(self, chromosomes, chr_a, start_a, chr_b, start_b, value,
+                 pos_x, pos_y):
+        """
+        Parameters
+        ----------
+        chromosomes : list
+            Chromosome names, indexed by the codes in chr_a and chr_b
+        chr_a, start_a, chr_b, start_b, value, pos_x, pos_y : numpy.ndarray
+            Parallel arrays with one entry per interaction
+        """
+        self.chromosomes = list(chromosomes)
+        self.chr_a = np.asarray(chr_a, dtype=np.int32)
+        self.start_a = np.asarray(start_a, dtype=np.int64)
+        self.chr_b = np.asarray(chr_b, dtype=np.int32)
+        self.start_b = np.asarray(start_b, dtype=np.int64)
+        self.value = np.asarray(value)
+        self.pos_x = np.asarray(pos_x, dtype=np.int64)
+        self.pos_y = np.asarray(pos_y, dtype=np.int64)
+
+        # Base URL for the per interaction getValue links, no links are
+        # generated when this is None
+        self.link_base = None
+
+        # Serialised forms of the interactions keyed on the format and
+        # link_base, shared by requests that are given the same columns
+        self.encoded = {}
+
+    def __len__(self):
+        return len(self.value)
+
+    @classmethod
+    def from_records(cls, records):
+        """
+        Build the columns from the list of dicts returned by
+        adjacency.get_range
+
+        Parameters
+        ----------
+        records : list
+            List of interactions with the keys chrA, startA, chrB, startB,
+            value, pos_x and pos_y
+
+        Returns
+        -------
+        InteractionColumns
+        """
+        chromosomes = []
+        codes = {}
+        for record in records:
+            for chr_id in (record["chrA"], record["chrB"]):
+                if chr_id not in codes:
+                    codes[chr_id] = len(chromosomes)
+                    chromosomes.append(chr_id)
+
+        return cls(
+            chromosomes,
+            [codes[r["chrA"]] for r in records],
+            [r["startA"] for r in records],
+            [codes[r["chrB"]] for r in records],
+            [r["startB"] for r in records],
+            np.array([r["value"] for r in records], dtype=np.int64),
+            [r["pos_x"] for r in records],
+            [r["pos_y"] for r in records]
+        )
+
+    @classmethod
+    def concatenate(cls, chromosomes, parts):
+        """
+        Join a list of column sets that share the same chromosome table
+        """
+        if not parts:
+            return cls.empty(chromosomes)
+        if len(parts) == 1:
+            return parts[0]
+        return cls(
+            chromosomes,
+            np.concatenate([p.chr_a for p in parts]),
+            np.concatenate([p.start_a for p in parts]),
+            np.concatenate([p.chr_b for p in parts]),
+            np.concatenate([p.start_b for p in parts]),
+            np.concatenate([p.value for p in parts]),
+            np.concatenate([p.pos_x for p in parts]),
+            np.concatenate([p.pos_y for p in parts])
+        )
+
+    @classmethod
+    def empty(cls, chromosomes):
+        """
+        Column set with no interactions
+        """
+        return cls(chromosomes, [], [], [], [], np.zeros(0, dtype=np.int64), [], [])
+
+    def take(self, selection):
+        """
+        Select a subset of the interactions
+
+        Parameters
+        ----------
+        selection : numpy.ndarray
+            Boolean mask or array of indices
+
+        Returns
+        -------
+        InteractionColumns
+        """
+        subset = InteractionColumns(
+            self.chromosomes,
+            self.chr_a[selection], self.start_a[selection],
+            self.chr_b[selection], self.start_b[selection],
+            self.value[selection],
+            self.pos_x[selection], self.pos_y[selection]
+        )
+        subset.link_base = self.link_base
+        return subset
+
+    def with_links(self, link_base):
+        """
+        The same interactions with per interaction getValue links
+
+        The columns and serialised forms are shared with the original so that
+        the original is left unchanged for other requests that hold it.
+
+        Returns
+        -------
+        InteractionColumns
+        """
+        linked = self.take(slice(None))
+        linked.link_base = link_base
+        linked.encoded = self.encoded
+        return linked
+
+    def iter_blocks(self, block_size):
+        """
+        Iterate over the interactions in blocks of plain Python values
+
+        Parameters
+        ----------
+        block_size : int
+            Number of interactions in each block
+
+        Returns
+        -------
+        generator
+            Tuples of lists (chrA, startA, chrB, startB, value, pos_x, pos_y)
+        """
+        names = np.array(self.chromosomes, dtype=object)
+        for i in range(0, len(self), block_size):
+            j = i + block_size
+            yield (
+                names[self.chr_a[i:j]].tolist(), self.start_a[i:j].tolist(),
+                names[self.chr_b[i:j]].tolist(), self.start_b[i:j].tolist(),
+                self.value[i:j].tolist(),
+                self.pos_x[i:j].tolist(), self.pos_y[i:j].tolist()
+            )
+
+    def records(self):
+        """
+        List of dicts matching the layout returned by adjacency.get_range
+
+        Returns
+        -------
+        list
+            One dict per interaction
+        """
+        results = []
+        for block in self.iter_blocks(65536):
+            for chr_a, start_a, chr_b, start_b, value, pos_x, pos_y in zip(*block):
+                record = {
+                    "chrA": chr_a, "startA": start_a,
+                    "chrB": chr_b, "startB": start_b,
+                    "value": value, "pos_x": pos_x, "pos_y": pos_y
+                }
+                if self.link_base is not None:
+                    record["_links"] = {
+                        "_self": self.link_base + "&pos_x=" + str(pos_x) + "&pos_y=" + str(pos_y)
+                    }
+                results.append(record)
+        return results
+
+
+def hdf5_dataset(hdf5_handle, resolution, index=None):
+    """
+    Get the raw adjacency matrix for a resolution from an open reader
+
+    The matrix for each resolution is stored as a 2D dataset named after the
+    resolution.
+
+    Parameters
+    ----------
+    hdf5_handle : reader.hdf5_adjacency.adjacency
+    resolution : int
+    index : rest.chrom_index.ChromosomeIndex
+        Bin index for the resolution. Direct reads locate the bins of each
+        chromosome from the index, so the matrix is only returned if it has
+        the same number of bins.
+
+    Returns
+    -------
+    h5py.Dataset
+        None if the reader does not expose the HDF5 file or the matrix is not
+        laid out as the index expects, in which case the reader has to be used
+    """
+    h5_file = getattr(hdf5_handle, 'f', None)
+    if h5_file is None or str(resolution) not in h5_file:
+        return None
+    dset = h5_file[str(resolution)]
+    if index is not None and dset.shape != (index.bin_count, index.bin_count):
+        return None
+    return dset
+
+
+def value_mask(block, min_value=None, max_value=None):
+    """
+    Cells of a block that hold an interaction within the value thresholds
+    """
+    mask = block != 0
+    if min_value is not None:
+        mask &= block >= min_value
+    if max_value is not None:
+        mask &= block <= max_value
+    return mask
+
+
+def select_top(values, top_n):
+    """
+    Keep the interactions with the highest values
+
+    Parameters
+    ----------
+    values : InteractionColumns
+    top_n : int
+        Number of interactions to keep
+
+    Returns
+    -------
+    InteractionColumns
+        The top_n interactions ordered by decreasing value, ties are ordered
+        by pos_x then pos_y
+    """
+    if top_n < len(values):
+        keep = np.argpartition(-values.value, top_n - 1)[:top_n]
+        values = values.take(np.sort(keep))
+    order = np.lexsort((values.pos_y, values.pos_x, -values.value))
+    return values.take(order)
+
+
+def block_edges(start, end, step, aligned=False):
+    """
+    (first, last + 1) of each block covering start to end
+
+    Parameters
+    ----------
+    start : int
+    end : int
+    step : int
+        Size of the blocks
+    aligned : bool
+        Start each block after the first on a multiple of step, so that the
+        blocks line up with the chunks of a dataset
+
+    Returns
+    -------
+    generator
+        Tuple for each block
+    """
+    while start < end:
+        stop = (start // step + 1) * step if aligned else start + step
+        yield start, min(stop, end)
+        start = min(stop, end)
+
+
+def iter_range_blocks(dset, index, x_bins, y_bins, position=None,
+                      min_value=None, max_value=None):
+    """
+    Read the non-zero cells of a rectangle of the matrix in row order
+
+    The rows are read from the matrix in blocks and the non-zero cells of each
+    block are converted into columns without creating a Python object per
+    interaction. For chunked datasets the blocks are whole rows of chunks,
+    split into runs of chunk columns when a row of chunks does not fit in
+    READ_BLOCK_CELLS, so that each chunk is only read and decompressed once.
+
+    Parameters
+    ----------
+    dset : h5py.Dataset
+        Adjacency matrix for the resolution
+    index : rest.chrom_index.ChromosomeIndex
+        Bin index for the resolution
+    x_bins : tuple
+        (first bin, last bin + 1) for the rows
+    y_bins : tuple
+        (first bin, last bin + 1) for the columns
+    position : tuple
+        (row, column) bins of the first cell to include, cells before it in
+        row major order are skipped. None to start from the beginning.
+    min_value : float
+        Skip cells with a value below this
+    max_value : float
+        Skip cells with a value above this
+
+    Returns
+    -------
+    generator
+        InteractionColumns for each block that has interactions
+    """
+    x_start, x_end = x_bins
+    y_start, y_end = y_bins
+    if position is not None:
+        x_start = max(x_start, position[0])
+
+    width = max(y_end - y_start, 1)
+    chunks = getattr(dset, 'chunks', None)
+    if chunks is None:
+        rows_per_block = max(1, READ_BLOCK_CELLS // width)
+        cols_per_block = width
+    else:
+        chunk_rows, chunk_cols = chunks
+        cols_per_block = chunk_cols * max(1, READ_BLOCK_CELLS // (chunk_rows * chunk_cols))
+        rows_per_block = chunk_rows * max(
+            1, READ_BLOCK_CELLS // (chunk_rows * min(width, cols_per_block)))
+    aligned = chunks is not None
+
+    for row, row_end in block_edges(x_start, x_end, rows_per_block, aligned):
+        parts = []
+        for col, col_end in block_edges(y_start, y_end, cols_per_block, aligned):
+            block = dset[row:row_end, col:col_end]
+            idx_x, idx_y = np.nonzero(value_mask(block, min_value, max_value))
+            parts.append((
+                idx_x.astype(np.int64) + row, idx_y.astype(np.int64) + col,
+                block[idx_x, idx_y]
+            ))
+        if not parts:
+            continue
+
+        pos_x, pos_y, value = [np.concatenate(part) for part in zip(*parts)]
+        if len(parts) > 1:
+            order = np.lexsort((pos_y, pos_x))
+            pos_x, pos_y, value = pos_x[order], pos_y[order], value[order]
+        if position is not None and row == x_start:
+            keep = (pos_x > position[0]) | (pos_y >= position[1])
+            pos_x, pos_y, value = pos_x[keep], pos_y[keep], value[keep]
+        if len(pos_x) == 0:
+            continue
+
+        chr_a, start_a = index.locate_many(pos_x)
+        chr_b, start_b = index.locate_many(pos_y)
+
+        yield InteractionColumns(
+            index.names, chr_a, start_a, chr_b, start_b, value, pos_x, pos_y
+        )
+
+
+def range_bins(index, chr_id, start, end,
+               limit_chr=None, limit_start=None, limit_end=None):
+    """
+    Rows and columns of the matrix covered by a range query
+
+    Returns
+    -------
+    tuple
+        (x_bins, y_bins) each as (first bin, last bin + 1)
+    """
+    x_bins = index.region_bins(chr_id, start, end)
+    if limit_chr is None:
+        y_bins = (0, index.bin_count)
+    else:
+        y_bins = index.region_bins(limit_chr, limit_start, limit_end)
+    return x_bins, y_bins
+
+
+def read_range(dset, index, chr_id, start, end,  # pylint: disable=too-many-arguments
+               limit_chr=None, limit_start=None, limit_end=None,
+               min_value=None, max_value=None, top_n=None):
+    """
+    Read the interactions for a region directly into columns
+
+    Parameters
+    ----------
+    dset : h5py.Dataset
+        Adjacency matrix for the resolution
+    index : rest.chrom_index.ChromosomeIndex
+        Bin index for the resolution
+    chr_id : str
+        Chromosome
+    start : int
+        Start position for the region
+    end : int
+        End position for the region
+    limit_chr : str
+        Limit the interactions returned to those between chr_id and limit_chr
+    limit_start : int
+        Start of the region within limit_chr
+    limit_end : int
+        End of the region within limit_chr
+    min_value : float
+        Only return interactions with a value of at least this
+    max_value : float
+        Only return interactions with a value of at most this
+    top_n : int
+        Only return the top_n interactions with the highest values, ordered
+        by decreasing value. The selection is made block by block so only
+        top_n interactions are held between blocks.
+
+    Returns
+    -------
+    InteractionColumns
+    """
+    x_bins, y_bins = range_bins(
+        index, chr_id, start, end, limit_chr, limit_start, limit_end)
+    blocks = iter_range_blocks(
+        dset, index, x_bins, y_bins, min_value=min_value, max_value=max_value)
+
+    if top_n is None:
+        return InteractionColumns.concatenate(index.names, list(blocks))
+
+    top = InteractionColumns.empty(index.names)
+    for block in blocks:
+        top = select_top(InteractionColumns.concatenate(index.names, [top, block]), top_n)
+    return select_top(top, top_n)
+
+
+def filter_values(values, min_value=None, max_value=None, top_n=None):
+    """
+    Apply the value thresholds and top_n selection to interactions that are
+    already in memory, see read_range
+    """
+    if min_value is not None or max_value is not None:
+        values = values.take(value_mask(values.value, min_value, max_value))
+    if top_n is not None:
+        values = select_top(values, top_n)
+    return values
+
+
+def read_range_page(dset, index, x_bins, y_bins, position, page_size,
+                    min_value=None, max_value=None):
+    """
+    Read a page of interactions in row major order
+
+    Only the rows needed to fill the page are read from the matrix.
+
+    Parameters
+    ----------
+    dset : h5py.Dataset
+        Adjacency matrix for the resolution
+    index : rest.chrom_index.ChromosomeIndex
+        Bin index for the resolution
+    x_bins : tuple
+        (first bin, last bin + 1) for the rows
+    y_bins : tuple
+        (first bin, last bin + 1) for the columns
+    position : tuple
+        (row, column) of the first cell of the page, None for the first page
+    page_size : int
+        Maximum number of interactions in the page
+    min_value : float
+        Only return interactions with a value of at least this
+    max_value : float
+        Only return interactions with a value of at most this
+
+    Returns
+    -------
+    tuple
+        (InteractionColumns, position of the first cell of the next page or
+        None if this is the last page)
+    """
+    parts = []
+    count = 0
+    blocks = iter_range_blocks(
+        dset, index, x_bins, y_bins, position, min_value, max_value)
+    for part in blocks:
+        parts.append(part)
+        count += len(part)
+        if count > page_size:
+            break
+
+    values = InteractionColumns.concatenate(index.names, parts)
+    return page_slice(values, page_size)
+
+
+def page_slice(values, page_size, position=None, end_row=None):
+    """
+    Take a page from interactions that are in row major order
+
+    Parameters
+    ----------
+    values : InteractionColumns
+        Interactions sorted by pos_x then pos_y
+    page_size : int
+        Maximum number of interactions in the page
+    position : tuple
+        (row, column) of the first cell of the page
+    end_row : int
+        Row at which the page stops
+
+    Returns
+    -------
+    tuple
+        (InteractionColumns, position of the next page or None)
+    """
+    if position is not None or end_row is not None:
+        keep = np.ones(len(values), dtype=bool)
+        if position is not None:
+            keep &= (values.pos_x > position[0]) | (
+                (values.pos_x == position[0]) & (values.pos_y >= position[1]))
+        if end_row is not None:
+            keep &= values.pos_x < end_row
+        values = values.take(keep)
+
+    if len(values) <= page_size:
+        return values, None
+
+    next_position = (int(values.pos_x[page_size]), int(values.pos_y[page_size]))
+    return values.take(slice(0, page_size)), next_position
@@ -0,0 +1,170 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+Streaming compression of response bodies
+
+gzip is always available, zstd is offered when the zstandard package is
+installed.
+"""
+
+from __future__ import print_function
+
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def available_encodings():
+    """
+    Content codings that can be produced, in order of preference
+    """
+    if zstandard is not None:
+        return ['zstd', 'gzip']
+    return ['gzip']
+
+
+def choose_encoding(accept_encodings):
+    """
+    Pick the content coding for a response
+
+    Parameters
+    ----------
+    accept_encodings : werkzeug.datastructures.Accept
+        Parsed Accept-Encoding header of the request
+
+    Returns
+    -------
+    str
+        None to send the body uncompressed
+    """
+    return accept_encodings.best_match(available_encodings())
+
+
+def coded_etag(etag, encoding):
+    """
+    ETag of a body compressed with a content coding
+
+    The compressed bytes differ from the uncompressed ones, so they cannot
+    share a strong ETag.
+
+    Parameters
+    ----------
+    etag : str
+        Unquoted ETag of the uncompressed body
+    encoding : str
+        gzip or zstd
+
+    Returns
+    -------
+    str
+    """
+    return etag + '-' + encoding
+
+
+def etag_variants(etag):
+    """
+    ETags that a client may hold for a body, uncompressed first and then for
+    each content coding that can be produced
+    """
+    return [etag] + [coded_etag(etag, encoding) for encoding in available_encodings()]
+
+
+def compressor(encoding, level=None):
+    """
+    Streaming compressor for a content coding
+
+    Parameters
+    ----------
+    encoding : str
+        gzip or zstd
+    level : int
+        Compression level, None for the default of the coding
+
+    Returns
+    -------
+    object
+        With compress(data) and flush() methods that return bytes
+    """
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=3 if level is None else level).compressobj()
+    return zlib.compressobj(6 if level is None else level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+
+def compress(data, encoding, level=None):
+    """
+    Compress a complete body
+    """
+    stream = compressor(encoding, level)
+    return stream.compress(data) + stream.flush()
+
+
+def iter_compress(blocks, encoding, level=None):
+    """
+    Compress a streamed body block by block
+
+    Parameters
+    ----------
+    blocks : iterable
+        Blocks of the body as bytes or str
+    encoding : str
+        gzip or zstd
+    level : int
+        Compression level
+
+    Returns
+    -------
+    generator
+        Blocks of the compressed body
+    """
+    stream = compressor(encoding, level)
+    for block in blocks:
+        if not isinstance(block, bytes):
+            block = block.encode('utf-8')
+        compressed = stream.compress(block)
+        if compressed:
+            yield compressed
+    yield stream.flush()
+
+
+def peek(blocks, min_size):
+    """
+    Read the start of a streamed body
+
+    Parameters
+    ----------
+    blocks : iterable
+        Blocks of the body
+    min_size : int
+        Stop reading once this many bytes have been read
+
+    Returns
+    -------
+    tuple
+        (list of the blocks read, iterator over the remaining blocks, True if
+        the whole body has been read)
+    """
+    blocks = iter(blocks)
+    head = []
+    size = 0
+    for block in blocks:
+        head.append(block)
+        size += len(block)
+        if size >= min_size:
+            return head, blocks, False
+    return head, blocks, True
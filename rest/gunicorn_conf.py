@@ -0,0 +1,50 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+Gunicorn settings for running the service with several worker processes
+
+.. code-block:: none
+   :linenos:
+
+   gunicorn -c python:rest.gunicorn_conf rest.app:APP
+
+The application is loaded once in the master process and the workers are
+forked from it, so the imported modules are shared. Each worker drops the
+HDF5 handles and memory maps inherited from the master and opens its own on
+first use. The number of workers, threads per worker and the listening
+address can be set with the MG_REST_ADJACENCY_WORKERS,
+MG_REST_ADJACENCY_THREADS and MG_REST_ADJACENCY_BIND environment variables.
+"""
+
+import multiprocessing
+import os
+
+bind = os.environ.get('MG_REST_ADJACENCY_BIND', '127.0.0.1:5002')
+workers = int(os.environ.get('MG_REST_ADJACENCY_WORKERS', multiprocessing.cpu_count()))
+threads = int(os.environ.get('MG_REST_ADJACENCY_THREADS', 4))
+worker_class = 'gthread'
+preload_app = True
+
+# Allow for large whole chromosome requests
+timeout = 300
+
+
+def post_fork(server, worker):  # pylint: disable=unused-argument
+    """
+    Reset the per process state of the application in a new worker
+    """
+    from rest.app import reset_after_fork
+    reset_after_fork()
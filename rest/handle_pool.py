@@ -0,0 +1,237 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+from __future__ import print_function
+
+import threading
+import time
+
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+class _PooledHandle(object):  # pylint: disable=too-few-public-methods
+    """
+    Book keeping for a single open handle within the pool
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.handle = None
+        self.lock = threading.RLock()
+        self.users = 0
+        self.last_used = time.time()
+
+
+class HandlePool(object):
+    """
+    Process wide pool of open adjacency handles
+
+    Opening an HDF5 file, parsing the meta data and rebuilding the chunk cache
+    is the most expensive part of a request. As the files are read-only the
+    handles can be shared between requests. Handles are keyed on the user,
+    file and resolution so that a handle is only ever reused for the same
+    combination that opened it.
+
+    Each handle has its own lock as h5py objects are not safe to be used from
+    multiple threads at the same time. The pool is bounded, the least recently
+    used idle handles are closed once the pool is full and handles that have
+    not been used within the idle timeout are closed on the next checkout.
+    """
+
+    def __init__(self, opener, max_size=32, idle_timeout=300):
+        """
+        Parameters
+        ----------
+        opener : function
+            Called as opener(user_id, file_id[, resolution]) to open a new
+            handle. The returned object needs to provide a close() method.
+        max_size : int
+            Maximum number of handles to keep open
+        idle_timeout : int
+            Number of seconds after which an unused handle is closed. A value
+            of None keeps handles open until they are evicted.
+        """
+        self.opener = opener
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+
+        self._handles = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @contextmanager
+    def acquire(self, user_id, file_id, resolution=None):
+        """
+        Check out a handle for the duration of a with block
+
+        The handle is locked for the caller while the block is running so it
+        can be used without any further synchronisation.
+
+        Parameters
+        ----------
+        user_id : str
+            User ID
+        file_id : str
+            Identifier of the file to retrieve data from
+        resolution : int
+            Resolution of the dataset requested
+
+        Example
+        -------
+        .. code-block:: python
+           :linenos:
+
+           with HANDLE_POOL.acquire(user_id, file_id, resolution) as h5_handle:
+               value = h5_handle.get_value(pos_x, pos_y)
+        """
+        entry = self._checkout((user_id, file_id, resolution))
+        try:
+            with entry.lock:
+                if entry.handle is None:
+                    if resolution is None:
+                        entry.handle = self.opener(user_id, file_id)
+                    else:
+                        entry.handle = self.opener(user_id, file_id, resolution)
+                yield entry.handle
+        finally:
+            self._checkin(entry)
+
+    def _checkout(self, key):
+        """
+        Find or register the pool entry for a key and mark it as in use
+        """
+        with self._lock:
+            entry = self._handles.get(key)
+            if entry is None:
+                self.misses += 1
+                entry = _PooledHandle(key)
+                self._handles[key] = entry
+            else:
+                self.hits += 1
+                self._handles.pop(key)
+                self._handles[key] = entry
+            entry.users += 1
+            expired = self._collect_expired()
+
+        self._close_entries(expired)
+        return entry
+
+    def _checkin(self, entry):
+        """
+        Release an entry. Entries whose handle failed to open are dropped.
+        """
+        with self._lock:
+            entry.users -= 1
+            entry.last_used = time.time()
+            if entry.handle is None and entry.users == 0:
+                if self._handles.get(entry.key) is entry:
+                    del self._handles[entry.key]
+            expired = self._collect_expired()
+
+        self._close_entries(expired)
+
+    def _collect_expired(self):
+        """
+        Remove idle entries that have timed out or that are pushing the pool
+        over its maximum size. Must be called while holding the pool lock.
+
+        Returns
+        -------
+        list
+            Entries that have been removed from the pool and need closing
+        """
+        expired = []
+        if self.idle_timeout is not None:
+            cutoff = time.time() - self.idle_timeout
+            for key, entry in list(self._handles.items()):
+                if entry.users == 0 and entry.last_used < cutoff:
+                    expired.append(self._handles.pop(key))
+
+        if len(self._handles) > self.max_size:
+            for key, entry in list(self._handles.items()):
+                if len(self._handles) <= self.max_size:
+                    break
+                if entry.users == 0:
+                    expired.append(self._handles.pop(key))
+
+        self.evictions += len(expired)
+        return expired
+
+    @staticmethod
+    def _close_entries(entries):
+        """
+        Close the handles of entries that are no longer part of the pool
+        """
+        for entry in entries:
+            with entry.lock:
+                if entry.handle is not None:
+                    entry.handle.close()
+                    entry.handle = None
+
+    def close_all(self):
+        """
+        Close every idle handle in the pool. Handles that are in use are closed
+        once they are evicted.
+        """
+        with self._lock:
+            idle = [
+                self._handles.pop(key)
+                for key, entry in list(self._handles.items()) if entry.users == 0
+            ]
+        self._close_entries(idle)
+
+    def reset(self):
+        """
+        Forget every handle without closing it
+
+        Used in a worker process straight after a fork. The handles belong to
+        the parent process so closing them from the child is unsafe, the
+        child opens its own on first use.
+        """
+        self._handles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def stats(self):
+        """
+        Usage counters for the pool
+
+        Returns
+        -------
+        dict
+            size : int
+                Number of handles currently held
+            max_size : int
+                Maximum number of handles held
+            hits : int
+                Number of checkouts served by an already open handle
+            misses : int
+                Number of checkouts that required a new handle
+            evictions : int
+                Number of handles closed by the pool
+        """
+        with self._lock:
+            return {
+                'size': len(self._handles),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
@@ -0,0 +1,482 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+Background export of genome wide interaction lists
+
+Exports are run in a pool of worker processes that read the adjacency matrix
+block by block and write the interactions to a file in a spool directory. The
+state of each job is kept in a JSON file next to the output so that it can be
+read by any server process.
+"""
+
+from __future__ import print_function
+
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+
+from concurrent.futures import ProcessPoolExecutor
+
+import h5py
+import numpy as np
+
+from rest.chrom_index import ChromosomeIndex
+from rest.columnar import InteractionColumns, iter_range_blocks, range_bins
+from rest.serializers import interaction_array, interaction_dtype, iter_tsv, npy_header
+
+# Output formats and the extension and mimetype of their files
+EXPORT_FORMATS = {
+    'tsv': ('tsv', 'application/tsv'),
+    'npy': ('npy', 'application/x-npy'),
+    'hdf5': ('hdf5', 'application/x-hdf5'),
+}
+
+# Space reserved for the .npy header, which is written once the number of
+# rows is known
+NPY_HEADER_BYTES = 256
+
+# Minimum number of seconds between progress updates from a worker
+PROGRESS_INTERVAL = 1.0
+
+
+class SpoolFull(Exception):
+    """
+    Raised when the spool directory has no space left for another export
+    """
+    pass
+
+
+class SpoolLimitExceeded(Exception):
+    """
+    Raised by a worker when its output would take the spool over its limit
+    """
+    pass
+
+
+def write_status(spool_dir, job_id, status):
+    """
+    Atomically replace the status file for a job
+    """
+    path = os.path.join(spool_dir, job_id + '.json')
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as status_file:
+        json.dump(status, status_file)
+    os.rename(tmp_path, path)
+
+
+def read_status(spool_dir, job_id):
+    """
+    Read the status file for a job
+
+    Returns
+    -------
+    dict
+        None if there is no job with that ID
+    """
+    try:
+        with open(os.path.join(spool_dir, job_id + '.json')) as status_file:
+            return json.load(status_file)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+class _ExportWriter(object):
+    """
+    Writes blocks of interactions to the output file of an export
+    """
+
+    def __init__(self, path, fmt, index):
+        self.path = path
+        self.fmt = fmt
+        self.index = index
+        self.count = 0
+        self.dtype = None
+
+        if fmt == 'hdf5':
+            self._open_hdf5()
+        else:
+            self.handle = open(path, 'wb')
+            if fmt == 'npy':
+                self.handle.write(b' ' * NPY_HEADER_BYTES)
+
+    def _open_hdf5(self):
+        """
+        Create the cooler style layout of chroms, bins and pixels
+        """
+        self.handle = h5py.File(self.path, 'w')
+        index = self.index
+        chroms = self.handle.create_group('chroms')
+        chroms['name'] = np.array(index.names, dtype='S')
+        chroms['length'] = index.lengths
+
+        codes = np.repeat(np.arange(len(index.names), dtype=np.int32), index.bin_counts)
+        starts = (np.arange(index.bin_count, dtype=np.int64) - index.first_bins[codes]) * index.resolution
+        bins = self.handle.create_group('bins')
+        bins['chrom'] = codes
+        bins['start'] = starts
+        bins['end'] = np.minimum(starts + index.resolution, index.lengths[codes])
+
+        self.pixels = self.handle.create_group('pixels')
+        self.row_counts = np.zeros(index.bin_count, dtype=np.int64)
+        self.handle.attrs['bin-type'] = 'fixed'
+        self.handle.attrs['bin-size'] = index.resolution
+        self.handle.attrs['storage-mode'] = 'symmetric-upper'
+
+    def write(self, values):
+        """
+        Append a block of interactions
+        """
+        if self.fmt == 'tsv':
+            for block in iter_tsv(values):
+                self.handle.write(block.encode('utf-8'))
+        elif self.fmt == 'npy':
+            if self.dtype is None:
+                self.dtype = interaction_dtype(values)
+            self.handle.write(interaction_array(values, self.dtype).tobytes())
+        else:
+            values = values.take(values.pos_x <= values.pos_y)
+            for name, column in (('bin1_id', values.pos_x), ('bin2_id', values.pos_y),
+                                 ('count', values.value)):
+                if name not in self.pixels:
+                    self.pixels.create_dataset(
+                        name, (0,), dtype=column.dtype, maxshape=(None,),
+                        chunks=(65536,), compression='gzip')
+                dset = self.pixels[name]
+                dset.resize((self.count + len(values),))
+                dset[self.count:] = column
+            self.row_counts += np.bincount(values.pos_x, minlength=len(self.row_counts))
+        self.count += len(values)
+
+    def size(self):
+        """
+        Number of bytes written so far
+        """
+        if self.fmt == 'hdf5':
+            self.handle.flush()
+            return os.path.getsize(self.path)
+        return self.handle.tell()
+
+    def close(self):
+        """
+        Finish the file once all of the blocks have been written
+        """
+        if self.fmt == 'npy':
+            dtype = self.dtype or interaction_dtype(InteractionColumns.empty(self.index.names))
+            self.handle.seek(0)
+            self.handle.write(npy_header(dtype, self.count, NPY_HEADER_BYTES))
+        elif self.fmt == 'hdf5':
+            indexes = self.handle.create_group('indexes')
+            indexes['bin1_offset'] = np.concatenate(([0], np.cumsum(self.row_counts)))
+            indexes['chrom_offset'] = np.append(self.index.first_bins, self.index.bin_count)
+            self.handle.attrs['nnz'] = self.count
+        self.handle.close()
+
+
+def run_export(spool_dir, job_id, path, chromosomes, resolution, fmt,
+               chr_id=None, max_bytes=None):
+    """
+    Export the interactions for a resolution, run in a worker process
+
+    The matrix is read in blocks of rows and each block is appended to the
+    output as it is read, so the worker only ever holds a single block in
+    memory. The output is written to a temporary name and moved into place
+    once it is complete.
+
+    Parameters
+    ----------
+    spool_dir : str
+        Directory for the output and status files
+    job_id : str
+        ID of the job
+    path : str
+        Location of the adjacency HDF5 file
+    chromosomes : list
+        List of (chromosome, length) pairs in the order they are stored
+    resolution : int
+        Resolution to export
+    fmt : str
+        One of the keys of EXPORT_FORMATS
+    chr_id : str
+        Only export the interactions of this chromosome, None for the whole
+        genome
+    max_bytes : int
+        Maximum size of the output, None for no limit
+    """
+    status = read_status(spool_dir, job_id)
+    status.update({'status': 'running', 'started': time.time()})
+    write_status(spool_dir, job_id, status)
+
+    output = os.path.join(spool_dir, job_id + '.' + EXPORT_FORMATS[fmt][0])
+    part = output + '.part'
+    try:
+        index = ChromosomeIndex(chromosomes, resolution)
+        if chr_id is None:
+            x_bins = y_bins = (0, index.bin_count)
+        else:
+            x_bins, y_bins = range_bins(index, chr_id, None, None)
+
+        with h5py.File(path, 'r') as h5_file:
+            dset = h5_file[str(resolution)]
+            if dset.shape != (index.bin_count, index.bin_count):
+                raise ValueError('The matrix does not have a bin per resolution of each chromosome')
+
+            writer = _ExportWriter(part, fmt, index)
+            last_update = time.time()
+            for values in iter_range_blocks(dset, index, x_bins, y_bins):
+                writer.write(values)
+                if max_bytes is not None and writer.size() > max_bytes:
+                    raise SpoolLimitExceeded('Export exceeds the spool size limit')
+
+                if time.time() - last_update > PROGRESS_INTERVAL:
+                    status['progress'] = float(values.pos_x[-1] + 1 - x_bins[0]) / (
+                        x_bins[1] - x_bins[0])
+                    status['interaction_count'] = writer.count
+                    write_status(spool_dir, job_id, status)
+                    last_update = time.time()
+        writer.close()
+        os.rename(part, output)
+    except Exception as err:  # pylint: disable=broad-except
+        if os.path.exists(part):
+            os.remove(part)
+        status.update({'status': 'failed', 'error': str(err), 'finished': time.time()})
+        write_status(spool_dir, job_id, status)
+        return
+
+    status.update({
+        'status': 'done', 'progress': 1.0, 'interaction_count': writer.count,
+        'size': os.path.getsize(output), 'finished': time.time()
+    })
+    write_status(spool_dir, job_id, status)
+
+
+class ExportJobs(object):
+    """
+    Queue of export jobs run by a pool of worker processes
+
+    The worker pool is only started when the first job is submitted so that
+    it is not inherited by forked server processes, and its workers are
+    spawned rather than forked so that they do not inherit the threads, locks
+    and open HDF5 files of the server. The total size of the
+    spool directory is bounded. Each job reserves a share of max_workers of
+    the limit, or what is left of it, when it is submitted and fails if its
+    output grows beyond its reservation. New jobs are refused once the spool
+    is full. Finished jobs are removed once they are older than the retention
+    period.
+    """
+
+    def __init__(self, spool_dir, max_workers=2, max_spool_bytes=None, retention=86400):
+        """
+        Parameters
+        ----------
+        spool_dir : str
+            Directory for the output and status files, created if missing
+        max_workers : int
+            Number of exports that can run at the same time
+        max_spool_bytes : int
+            Maximum total size of the spool directory, None for no limit
+        retention : int
+            Number of seconds that a finished export is kept for
+        """
+        self.spool_dir = spool_dir
+        self.max_workers = max_workers
+        self.max_spool_bytes = max_spool_bytes
+        self.retention = retention
+
+        self._executor = None
+        self._lock = threading.Lock()
+        # Bytes reserved for each job that has not finished
+        self._reserved = {}
+
+    def _pool(self):
+        """
+        Worker pool, started on first use
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn'))
+            return self._executor
+
+    def spool_size(self, exclude=()):
+        """
+        Total number of bytes in the spool directory
+
+        Parameters
+        ----------
+        exclude : collection
+            IDs of jobs whose files are not counted
+        """
+        total = 0
+        for name in os.listdir(self.spool_dir):
+            if name.split('.')[0] in exclude:
+                continue
+            try:
+                total += os.path.getsize(os.path.join(self.spool_dir, name))
+            except OSError:
+                pass
+        return total
+
+    def _reserve(self, job_id):
+        """
+        Reserve space in the spool for a job
+
+        The files of unfinished jobs are counted by their reservation rather
+        than their current size, so that jobs submitted at the same time
+        cannot share the same free space.
+
+        Returns
+        -------
+        int
+            Maximum size of the output of the job, None for no limit
+        """
+        if self.max_spool_bytes is None:
+            return None
+        with self._lock:
+            used = self.spool_size(self._reserved) + sum(self._reserved.values())
+            max_bytes = min(
+                self.max_spool_bytes // self.max_workers, self.max_spool_bytes - used)
+            if max_bytes <= 0:
+                raise SpoolFull(self.spool_dir)
+            self._reserved[job_id] = max_bytes
+        return max_bytes
+
+    def _release(self, job_id):
+        """
+        Return the reservation of a job once it has finished
+        """
+        with self._lock:
+            self._reserved.pop(job_id, None)
+
+    def submit(self, user_id, path, chromosomes, resolution, fmt, chr_id=None):
+        """
+        Queue an export
+
+        Parameters
+        ----------
+        user_id : str
+            User that the export belongs to
+        path : str
+            Location of the adjacency HDF5 file
+        chromosomes : list
+            List of (chromosome, length) pairs in the order they are stored
+        resolution : int
+            Resolution to export
+        fmt : str
+            One of the keys of EXPORT_FORMATS
+        chr_id : str
+            Only export the interactions of this chromosome
+
+        Returns
+        -------
+        dict
+            Status of the new job
+
+        Raises
+        ------
+        SpoolFull
+            If the spool directory is already at its size limit
+        """
+        if not os.path.isdir(self.spool_dir):
+            os.makedirs(self.spool_dir)
+        self.expire()
+
+        job_id = uuid.uuid4().hex
+        max_bytes = self._reserve(job_id)
+        status = {
+            'job_id': job_id, 'user_id': user_id, 'status': 'queued',
+            'format': fmt, 'resolution': resolution, 'chr': chr_id,
+            'progress': 0.0, 'interaction_count': 0, 'submitted': time.time()
+        }
+        try:
+            write_status(self.spool_dir, job_id, status)
+            future = self._pool().submit(
+                run_export, self.spool_dir, job_id, path, chromosomes, resolution,
+                fmt, chr_id, max_bytes)
+        except Exception:
+            self._release(job_id)
+            raise
+        future.add_done_callback(lambda _: self._release(job_id))
+        return status
+
+    def status(self, user_id, job_id):
+        """
+        Current status of a job
+
+        Returns
+        -------
+        dict
+            None if the job does not exist or belongs to another user
+        """
+        if not job_id.isalnum():
+            return None
+        status = read_status(self.spool_dir, job_id)
+        if status is None or status.get('user_id') != user_id:
+            return None
+        return status
+
+    def output_path(self, status):
+        """
+        Location of the output of a finished job
+        """
+        return os.path.join(
+            self.spool_dir, status['job_id'] + '.' + EXPORT_FORMATS[status['format']][0])
+
+    def remove(self, job_id):
+        """
+        Delete the output and status files of a job
+        """
+        for name in os.listdir(self.spool_dir):
+            if name.split('.')[0] == job_id:
+                try:
+                    os.remove(os.path.join(self.spool_dir, name))
+                except OSError:
+                    pass
+
+    def expire(self):
+        """
+        Remove finished jobs that are older than the retention period
+        """
+        if self.retention is None:
+            return
+        cutoff = time.time() - self.retention
+        for name in os.listdir(self.spool_dir):
+            if not name.endswith('.json'):
+                continue
+            status = read_status(self.spool_dir, name[:-5])
+            if status is not None and status.get('finished', cutoff) < cutoff:
+                self.remove(status['job_id'])
+
+    def reset(self):
+        """
+        Forget the worker pool of the parent, used after forking a server
+        process
+        """
+        self._executor = None
+        self._lock = threading.Lock()
+        self._reserved = {}
+
+    def shutdown(self):
+        """
+        Stop the worker pool, waiting for running exports to finish
+        """
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
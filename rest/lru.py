@@ -0,0 +1,146 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+from __future__ import print_function
+
+import threading
+import time
+
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """
+    Thread safe least recently used cache bounded by the size of its values
+
+    The size of each value is given when it is stored. Values larger than the
+    whole budget are not stored. Entries can optionally expire after a fixed
+    time to live.
+    """
+
+    def __init__(self, max_bytes, ttl=None):
+        """
+        Parameters
+        ----------
+        max_bytes : int
+            Maximum total size of the values held
+        ttl : int
+            Number of seconds an entry is valid for, None to keep entries
+            until they are evicted
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.size = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """
+        Get a value from the cache
+
+        Returns
+        -------
+        object
+            The cached value, None if it is not in the cache
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None and self.ttl is not None and entry[2] < time.time():
+                self.size -= entry[1]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries[key] = entry
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size):
+        """
+        Store a value in the cache
+
+        Parameters
+        ----------
+        key : object
+            Hashable key
+        value : object
+            Value to cache
+        size : int
+            Number of bytes that the value accounts for
+        """
+        if size > self.max_bytes:
+            return
+
+        expires = None if self.ttl is None else time.time() + self.ttl
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            self._entries[key] = (value, size, expires)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= evicted[1]
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Remove every entry from the cache
+        """
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self):
+        """
+        Usage counters for the cache
+
+        Returns
+        -------
+        dict
+            entries : int
+                Number of values held
+            bytes : int
+                Total size of the values held
+            max_bytes : int
+                Size budget of the cache
+            hits : int
+                Number of lookups served from the cache
+            misses : int
+                Number of lookups not in the cache
+            evictions : int
+                Number of values removed to stay within the budget
+            hit_rate : float
+                Fraction of the lookups served from the cache, None before the
+                first lookup
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': float(self.hits) / lookups if lookups else None
+            }
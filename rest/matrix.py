@@ -0,0 +1,202 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+from __future__ import print_function
+
+import base64
+import io
+
+import numpy as np
+
+# Maximum number of matrix cells read from the HDF5 file in one go
+READ_BLOCK_CELLS = 1 << 22
+
+
+class MatrixBlock(object):
+    """
+    Dense block of the adjacency matrix
+
+    The row and column offsets are the genome wide bins of the first row and
+    column of the block.
+    """
+
+    def __init__(self, data, row_offset, col_offset):
+        """
+        Parameters
+        ----------
+        data : numpy.ndarray
+            2D array of values
+        row_offset : int
+            Bin of the first row
+        col_offset : int
+            Bin of the first column
+        """
+        self.data = np.ascontiguousarray(data)
+        self.row_offset = int(row_offset)
+        self.col_offset = int(col_offset)
+
+    @property
+    def shape(self):
+        """
+        Shape of the block as (rows, columns)
+        """
+        return self.data.shape
+
+    def to_dict(self):
+        """
+        JSON friendly version of the block with the values base64 encoded
+
+        Returns
+        -------
+        dict
+            dtype : str
+                NumPy type string of the values, eg <i4
+            shape : list
+                Number of rows and columns
+            row_offset : int
+                Bin of the first row
+            col_offset : int
+                Bin of the first column
+            encoding : str
+                Always base64
+            data : str
+                Row major values of the block
+        """
+        return {
+            'dtype': self.data.dtype.str,
+            'shape': list(self.data.shape),
+            'row_offset': self.row_offset,
+            'col_offset': self.col_offset,
+            'encoding': 'base64',
+            'data': base64.b64encode(self.data.tobytes()).decode('ascii')
+        }
+
+    def to_npy(self):
+        """
+        The block as the contents of a NumPy .npy file
+
+        Returns
+        -------
+        bytes
+        """
+        buf = io.BytesIO()
+        np.save(buf, self.data)
+        return buf.getvalue()
+
+
+def read_matrix(dset, x_bins, y_bins):
+    """
+    Read a rectangle of the adjacency matrix as a single hyperslab
+
+    Parameters
+    ----------
+    dset : h5py.Dataset
+        Adjacency matrix for the resolution
+    x_bins : tuple
+        (first bin, last bin + 1) for the rows
+    y_bins : tuple
+        (first bin, last bin + 1) for the columns
+
+    Returns
+    -------
+    MatrixBlock
+    """
+    data = dset[x_bins[0]:x_bins[1], y_bins[0]:y_bins[1]]
+    return MatrixBlock(data, x_bins[0], y_bins[0])
+
+
+def matrix_from_columns(values, x_bins, y_bins, dtype=np.int32):
+    """
+    Build a dense block from a set of interactions
+
+    Used when the reader does not give direct access to the matrix.
+
+    Parameters
+    ----------
+    values : rest.columnar.InteractionColumns
+        Interactions within the rectangle
+    x_bins : tuple
+        (first bin, last bin + 1) for the rows
+    y_bins : tuple
+        (first bin, last bin + 1) for the columns
+
+    Returns
+    -------
+    MatrixBlock
+    """
+    data = np.zeros((x_bins[1] - x_bins[0], y_bins[1] - y_bins[0]), dtype=dtype)
+    rows = values.pos_x - x_bins[0]
+    cols = values.pos_y - y_bins[0]
+    inside = (rows >= 0) & (rows < data.shape[0]) & (cols >= 0) & (cols < data.shape[1])
+    data[rows[inside], cols[inside]] = values.value[inside]
+    return MatrixBlock(data, x_bins[0], y_bins[0])
+
+
+def read_points(dset, pos_x, pos_y):
+    """
+    Read the values for many bin pairs
+
+    The pairs are sorted so that the matrix is read in row order. Pairs that
+    fall in the same band of rows (one chunk high for chunked datasets) are
+    served from a single read of their bounding box, or from one read per
+    row when the bounding box would be too large.
+
+    Parameters
+    ----------
+    dset : h5py.Dataset
+        Adjacency matrix for the resolution
+    pos_x : numpy.ndarray
+        Row bins
+    pos_y : numpy.ndarray
+        Column bins
+
+    Returns
+    -------
+    numpy.ndarray
+        Values in the same order as the requested pairs
+    """
+    pos_x = np.asarray(pos_x, dtype=np.int64)
+    pos_y = np.asarray(pos_y, dtype=np.int64)
+    values = np.zeros(len(pos_x), dtype=dset.dtype)
+    if len(pos_x) == 0:
+        return values
+
+    chunks = getattr(dset, 'chunks', None)
+    band = chunks[0] if chunks else 64
+
+    order = np.lexsort((pos_y, pos_x))
+    sorted_x = pos_x[order]
+    bands = sorted_x // band
+    breaks = np.flatnonzero(np.diff(bands)) + 1
+
+    for group in np.split(order, breaks):
+        group_x = pos_x[group]
+        group_y = pos_y[group]
+        x_start, x_end = int(group_x.min()), int(group_x.max()) + 1
+        y_start, y_end = int(group_y.min()), int(group_y.max()) + 1
+
+        if (x_end - x_start) * (y_end - y_start) <= READ_BLOCK_CELLS:
+            block = dset[x_start:x_end, y_start:y_end]
+            values[group] = block[group_x - x_start, group_y - y_start]
+            continue
+
+        for row in np.unique(group_x):
+            in_row = group[group_x == row]
+            cols, inverse = np.unique(pos_y[in_row], return_inverse=True)
+            values[in_row] = np.asarray(dset[int(row), cols.tolist()])[inverse]
+
+    return values
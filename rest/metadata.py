@@ -0,0 +1,225 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+from __future__ import print_function
+
+import datetime
+import hashlib
+import os
+import threading
+
+from collections import OrderedDict
+
+from rest.chrom_index import ChromosomeIndex
+from rest.lru import LRUCache
+
+
+class DatasetMetadata(object):
+    """
+    Chromosomes, resolutions and bin layout of a single adjacency file
+    """
+
+    def __init__(self, chromosomes, resolutions, version=None):
+        """
+        Parameters
+        ----------
+        chromosomes : list
+            List of [chromosome, length] pairs in the order they are stored
+        resolutions : list
+            List of the resolutions for the dataset
+        version : tuple
+            (mtime, size) of the file when the meta data was loaded. None if
+            the location of the file is not known.
+        """
+        self.chromosomes = [(c[0], int(c[1])) for c in chromosomes]
+        self.resolutions = [int(r) for r in resolutions]
+        self.version = version
+        self._indexes = {}
+
+        digest = hashlib.sha1()
+        digest.update(repr((self.chromosomes, self.resolutions, version)).encode('utf-8'))
+        self.etag = digest.hexdigest()
+
+    @property
+    def last_modified(self):
+        """
+        Modification time of the file as a UTC datetime, or None if it is not
+        known
+        """
+        if self.version is None:
+            return None
+        return datetime.datetime.fromtimestamp(
+            int(self.version[0]), datetime.timezone.utc)
+
+    def index(self, resolution):
+        """
+        Bin index for a resolution, built on first use
+
+        Parameters
+        ----------
+        resolution : int
+            Resolution of the dataset
+
+        Returns
+        -------
+        rest.chrom_index.ChromosomeIndex
+        """
+        index = self._indexes.get(resolution)
+        if index is None:
+            index = ChromosomeIndex(self.chromosomes, resolution)
+            self._indexes[resolution] = index
+        return index
+
+
+class MetadataCache(object):
+    """
+    Memoized meta data for adjacency files
+
+    Entries are keyed on the location of the file and are reloaded when the
+    modification time or size of the file changes. The location of a file is
+    held for each user and file id pair for location_ttl seconds, so that
+    files that are moved or whose access is revoked are looked up again.
+    Failed look ups are not held.
+    """
+
+    def __init__(self, locator, max_size=256, location_size=4096, location_ttl=300):
+        """
+        Parameters
+        ----------
+        locator : function
+            Called as locator(user_id, file_id), returns the path to the file
+            or None if it cannot be resolved
+        max_size : int
+            Maximum number of files to hold meta data for
+        location_size : int
+            Maximum number of user and file id pairs to hold the location for
+        location_ttl : int
+            Seconds that a location is held for, None to hold it until it is
+            evicted
+        """
+        self.locator = locator
+        self.max_size = max_size
+
+        # Each location counts as 1 so that the budget is a number of entries
+        self._paths = LRUCache(location_size, location_ttl)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def file_identity(self, user_id, file_id):
+        """
+        Resolve the identity of a file along with its current version
+
+        Parameters
+        ----------
+        user_id : str
+            User ID
+        file_id : str
+            Identifier of the file
+
+        Returns
+        -------
+        tuple
+            (key, version) where key is the path of the file and version is
+            (mtime, size). If the path is unknown the key falls back on the
+            user and file ids and the version is None.
+        """
+        path_key = (user_id, file_id)
+        path = self._paths.get(path_key)
+        if path is None:
+            path = self.locator(user_id, file_id)
+            if path is not None:
+                self._paths.put(path_key, path, 1)
+
+        if path is None:
+            return path_key, None
+
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return path, None
+        return path, (stat.st_mtime, stat.st_size)
+
+    def clear_locations(self):
+        """
+        Forget the locations of the files, for example when the locator is
+        replaced
+        """
+        self._paths.clear()
+
+    def get(self, user_id, file_id, loader):
+        """
+        Get the meta data for a file, loading it if required
+
+        Parameters
+        ----------
+        user_id : str
+            User ID
+        file_id : str
+            Identifier of the file
+        loader : function
+            Called with no arguments when the meta data needs loading. Returns
+            the dict from adjacency.get_details().
+
+        Returns
+        -------
+        DatasetMetadata
+        """
+        key, version = self.file_identity(user_id, file_id)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.version == version:
+                self.hits += 1
+                self._entries.pop(key)
+                self._entries[key] = entry
+                return entry
+            self.misses += 1
+
+        details = loader()
+        entry = DatasetMetadata(details['chromosomes'], details['resolutions'], version)
+
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = entry
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+        return entry
+
+    def stats(self):
+        """
+        Usage counters for the cache
+
+        Returns
+        -------
+        dict
+            size : int
+                Number of files with cached meta data
+            hits : int
+                Number of lookups served from the cache
+            misses : int
+                Number of lookups that required loading the meta data
+        """
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses
+            }
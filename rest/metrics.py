@@ -0,0 +1,290 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+Request timing and metrics in the Prometheus text exposition format
+
+Recording a sample is a dictionary lookup and a few additions under a lock so
+that timing every request adds no measurable latency. The metrics are kept
+per process, each worker of a pre-fork server reports its own.
+"""
+
+from __future__ import print_function
+
+import bisect
+import threading
+import time
+
+from contextlib import contextmanager
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Upper bounds in seconds of the latency histogram buckets
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+    10.0, 30.0, 60.0)
+
+
+def _format_labels(labelnames, values, extra=None):
+    """
+    Format the labels of a sample, e.g. {endpoint="values",res="10000"}
+    """
+    pairs = list(zip(labelnames, values))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(
+        '{0}="{1}"'.format(
+            name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    """
+    Format a sample value, using the Prometheus spelling of infinity
+    """
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class Histogram(object):
+    """
+    Cumulative histogram of observations for each combination of labels
+    """
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """
+        Parameters
+        ----------
+        name : str
+            Name of the metric
+        documentation : str
+            HELP text
+        labelnames : tuple
+            Names of the labels
+        buckets : tuple
+            Sorted upper bounds of the buckets
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, value, *labels):
+        """
+        Record an observation
+
+        Parameters
+        ----------
+        value : float
+            Observed value
+        labels : str
+            Value of each label, in the order of labelnames
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # bucket counts, the +Inf bucket, then the sum
+                series = [0] * (len(self.buckets) + 1) + [0.0]
+                self._series[labels] = series
+            series[index] += 1
+            series[-1] += value
+
+    def samples(self):
+        """
+        Snapshot of the histogram
+
+        Returns
+        -------
+        dict
+            Label values to (cumulative bucket counts, count, sum)
+        """
+        with self._lock:
+            series = dict((labels, list(values)) for labels, values in self._series.items())
+
+        snapshot = {}
+        for labels, values in series.items():
+            cumulative = []
+            total = 0
+            for count in values[:-1]:
+                total += count
+                cumulative.append(total)
+            snapshot[labels] = (cumulative, total, values[-1])
+        return snapshot
+
+    def render(self):
+        """
+        Lines of the text exposition format
+        """
+        lines = [
+            '# HELP {0} {1}'.format(self.name, self.documentation),
+            '# TYPE {0} histogram'.format(self.name)
+        ]
+        bounds = self.buckets + (float('inf'),)
+        for labels, (cumulative, count, total) in sorted(self.samples().items()):
+            for bound, bucket_count in zip(bounds, cumulative):
+                lines.append('{0}_bucket{1} {2}'.format(
+                    self.name,
+                    _format_labels(self.labelnames, labels, ('le', _format_value(bound))),
+                    bucket_count))
+            lines.append('{0}_count{1} {2}'.format(
+                self.name, _format_labels(self.labelnames, labels), count))
+            lines.append('{0}_sum{1} {2}'.format(
+                self.name, _format_labels(self.labelnames, labels), _format_value(total)))
+        return lines
+
+
+class Gauge(object):
+    """
+    Gauge that is read from a function when the metrics are collected
+    """
+
+    def __init__(self, name, documentation, func, labelnames=()):
+        """
+        Parameters
+        ----------
+        name : str
+            Name of the metric
+        documentation : str
+            HELP text
+        func : function
+            Called without arguments. Returns the value when there are no
+            labels, otherwise a dict of label values to value
+        labelnames : tuple
+            Names of the labels
+        """
+        self.name = name
+        self.documentation = documentation
+        self.func = func
+        self.labelnames = tuple(labelnames)
+
+    def render(self):
+        """
+        Lines of the text exposition format
+        """
+        lines = [
+            '# HELP {0} {1}'.format(self.name, self.documentation),
+            '# TYPE {0} gauge'.format(self.name)
+        ]
+        values = self.func()
+        if not self.labelnames:
+            values = {(): values}
+        for labels, value in sorted(values.items()):
+            if value is None:
+                continue
+            lines.append('{0}{1} {2}'.format(
+                self.name, _format_labels(self.labelnames, labels), _format_value(value)))
+        return lines
+
+
+class Registry(object):
+    """
+    Collection of the metrics exposed by the service
+    """
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        """
+        Add a metric
+
+        Returns
+        -------
+        Histogram | Gauge
+            The metric
+        """
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """
+        Render every metric in the text exposition format
+
+        Returns
+        -------
+        str
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+class RequestTimer(object):
+    """
+    Time spent in each phase of handling a single request
+
+    Phases are exclusive, the time spent in a span that is nested in another
+    is only counted for the inner phase.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self._nested = []
+
+    @contextmanager
+    def span(self, phase):
+        """
+        Add the time spent in a with block to a phase
+        """
+        started = time.perf_counter()
+        self._nested.append(0.0)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.add(phase, elapsed - self._nested.pop())
+            if self._nested:
+                self._nested[-1] += elapsed
+
+    def add(self, phase, seconds):
+        """
+        Add time to a phase
+        """
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def elapsed(self):
+        """
+        Seconds since the request started
+        """
+        return time.perf_counter() - self.started
+
+
+def timed_blocks(blocks, timer, phase):
+    """
+    Pass a streamed body through, adding the time spent producing each block
+    to a phase of the request
+
+    Time spent by the server sending the blocks to the client is not
+    included.
+    """
+    blocks = iter(blocks)
+    while True:
+        started = time.perf_counter()
+        try:
+            block = next(blocks)
+        except StopIteration:
+            timer.add(phase, time.perf_counter() - started)
+            return
+        timer.add(phase, time.perf_counter() - started)
+        yield block
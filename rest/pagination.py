@@ -0,0 +1,134 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+Continuation cursors for paged range queries
+
+A cursor records the (row, column) bin of the next cell to scan along with the
+row at which the scan stops and a fingerprint of the query that it belongs to.
+The cursor is passed to clients as an opaque URL safe string.
+"""
+
+from __future__ import print_function
+
+import base64
+import binascii
+import hashlib
+import json
+
+
+class InvalidCursor(ValueError):
+    """
+    Raised when a cursor cannot be decoded or belongs to a different query
+    """
+    pass
+
+
+def query_fingerprint(*params):
+    """
+    Short digest of the parameters that identify a query
+    """
+    return hashlib.sha1(repr(params).encode('utf-8')).hexdigest()[:16]
+
+
+def encode_cursor(fingerprint, row, column, end_row):
+    """
+    Encode a position in the scan as an opaque cursor
+
+    Parameters
+    ----------
+    fingerprint : str
+        From query_fingerprint for the query
+    row : int
+        Row bin of the next cell
+    column : int
+        Column bin of the next cell
+    end_row : int
+        Row bin at which the scan stops
+
+    Returns
+    -------
+    str
+    """
+    payload = json.dumps(
+        {'q': fingerprint, 'r': int(row), 'c': int(column), 'e': int(end_row)},
+        separators=(',', ':'), sort_keys=True)
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, fingerprint):
+    """
+    Decode a cursor for a query
+
+    Parameters
+    ----------
+    cursor : str
+        Cursor from encode_cursor
+    fingerprint : str
+        From query_fingerprint for the current query
+
+    Returns
+    -------
+    tuple
+        (row, column, end_row)
+
+    Raises
+    ------
+    InvalidCursor
+        If the cursor is malformed or was issued for another query
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+        position = (int(payload['r']), int(payload['c']), int(payload['e']))
+        query = payload['q']
+    except (binascii.Error, KeyError, TypeError, ValueError, UnicodeError):
+        raise InvalidCursor(cursor)
+
+    if query != fingerprint:
+        raise InvalidCursor(cursor)
+    return position
+
+
+def partition_cursors(fingerprint, x_bins, y_start, partitions):
+    """
+    Cursors that split the rows of a query into independent scans
+
+    Each cursor covers a contiguous band of rows so that the bands can be
+    paged through in parallel.
+
+    Parameters
+    ----------
+    fingerprint : str
+        From query_fingerprint for the query
+    x_bins : tuple
+        (first bin, last bin + 1) for the rows
+    y_start : int
+        First column bin
+    partitions : int
+        Number of bands to split the rows into
+
+    Returns
+    -------
+    list
+        Cursors in row order
+    """
+    row_count = x_bins[1] - x_bins[0]
+    partitions = max(1, min(partitions, row_count))
+    bounds = [x_bins[0] + (row_count * i) // partitions for i in range(partitions + 1)]
+    return [
+        encode_cursor(fingerprint, bounds[i], y_start, bounds[i + 1])
+        for i in range(partitions)
+    ]
@@ -0,0 +1,252 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+Sampling profiler for individual requests
+
+A single background thread samples the stacks of the threads that are
+handling profiled requests at a fixed interval. The samples of each request
+are kept in the collapsed stack format used by flamegraph.pl, speedscope and
+similar tools, one line per distinct stack with the frames from the root
+separated by semicolons followed by the number of samples.
+"""
+
+from __future__ import print_function
+
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+
+from collections import Counter
+
+
+def frame_name(frame):
+    """
+    Name of a frame in a collapsed stack, e.g. read_range (columnar.py:120)
+    """
+    code = frame.f_code
+    return '{0} ({1}:{2})'.format(
+        code.co_name, os.path.basename(code.co_filename), code.co_firstlineno
+    ).replace(';', ':')
+
+
+def collapse(frame):
+    """
+    Collapsed form of the stack that ends at a frame, root first
+    """
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class Profile(object):  # pylint: disable=too-few-public-methods
+    """
+    Samples of the stack of one thread
+    """
+
+    def __init__(self, thread_id):
+        self.thread_id = thread_id
+        self.started = time.time()
+        self.stacks = Counter()
+
+    @property
+    def samples(self):
+        """
+        Number of samples taken
+        """
+        return sum(self.stacks.values())
+
+    def collapsed(self):
+        """
+        The samples in the collapsed stack format
+
+        Returns
+        -------
+        str
+        """
+        return ''.join(
+            '{0} {1}\n'.format(stack, count) for stack, count in sorted(self.stacks.items()))
+
+
+class SamplingProfiler(object):
+    """
+    Samples the stacks of the threads that are being profiled
+    """
+
+    def __init__(self, interval=0.005):
+        """
+        Parameters
+        ----------
+        interval : float
+            Seconds between samples
+        """
+        self.interval = interval
+        self._profiles = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def start(self, thread_id=None):
+        """
+        Start sampling a thread
+
+        Parameters
+        ----------
+        thread_id : int
+            Identifier of the thread, the current thread by default
+
+        Returns
+        -------
+        Profile
+        """
+        profile = Profile(threading.current_thread().ident if thread_id is None else thread_id)
+        with self._lock:
+            self._profiles[id(profile)] = profile
+            # The sampling thread does not survive a fork
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='adjacency-profiler')
+                self._thread.daemon = True
+                self._thread.start()
+        return profile
+
+    def stop(self, profile):
+        """
+        Stop sampling for a profile
+
+        Returns
+        -------
+        Profile
+        """
+        with self._lock:
+            self._profiles.pop(id(profile), None)
+        return profile
+
+    def sample(self):
+        """
+        Take one sample of every thread that is being profiled
+        """
+        with self._lock:
+            profiles = list(self._profiles.values())
+        if not profiles:
+            return
+        frames = sys._current_frames()  # pylint: disable=protected-access
+        for profile in profiles:
+            frame = frames.get(profile.thread_id)
+            if frame is not None:
+                profile.stacks[collapse(frame)] += 1
+
+    def _run(self):
+        """
+        Sample until the process exits
+        """
+        while True:
+            time.sleep(self.interval)
+            self.sample()
+
+
+class ProfileStore(object):
+    """
+    Size bounded directory of captured profiles
+
+    Each profile is written as <name>.folded with the collapsed stacks and
+    <name>.json with the details of the request. The oldest profiles are
+    removed once there are more than max_files or they take up more than
+    max_bytes.
+    """
+
+    def __init__(self, directory, max_files=100, max_bytes=None):
+        """
+        Parameters
+        ----------
+        directory : str
+            Directory that the profiles are written to
+        max_files : int
+            Maximum number of profiles kept
+        max_bytes : int
+            Maximum total size of the profiles, None for no limit
+        """
+        self.directory = directory
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+
+    def write(self, profile, details):
+        """
+        Write a profile
+
+        Parameters
+        ----------
+        profile : Profile
+        details : dict
+            Details of the request, written to the JSON file
+
+        Returns
+        -------
+        str
+            Path to the collapsed stacks
+        """
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        name = time.strftime('%Y%m%dT%H%M%S', time.gmtime(profile.started)) + '-' + uuid.uuid4().hex[:8]
+        path = os.path.join(self.directory, name)
+        details = dict(details, samples=profile.samples, started=profile.started)
+        with open(path + '.json', 'w') as details_file:
+            json.dump(details, details_file, indent=2, sort_keys=True, default=str)
+        with open(path + '.folded', 'w') as stacks_file:
+            stacks_file.write(profile.collapsed())
+
+        self.evict()
+        return path + '.folded'
+
+    def profiles(self):
+        """
+        List of (mtime, size, name) for each profile, oldest first
+        """
+        usage = {}
+        for file_name in os.listdir(self.directory):
+            name, ext = os.path.splitext(file_name)
+            if ext not in ('.folded', '.json'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, file_name))
+            except OSError:
+                continue
+            mtime, size = usage.get(name, (0, 0))
+            usage[name] = (max(mtime, stat.st_mtime), size + stat.st_size)
+        return sorted((mtime, size, name) for name, (mtime, size) in usage.items())
+
+    def evict(self):
+        """
+        Remove the oldest profiles until the directory is within its budget
+        """
+        profiles = self.profiles()
+        count = len(profiles)
+        total = sum(p[1] for p in profiles)
+        for _, size, name in profiles:
+            if count <= self.max_files and (self.max_bytes is None or total <= self.max_bytes):
+                break
+            for ext in ('.folded', '.json'):
+                try:
+                    os.remove(os.path.join(self.directory, name + ext))
+                except OSError:
+                    pass
+            count -= 1
+            total -= size
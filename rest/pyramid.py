@@ -0,0 +1,257 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+Pre-computed zoom levels for adjacency matrices
+
+The pyramid for a resolution is stored in a sidecar HDF5 file next to the
+adjacency file. Each level is a dataset named after its resolution holding the
+sum of the values from the finer matrix, laid out with the same chromosome
+order as the original. The sidecar is built offline with:
+
+.. code-block:: none
+   :linenos:
+
+   python -m rest.pyramid <adjacency.hdf5> --resolution 10000 --levels 4
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+
+import h5py
+import numpy as np
+
+from rest.chrom_index import ChromosomeIndex
+
+# Maximum number of matrix cells held in memory while building a level
+BUILD_BLOCK_CELLS = 1 << 24
+
+
+def pyramid_path(path):
+    """
+    Location of the pyramid sidecar for an adjacency file
+    """
+    return path + '.pyramid.hdf5'
+
+
+def open_pyramid(user_id, path):  # pylint: disable=unused-argument
+    """
+    Open a pyramid sidecar read-only, for use as a HandlePool opener
+    """
+    return h5py.File(path, 'r')
+
+
+def coarse_starts(fine_index, coarse_index, factor):
+    """
+    First fine bin of each coarse bin
+
+    Every chromosome is aggregated separately so that coarse bins never span
+    two chromosomes.
+
+    Returns
+    -------
+    numpy.ndarray
+        Indices suitable for numpy.add.reduceat
+    """
+    fine_bins = np.arange(fine_index.bin_count, dtype=np.int64)
+    codes, starts = fine_index.locate_many(fine_bins)
+    mapping = coarse_index.first_bins[codes] + (starts // fine_index.resolution) // factor
+    return np.concatenate(([0], np.flatnonzero(np.diff(mapping)) + 1))
+
+
+def build_level(src, dst_file, chromosomes, resolution, factor):
+    """
+    Aggregate a matrix into a level that is factor times coarser
+
+    Parameters
+    ----------
+    src : h5py.Dataset
+        Matrix at the finer resolution
+    dst_file : h5py.File
+        Sidecar to write the level to
+    chromosomes : list
+        List of (chromosome, length) pairs in the order they are stored
+    resolution : int
+        Resolution of src
+    factor : int
+        Number of fine bins aggregated into each coarse bin
+
+    Returns
+    -------
+    h5py.Dataset
+        The new level
+    """
+    fine_index = ChromosomeIndex(chromosomes, resolution)
+    coarse_index = ChromosomeIndex(chromosomes, resolution * factor)
+    starts = coarse_starts(fine_index, coarse_index, factor)
+    ends = np.append(starts[1:], fine_index.bin_count)
+
+    dst = dst_file.require_dataset(
+        str(resolution * factor),
+        (coarse_index.bin_count, coarse_index.bin_count), dtype=np.int64,
+        chunks=True, compression="gzip", exact=True)
+
+    rows_per_block = max(1, BUILD_BLOCK_CELLS // max(fine_index.bin_count, 1))
+    coarse_row = 0
+    while coarse_row < coarse_index.bin_count:
+        last_row = coarse_row + 1
+        while (last_row < coarse_index.bin_count and
+               ends[last_row] - starts[coarse_row] <= rows_per_block):
+            last_row += 1
+
+        block = src[starts[coarse_row]:ends[last_row - 1], :].astype(np.int64)
+        block = np.add.reduceat(block, starts, axis=1)
+        block = np.add.reduceat(
+            block, starts[coarse_row:last_row] - starts[coarse_row], axis=0)
+        dst[coarse_row:last_row, :] = block
+        coarse_row = last_row
+
+    dst.attrs['factor'] = factor
+    return dst
+
+
+def build_pyramid(src_file, dst_path, chromosomes, resolution, levels=4):
+    """
+    Build the zoom levels for a resolution
+
+    Each level halves the resolution of the previous one, so the levels are
+    2x, 4x, 8x ... coarser than the original.
+
+    Parameters
+    ----------
+    src_file : h5py.File
+        Adjacency file
+    dst_path : str
+        Location of the sidecar to create or extend
+    chromosomes : list
+        List of (chromosome, length) pairs in the order they are stored
+    resolution : int
+        Resolution to build the pyramid from
+    levels : int
+        Number of levels to build
+
+    Returns
+    -------
+    list
+        Resolutions of the levels that were built
+    """
+    built = []
+    with h5py.File(dst_path, 'a') as dst_file:
+        dst_file.attrs['chromosomes'] = np.array(
+            [[c[0], str(c[1])] for c in chromosomes], dtype='S')
+        dset = src_file[str(resolution)]
+        current = resolution
+        for _ in range(levels):
+            dset = build_level(dset, dst_file, chromosomes, current, 2)
+            dset.attrs['base_resolution'] = resolution
+            current *= 2
+            built.append(current)
+    return built
+
+
+def pyramid_levels(pyramid_file, resolution):
+    """
+    Resolutions available in a sidecar for a base resolution
+
+    Returns
+    -------
+    list
+        Resolutions in ascending order
+    """
+    levels = []
+    for name, dset in pyramid_file.items():
+        if int(dset.attrs.get('base_resolution', -1)) == resolution:
+            levels.append(int(name))
+    return sorted(levels)
+
+
+def region_cells(index, chr_id, start, end, limit_chr=None, limit_start=None, limit_end=None):
+    """
+    Number of matrix cells covered by a range query at a given resolution
+    """
+    x_bins = index.region_bins(chr_id, start, end)
+    if limit_chr is None:
+        width = index.bin_count
+    else:
+        y_bins = index.region_bins(limit_chr, limit_start, limit_end)
+        width = y_bins[1] - y_bins[0]
+    return (x_bins[1] - x_bins[0]) * width
+
+
+def plan_level(meta, resolutions, cell_budget, chr_id, start, end,
+               limit_chr=None, limit_start=None, limit_end=None):
+    """
+    Pick the finest resolution that keeps a query within a cell budget
+
+    Parameters
+    ----------
+    meta : rest.metadata.DatasetMetadata
+        Meta data for the file
+    resolutions : list
+        Candidate resolutions in ascending order
+    cell_budget : int
+        Maximum number of matrix cells that should be read
+
+    Returns
+    -------
+    int
+        The finest resolution within the budget, or the coarsest resolution
+        if none of them are
+    """
+    for resolution in resolutions:
+        cells = region_cells(
+            meta.index(resolution), chr_id, start, end,
+            limit_chr, limit_start, limit_end)
+        if cells <= cell_budget:
+            return resolution
+    return resolutions[-1]
+
+
+def chromosomes_from_file(h5_file, resolution):
+    """
+    Read the chromosome list stored with an adjacency file
+    """
+    for attrs in (h5_file.attrs, h5_file[str(resolution)].attrs):
+        if 'chromosomes' in attrs:
+            chromosomes = attrs['chromosomes']
+            return [
+                (c[0].decode() if isinstance(c[0], bytes) else str(c[0]), int(c[1]))
+                for c in chromosomes
+            ]
+    raise KeyError('No chromosomes attribute in the adjacency file')
+
+
+def main():
+    """
+    Build a pyramid sidecar from the command line
+    """
+    parser = argparse.ArgumentParser(description='Build zoom levels for an adjacency file')
+    parser.add_argument('path', help='Adjacency HDF5 file')
+    parser.add_argument('--resolution', type=int, required=True, help='Resolution to aggregate')
+    parser.add_argument('--levels', type=int, default=4, help='Number of 2x levels to build')
+    parser.add_argument('--output', help='Sidecar location, defaults to <path>.pyramid.hdf5')
+    args = parser.parse_args()
+
+    dst_path = args.output or pyramid_path(os.path.abspath(args.path))
+    with h5py.File(args.path, 'r') as src_file:
+        chromosomes = chromosomes_from_file(src_file, args.resolution)
+        built = build_pyramid(src_file, dst_path, chromosomes, args.resolution, args.levels)
+    print('Built', ', '.join(str(r) for r in built), 'in', dst_path)
+
+
+if __name__ == '__main__':
+    main()
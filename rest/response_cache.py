@@ -0,0 +1,308 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+Cache of encoded responses
+
+Entries are held in a size bounded in-memory LRU and, optionally, in a
+second tier of files on local disk that survives restarts and is shared by
+the worker processes on a host. Each file on disk holds a line of JSON with
+the headers and creation time of the response followed by the body.
+"""
+
+from __future__ import print_function
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+from rest.lru import LRUCache
+
+# Seconds between scans of the disk tier, which pick up the entries written
+# and removed by other processes
+DISK_SCAN_INTERVAL = 60
+
+
+class CachedResponse(object):  # pylint: disable=too-few-public-methods
+    """
+    Encoded body of a response along with the headers needed to replay it
+    """
+
+    def __init__(self, body, headers, created=None):
+        """
+        Parameters
+        ----------
+        body : bytes
+            Encoded response body
+        headers : list
+            List of (name, value) pairs
+        created : float
+            Time that the response was generated
+        """
+        self.body = body
+        self.headers = headers
+        self.created = time.time() if created is None else created
+
+    def __len__(self):
+        return len(self.body)
+
+
+class ResponseCache(object):
+    """
+    Two tier cache of encoded responses
+    """
+
+    def __init__(self, max_bytes, ttl=None, disk_dir=None, disk_max_bytes=None):
+        """
+        Parameters
+        ----------
+        max_bytes : int
+            Maximum size of the bodies held in memory
+        ttl : int
+            Number of seconds a response is valid for, None for no limit
+        disk_dir : str
+            Directory for the second tier, None to only cache in memory
+        disk_max_bytes : int
+            Maximum size of the second tier, None for no limit
+        """
+        self.memory = LRUCache(max_bytes, ttl)
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+
+        self._lock = threading.Lock()
+        self.disk_hits = 0
+        self.disk_misses = 0
+        # Running size of the disk tier, None until it has been scanned
+        self._disk_bytes = None
+        self._disk_scanned = 0
+
+    @staticmethod
+    def digest(key):
+        """
+        Stable digest of a cache key, used as the file name in the disk tier
+        """
+        return hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """
+        Get a response from the cache
+
+        Responses that are only on disk are moved back into memory.
+
+        Returns
+        -------
+        CachedResponse
+            None if the response is not cached
+        """
+        entry = self.memory.get(key)
+        if entry is not None or self.disk_dir is None:
+            return entry
+
+        entry = self._disk_get(self.digest(key))
+        with self._lock:
+            if entry is None:
+                self.disk_misses += 1
+                return None
+            self.disk_hits += 1
+        self.memory.put(key, entry, len(entry))
+        return entry
+
+    def put(self, key, entry):
+        """
+        Store a response in both tiers
+
+        Parameters
+        ----------
+        key : tuple
+            Normalised query
+        entry : CachedResponse
+        """
+        self.memory.put(key, entry, len(entry))
+        if self.disk_dir is not None:
+            self._disk_put(self.digest(key), entry)
+
+    def _disk_get(self, digest):
+        """
+        Read an entry from the disk tier
+        """
+        path = os.path.join(self.disk_dir, digest + '.resp')
+        try:
+            with open(path, 'rb') as entry_file:
+                header = json.loads(entry_file.readline().decode('utf-8'))
+                entry = CachedResponse(
+                    entry_file.read(),
+                    [(name, value) for name, value in header['headers']],
+                    float(header['created']))
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            return None
+
+        if self.ttl is not None and entry.created + self.ttl < time.time():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+        # The modification time orders the entries for eviction
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return entry
+
+    def _disk_put(self, digest, entry):
+        """
+        Write an entry to the disk tier, evicting the least recently used
+        entries if the tier is over its budget
+
+        The disk tier is only a cache, the entry is skipped if it cannot be
+        written rather than failing the request.
+        """
+        if self.disk_max_bytes is not None and len(entry) > self.disk_max_bytes:
+            return
+
+        path = os.path.join(self.disk_dir, digest + '.resp')
+        tmp_path = path + '.' + str(os.getpid()) + '.tmp'
+        header = json.dumps({'headers': entry.headers, 'created': entry.created}).encode('utf-8')
+        try:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            with open(tmp_path, 'wb') as entry_file:
+                entry_file.write(header + b'\n')
+                entry_file.write(entry.body)
+            try:
+                replaced = os.path.getsize(path)
+            except OSError:
+                replaced = 0
+            os.rename(tmp_path, path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+
+        if self.disk_max_bytes is not None:
+            self._disk_account(path, len(header) + 1 + len(entry) - replaced)
+
+    def _disk_account(self, keep, added):
+        """
+        Add a write to the running size of the disk tier
+
+        The directory is only listed when the tier goes over its budget, or
+        every DISK_SCAN_INTERVAL seconds to pick up the writes of other
+        processes, rather than on every write.
+
+        Parameters
+        ----------
+        keep : str
+            Path of the entry that was written, which is not evicted
+        added : int
+            Number of bytes that the write added to the tier
+        """
+        with self._lock:
+            if self._disk_bytes is not None and (
+                    time.time() < self._disk_scanned + DISK_SCAN_INTERVAL):
+                self._disk_bytes += added
+                if self._disk_bytes <= self.disk_max_bytes:
+                    return
+            self._disk_bytes = self._disk_evict(keep)
+            self._disk_scanned = time.time()
+
+    def _disk_usage(self):
+        """
+        List of (mtime, size, path) for each entry in the disk tier
+        """
+        usage = []
+        try:
+            names = os.listdir(self.disk_dir)
+        except OSError:
+            return usage
+        for name in names:
+            if not name.endswith('.resp'):
+                continue
+            path = os.path.join(self.disk_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            usage.append((stat.st_mtime, stat.st_size, path))
+        return usage
+
+    def _disk_evict(self, keep):
+        """
+        Remove the least recently used entries, other than keep, until the
+        tier is within its budget
+
+        Returns
+        -------
+        int
+            Size of the tier after the eviction
+        """
+        usage = sorted(self._disk_usage())
+        total = sum(u[1] for u in usage)
+        for _, size, path in usage:
+            if total <= self.disk_max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+        return total
+
+    def clear(self):
+        """
+        Remove every entry from both tiers
+        """
+        self.memory.clear()
+        if self.disk_dir is not None and os.path.isdir(self.disk_dir):
+            for _, _, path in self._disk_usage():
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        with self._lock:
+            self._disk_bytes = None
+
+    def stats(self):
+        """
+        Usage counters for both tiers
+
+        Returns
+        -------
+        dict
+            memory : dict
+                See rest.lru.LRUCache.stats
+            disk : dict
+                entries, bytes, hits and misses of the disk tier, None when
+                there is no disk tier
+        """
+        stats = {'memory': self.memory.stats(), 'disk': None}
+        if self.disk_dir is not None:
+            usage = self._disk_usage() if os.path.isdir(self.disk_dir) else []
+            with self._lock:
+                stats['disk'] = {
+                    'entries': len(usage),
+                    'bytes': sum(u[1] for u in usage),
+                    'max_bytes': self.disk_max_bytes,
+                    'hits': self.disk_hits,
+                    'misses': self.disk_misses
+                }
+        return stats
@@ -0,0 +1,428 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+from __future__ import print_function
+
+import io
+import json
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+from rest.columnar import InteractionColumns
+from rest.matrix import MatrixBlock
+
+TSV_ROW = "%s\t%s\t%s\t%s\t%s\n"
+
+
+def iter_tsv(values, block_size=4096):
+    """
+    Generate the TSV representation of a list of interactions
+
+    Rows are buffered and yielded in blocks so that the response can be
+    streamed to the client without holding the whole body in memory.
+
+    Parameters
+    ----------
+    values : list | InteractionColumns
+        List of interactions as returned by adjacency.get_range or the
+        equivalent columns
+    block_size : int
+        Number of rows in each yielded block
+
+    Returns
+    -------
+    generator
+        Blocks of tab separated rows in the order chrA, startA, chrB, startB
+        and value
+    """
+    if isinstance(values, InteractionColumns):
+        for block in values.iter_blocks(block_size):
+            yield "".join([TSV_ROW % row for row in zip(*block[:5])])
+        return
+
+    block = []
+    for value in values:
+        block.append(TSV_ROW % (
+            value["chrA"], value["startA"], value["chrB"], value["startB"],
+            value["value"]))
+        if len(block) >= block_size:
+            yield "".join(block)
+            block = []
+
+    if block:
+        yield "".join(block)
+
+
+class AdjacencyJSONEncoder(json.JSONEncoder):
+    """
+    JSON encoder that understands interaction columns, matrix blocks and NumPy
+    values
+    """
+
+    def default(self, o):  # pylint: disable=method-hidden
+        if isinstance(o, InteractionColumns):
+            return o.records()
+        if isinstance(o, MatrixBlock):
+            return o.to_dict()
+        if isinstance(o, np.generic):
+            return o.item()
+        if isinstance(o, np.ndarray):
+            return o.tolist()
+        return json.JSONEncoder.default(self, o)
+
+
+def _json_default(o):
+    """
+    Conversion of the types that orjson does not know about
+    """
+    if isinstance(o, InteractionColumns):
+        return o.records()
+    if isinstance(o, MatrixBlock):
+        return o.to_dict()
+    if isinstance(o, np.generic):
+        return o.item()
+    raise TypeError(type(o))
+
+
+def json_dumps(obj, accelerated=True):
+    """
+    Encode a response as JSON
+
+    Uses orjson when it is installed, otherwise the standard library with the
+    AdjacencyJSONEncoder.
+
+    Parameters
+    ----------
+    obj : object
+    accelerated : bool
+        Set to False to always use the standard library
+
+    Returns
+    -------
+    bytes
+    """
+    if accelerated and orjson is not None:
+        return orjson.dumps(obj, default=_json_default, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, cls=AdjacencyJSONEncoder).encode('utf-8')
+
+
+def _ascii_table(strings):
+    """
+    Fixed width table of the bytes of a list of strings, padded with spaces
+    """
+    width = max([len(string) for string in strings] + [1])
+    table = np.full((len(strings), width), ord(' '), dtype=np.uint8)
+    for i, string in enumerate(strings):
+        table[i, :len(string)] = np.frombuffer(string, dtype=np.uint8)
+    return table
+
+
+def _fill_digits(rows, offset, width, column):
+    """
+    Write the decimal digits of a column of non-negative integers into a
+    block of rows, right aligned with leading spaces
+    """
+    rest = column
+    power = 1
+    for i in range(offset + width - 1, offset - 1, -1):
+        rest, digit = np.divmod(rest, 10)
+        chars = (digit + ord('0')).astype(np.uint8)
+        if power > 1:
+            chars[column < power] = ord(' ')
+        rows[:, i] = chars
+        power *= 10
+
+
+def _fixed_width_json(values, names):
+    """
+    Encode interactions as JSON objects without creating any Python objects
+    per interaction
+
+    Every object in the block is given the same width by padding the values
+    with spaces, which JSON allows between tokens, so that the whole block
+    can be built as a single 2D array of bytes.
+
+    Parameters
+    ----------
+    values : InteractionColumns
+        Block of interactions with non-negative integer values
+    names : numpy.ndarray
+        From _ascii_table for the JSON encoded chromosome names
+
+    Returns
+    -------
+    bytes
+        The objects each followed by a comma
+    """
+    fields = [
+        (b'{"chrA":', values.chr_a), (b',"startA":', values.start_a),
+        (b',"chrB":', values.chr_b), (b',"startB":', values.start_b),
+        (b',"value":', values.value.astype(np.int64)),
+        (b',"pos_x":', values.pos_x), (b',"pos_y":', values.pos_y)
+    ]
+    widths = []
+    for i, (_, column) in enumerate(fields):
+        if i in (0, 2):
+            widths.append(names.shape[1])
+        else:
+            widths.append(len(str(int(column.max()))))
+
+    rows = np.empty(
+        (len(values), sum(len(f[0]) for f in fields) + sum(widths) + 2), dtype=np.uint8)
+    offset = 0
+    for i, (key, column) in enumerate(fields):
+        rows[:, offset:offset + len(key)] = np.frombuffer(key, dtype=np.uint8)
+        offset += len(key)
+        if i in (0, 2):
+            rows[:, offset:offset + widths[i]] = names[column]
+        else:
+            _fill_digits(rows, offset, widths[i], column)
+        offset += widths[i]
+    rows[:, offset:] = np.frombuffer(b'},', dtype=np.uint8)
+    return rows.tobytes()
+
+
+def iter_values_json(values, block_size=65536, accelerated=True):
+    """
+    Generate the JSON list of interactions
+
+    Blocks of interactions with non-negative integer values and no per
+    interaction links are encoded directly from the columns with
+    _fixed_width_json. Other blocks are converted to records and encoded with
+    json_dumps.
+
+    Parameters
+    ----------
+    values : InteractionColumns
+    block_size : int
+        Number of interactions in each yielded block
+    accelerated : bool
+        Passed on to json_dumps
+
+    Returns
+    -------
+    generator
+        Blocks of the encoded list
+    """
+    names = _ascii_table([json.dumps(n).encode('utf-8') for n in values.chromosomes])
+    columnar = (
+        values.link_base is None and values.value.dtype.kind in 'iu' and
+        (len(values) == 0 or values.value.min() >= 0))
+
+    yield b'['
+    for i in range(0, len(values), block_size):
+        block = values.take(slice(i, i + block_size))
+        if columnar:
+            encoded = _fixed_width_json(block, names)[:-1]
+        else:
+            encoded = json_dumps(block.records(), accelerated)[1:-1]
+        yield encoded if i == 0 else b',' + encoded
+    yield b']'
+
+
+def values_json(values, accelerated=True):
+    """
+    JSON list of interactions, encoded once per set of columns
+
+    Returns
+    -------
+    bytes
+    """
+    key = ('json', values.link_base)
+    encoded = values.encoded.get(key)
+    if encoded is None:
+        encoded = b''.join(iter_values_json(values, accelerated=accelerated))
+        values.encoded[key] = encoded
+    return encoded
+
+
+def interaction_dtype(values):
+    """
+    Structured dtype used for the binary representation of interactions
+
+    Chromosomes are stored as codes into the chromosome table of the columns,
+    as 16 bit integers unless the table has more than 65536 entries, as it
+    can for assemblies with many scaffolds, in which case 32 bits are used.
+
+    Parameters
+    ----------
+    values : InteractionColumns
+
+    Returns
+    -------
+    numpy.dtype
+    """
+    code_type = '<u2' if len(values.chromosomes) <= 1 << 16 else '<u4'
+    return np.dtype([
+        ('chrA', code_type), ('startA', '<i8'),
+        ('chrB', code_type), ('startB', '<i8'),
+        ('value', values.value.dtype.newbyteorder('<'))
+    ])
+
+
+def interaction_array(values, dtype=None):
+    """
+    Convert interactions into the structured array used for the binary
+    representation
+
+    Parameters
+    ----------
+    values : InteractionColumns
+    dtype : numpy.dtype
+        From interaction_dtype, worked out from values if not given
+
+    Returns
+    -------
+    numpy.ndarray
+    """
+    if dtype is None:
+        dtype = interaction_dtype(values)
+    array = np.empty(len(values), dtype=dtype)
+    array['chrA'] = values.chr_a
+    array['startA'] = values.start_a
+    array['chrB'] = values.chr_b
+    array['startB'] = values.start_b
+    array['value'] = values.value
+    return array
+
+
+def npy_header(dtype, count, length=None):
+    """
+    The .npy header for a 1D array
+
+    Parameters
+    ----------
+    dtype : numpy.dtype
+    count : int
+        Number of rows in the array
+    length : int
+        Pad the header to this number of bytes so that a header written
+        before the number of rows is known can be overwritten in place
+
+    Returns
+    -------
+    bytes
+    """
+    header = io.BytesIO()
+    np.lib.format.write_array_header_1_0(header, {
+        'descr': np.lib.format.dtype_to_descr(dtype),
+        'fortran_order': False,
+        'shape': (count,)
+    })
+    header = header.getvalue()
+    if length is None or length == len(header):
+        return header
+
+    # The header length is stored as a little endian uint16 after the magic
+    # string and version, the header text ends with a newline
+    padding = length - len(header)
+    return (
+        header[:8] + np.array([length - 10], dtype='<u2').tobytes() +
+        header[10:-1] + b' ' * padding + b'\n')
+
+
+def iter_npy(values, block_size=65536):
+    """
+    Generate the interactions as a NumPy .npy file
+
+    The .npy header describes a 1D structured array with the fields chrA,
+    startA, chrB, startB and value so that the body can be loaded or memory
+    mapped with numpy.load. The rows are written in blocks without any per
+    row formatting.
+
+    Parameters
+    ----------
+    values : InteractionColumns
+    block_size : int
+        Number of rows in each yielded block
+
+    Returns
+    -------
+    generator
+        The .npy header followed by blocks of the raw array
+    """
+    dtype = interaction_dtype(values)
+    yield npy_header(dtype, len(values))
+
+    for i in range(0, len(values), block_size):
+        yield interaction_array(values.take(slice(i, i + block_size)), dtype).tobytes()
+
+
+def iter_arrow(values, block_size=65536, metadata=None):
+    """
+    Generate the interactions as an Apache Arrow IPC stream
+
+    The chromosome columns are dictionary encoded against the chromosome
+    table, the remaining columns are written as typed arrays. Each block is
+    written as a separate record batch.
+
+    Parameters
+    ----------
+    values : InteractionColumns
+    block_size : int
+        Number of rows in each record batch
+    metadata : dict
+        Key value pairs to attach to the schema
+
+    Returns
+    -------
+    generator
+        Blocks of the IPC stream
+    """
+    dictionary = pyarrow.array(values.chromosomes, type=pyarrow.string())
+    chr_type = pyarrow.dictionary(pyarrow.int32(), pyarrow.string())
+    schema = pyarrow.schema([
+        ('chrA', chr_type), ('startA', pyarrow.int64()),
+        ('chrB', chr_type), ('startB', pyarrow.int64()),
+        ('value', pyarrow.from_numpy_dtype(values.value.dtype))
+    ], metadata=metadata)
+
+    sink = io.BytesIO()
+    writer = pyarrow.ipc.new_stream(sink, schema)
+
+    def drain():
+        """
+        Take everything that has been written to the sink so far
+        """
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    for i in range(0, len(values), block_size):
+        j = i + block_size
+        writer.write_batch(pyarrow.record_batch([
+            pyarrow.DictionaryArray.from_arrays(values.chr_a[i:j], dictionary),
+            pyarrow.array(values.start_a[i:j]),
+            pyarrow.DictionaryArray.from_arrays(values.chr_b[i:j], dictionary),
+            pyarrow.array(values.start_b[i:j]),
+            pyarrow.array(values.value[i:j])
+        ], schema=schema))
+        yield drain()
+
+    writer.close()
+    yield drain()
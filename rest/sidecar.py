@@ -0,0 +1,205 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+Memory mapped copies of adjacency matrices
+
+The matrix for a resolution can be exported into an uncompressed .npy sidecar
+next to the adjacency file. Each server process maps the sidecar read-only so
+the pages are held once in the operating system page cache and shared by
+every worker, rather than each worker decompressing its own copy of the HDF5
+chunks. The sidecar is built offline with:
+
+.. code-block:: none
+   :linenos:
+
+   python -m rest.sidecar <adjacency.hdf5> --resolution 100000 --resolution 1000000
+
+The sidecar holds every cell of the matrix, so its size grows with the square
+of the number of bins. For a human genome it is about 3.6GB at 100kb but
+360GB at 10kb, so only coarse resolutions are worth exporting.
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import shutil
+import threading
+
+import h5py
+import numpy as np
+
+# Maximum number of matrix cells copied in one go while exporting
+EXPORT_BLOCK_CELLS = 1 << 24
+
+# Default limit on the size of a sidecar exported from the command line
+DEFAULT_MAX_BYTES = 1 << 32
+
+
+class SidecarTooLarge(Exception):
+    """
+    Raised when a sidecar would not fit on the disk or is above the size limit
+    """
+    pass
+
+
+def sidecar_path(path, resolution):
+    """
+    Location of the sidecar for a resolution of an adjacency file
+    """
+    return path + '.' + str(resolution) + '.npy'
+
+
+def sidecar_bytes(dset):
+    """
+    Size of the sidecar for a matrix, excluding the small .npy header
+    """
+    return int(np.prod(dset.shape, dtype=np.int64)) * np.dtype(dset.dtype).itemsize
+
+
+def export_sidecar(h5_file, path, resolution, max_bytes=None):
+    """
+    Copy the matrix for a resolution into a .npy sidecar
+
+    The matrix is copied in blocks of rows and written under a temporary name
+    so that servers never map a partial file.
+
+    Parameters
+    ----------
+    h5_file : h5py.File
+        Adjacency file
+    path : str
+        Location of the adjacency file
+    resolution : int
+        Resolution to export
+    max_bytes : int
+        Largest sidecar that will be written, None for no limit other than the
+        free space on the disk
+
+    Returns
+    -------
+    str
+        Location of the sidecar
+
+    Raises
+    ------
+    SidecarTooLarge
+        If the sidecar is above max_bytes or there is not enough free space
+        for it, in which case nothing is written
+    """
+    dset = h5_file[str(resolution)]
+    dst_path = sidecar_path(path, resolution)
+    tmp_path = dst_path + '.tmp'
+
+    size = sidecar_bytes(dset)
+    if max_bytes is not None and size > max_bytes:
+        raise SidecarTooLarge('{0} needs {1} bytes, above the limit of {2}'.format(
+            dst_path, size, max_bytes))
+    free = shutil.disk_usage(os.path.dirname(os.path.abspath(dst_path))).free
+    if size > free:
+        raise SidecarTooLarge('{0} needs {1} bytes, only {2} are free'.format(
+            dst_path, size, free))
+
+    matrix = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=dset.dtype, shape=dset.shape)
+    rows_per_block = max(1, EXPORT_BLOCK_CELLS // max(dset.shape[1], 1))
+    for row in range(0, dset.shape[0], rows_per_block):
+        matrix[row:row + rows_per_block] = dset[row:row + rows_per_block]
+    matrix.flush()
+    del matrix
+
+    os.rename(tmp_path, dst_path)
+    return dst_path
+
+
+class MappedMatrices(object):
+    """
+    Process wide set of read-only memory maps of matrix sidecars
+
+    A sidecar is only used while it is newer than the adjacency file that it
+    was exported from. Maps are opened on first use and replaced when the
+    sidecar changes.
+    """
+
+    def __init__(self):
+        self._maps = {}
+        self._lock = threading.Lock()
+
+    def get(self, path, resolution):
+        """
+        Get the mapped matrix for a resolution
+
+        Parameters
+        ----------
+        path : str
+            Location of the adjacency file
+        resolution : int
+            Resolution of the matrix
+
+        Returns
+        -------
+        numpy.memmap
+            None if there is no up to date sidecar
+        """
+        map_path = sidecar_path(path, resolution)
+        try:
+            version = os.stat(map_path).st_mtime
+            if version < os.stat(path).st_mtime:
+                return None
+        except OSError:
+            return None
+
+        key = (path, resolution)
+        with self._lock:
+            entry = self._maps.get(key)
+            if entry is None or entry[0] != version:
+                entry = (version, np.load(map_path, mmap_mode='r'))
+                self._maps[key] = entry
+            return entry[1]
+
+    def reset(self):
+        """
+        Drop every map, used after forking a worker process
+        """
+        self._maps = {}
+        self._lock = threading.Lock()
+
+
+def main():
+    """
+    Export matrix sidecars from the command line
+    """
+    parser = argparse.ArgumentParser(description='Export memory mapped matrices')
+    parser.add_argument('path', help='Adjacency HDF5 file')
+    parser.add_argument(
+        '--resolution', type=int, action='append', required=True,
+        help='Resolution to export, can be given more than once')
+    parser.add_argument(
+        '--max-bytes', type=int, default=DEFAULT_MAX_BYTES,
+        help='Largest sidecar to write, 0 for no limit. Defaults to 4GB')
+    args = parser.parse_args()
+
+    path = os.path.abspath(args.path)
+    with h5py.File(path, 'r') as h5_file:
+        for resolution in args.resolution:
+            try:
+                print('Exported', export_sidecar(
+                    h5_file, path, resolution, args.max_bytes or None))
+            except SidecarTooLarge as err:
+                print('Skipped resolution', resolution, '-', err)
+
+
+if __name__ == '__main__':
+    main()
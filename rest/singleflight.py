@@ -0,0 +1,114 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+from __future__ import print_function
+
+import threading
+
+
+class _Call(object):  # pylint: disable=too-few-public-methods
+    """
+    A computation that is in progress along with its outcome
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """
+    Coalesce identical computations that are running at the same time
+
+    The first caller for a key runs the computation, any caller that arrives
+    with the same key while it is running waits for it and gets the same
+    result, or the same exception. Nothing is kept once the computation has
+    finished so later callers run it again.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+        self.calls = 0
+        self.shared = 0
+
+    def do(self, key, func, *args, **kwargs):
+        """
+        Run func(*args, **kwargs) unless it is already running for key
+
+        Parameters
+        ----------
+        key : tuple
+            Hashable key that identifies the computation
+        func : function
+            Computation to run
+
+        Returns
+        -------
+        object
+            Return value of func
+        """
+        with self._lock:
+            self.calls += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+        except Exception as err:
+            call.error = err
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def stats(self):
+        """
+        Usage counters
+
+        Returns
+        -------
+        dict
+            in_flight : int
+                Number of computations currently running
+            calls : int
+                Number of computations requested
+            shared : int
+                Number of requests that were given the result of a
+                computation that was already running
+        """
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                'calls': self.calls,
+                'shared': self.shared
+            }
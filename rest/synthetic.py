@@ -0,0 +1,281 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+Synthetic adjacency files for tests and benchmarks
+
+The files have the layout read by reader.hdf5_adjacency: a symmetric genome
+wide matrix for each resolution stored as a 2D dataset named after the
+resolution, with the chromosomes and their lengths in a chromosomes
+attribute. Cells are filled from a hash of their coordinates, so the same
+parameters always give the same file and the matrix can be written a block of
+rows at a time. Interactions are more frequent and stronger close to the
+diagonal, as they are in Hi-C data.
+
+The bins are laid out by rest.chrom_index.ChromosomeIndex, which is also what
+the service uses to read the files, so the synthetic files cannot catch a
+mismatch between that layout and the real files on their own. The layout is
+the contract that real files have to follow: the chromosomes one after the
+other in the order of the chromosomes attribute, each taking
+length // resolution + 1 bins. test_layout_matches_reader checks it against
+reader.hdf5_adjacency and its test file when they are installed.
+
+.. code-block:: none
+   :linenos:
+
+   python -m rest.synthetic synthetic.hdf5 --genome-size 300000000 \\
+       --chromosomes 3 --resolution 10000 --resolution 100000 --density 0.01
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+
+import h5py
+import numpy as np
+
+from rest.chrom_index import ChromosomeIndex
+from rest.columnar import read_range
+from rest.pyramid import chromosomes_from_file
+
+# Maximum number of matrix cells held in memory while writing a matrix
+WRITE_BLOCK_CELLS = 1 << 24
+
+
+def synthetic_chromosomes(genome_size, count):
+    """
+    Split a genome into chromosomes of decreasing length
+
+    Returns
+    -------
+    list
+        List of (chromosome, length) pairs, chr1 being the longest
+    """
+    weights = np.arange(count, 0, -1, dtype=np.float64)
+    lengths = np.floor(genome_size * weights / weights.sum()).astype(np.int64)
+    return [('chr' + str(i + 1), int(length)) for i, length in enumerate(lengths)]
+
+
+def _uniform(rows, columns, seed):
+    """
+    Uniform numbers in [0, 1) for each cell, symmetric in rows and columns
+
+    Uses the splitmix64 finaliser on the cell coordinates so that each cell
+    gets the same number whichever block it is written in.
+    """
+    low = np.minimum(rows, columns).astype(np.uint64)
+    high = np.maximum(rows, columns).astype(np.uint64)
+    with np.errstate(over='ignore'):
+        mixed = (low << np.uint64(32)) ^ high ^ np.uint64(seed * 0x9E3779B97F4A7C15 % (1 << 64))
+        mixed = (mixed ^ (mixed >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        mixed = (mixed ^ (mixed >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        mixed = mixed ^ (mixed >> np.uint64(31))
+    return (mixed >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+
+def synthetic_block(index, row_start, row_end, density, seed=0):
+    """
+    Rows of the synthetic matrix for a resolution
+
+    Parameters
+    ----------
+    index : rest.chrom_index.ChromosomeIndex
+        Bin layout for the resolution
+    row_start, row_end : int
+        First row and last row + 1
+    density : float
+        Fraction of the cells away from the diagonal that hold an interaction.
+        Cells close to the diagonal, and within a chromosome, are more likely
+        to hold one.
+    seed : int
+        Seed for the values
+
+    Returns
+    -------
+    numpy.ndarray
+        int32 block of shape (row_end - row_start, index.bin_count)
+    """
+    rows = np.arange(row_start, row_end, dtype=np.int64)[:, np.newaxis]
+    columns = np.arange(index.bin_count, dtype=np.int64)[np.newaxis, :]
+
+    codes = np.searchsorted(index.first_bins, np.arange(index.bin_count), side='right') - 1
+    cis = codes[rows] == codes[columns]
+    distance = np.abs(rows - columns)
+
+    # Probability of an interaction decays with the distance between bins
+    probability = np.where(cis, density * (1.0 + 50.0 / (1.0 + distance)), density)
+    uniform = _uniform(rows, columns, seed + index.resolution)
+    present = uniform < np.minimum(probability, 1.0)
+
+    strength = np.where(cis, 1000.0 / (1.0 + distance), 5.0)
+    values = 1 + np.floor(strength * uniform / np.maximum(probability, 1e-12)).astype(np.int64) % 1000
+    return np.where(present, values, 0).astype(np.int32)
+
+
+def write_synthetic(path, chromosomes, resolutions, density=0.01, seed=0,
+                    chunks=(256, 256), compression='gzip'):
+    """
+    Write a synthetic adjacency file
+
+    Parameters
+    ----------
+    path : str
+        Location of the file to write
+    chromosomes : list
+        List of (chromosome, length) pairs
+    resolutions : list
+        Resolutions to write a matrix for
+    density : float
+        See synthetic_block
+    seed : int
+        Seed for the values
+    chunks : tuple
+        Chunk shape of the matrices, None for contiguous matrices
+    compression : str
+        HDF5 compression filter of the matrices, None for no compression
+
+    Returns
+    -------
+    int
+        Number of interactions written, counting each cell of the matrices
+    """
+    count = 0
+    with h5py.File(path, 'w') as h5_file:
+        h5_file.attrs['chromosomes'] = np.array(
+            [[c[0], str(c[1])] for c in chromosomes], dtype='S')
+        for resolution in resolutions:
+            index = ChromosomeIndex(chromosomes, resolution)
+            size = index.bin_count
+            dset = h5_file.create_dataset(
+                str(resolution), (size, size), dtype=np.int32,
+                chunks=None if chunks is None else (min(chunks[0], size), min(chunks[1], size)),
+                compression=None if chunks is None else compression)
+
+            rows_per_block = max(1, WRITE_BLOCK_CELLS // max(size, 1))
+            for row_start in range(0, size, rows_per_block):
+                row_end = min(row_start + rows_per_block, size)
+                block = synthetic_block(index, row_start, row_end, density, seed)
+                dset[row_start:row_end, :] = block
+                count += int(np.count_nonzero(block))
+    return count
+
+
+class SyntheticAdjacency(object):
+    """
+    Reader for synthetic files with the interface of
+    reader.hdf5_adjacency.adjacency
+
+    Used in place of the reader, through HandlePool, to run the service
+    against synthetic files without the DM API.
+    """
+
+    def __init__(self, path, resolution=None):
+        """
+        Parameters
+        ----------
+        path : str
+            Location of the synthetic file
+        resolution : int
+            Resolution that will be read
+        """
+        self.f = h5py.File(path, 'r')  # pylint: disable=invalid-name
+        self.resolution = resolution
+
+    def get_details(self):
+        """
+        Chromosomes and resolutions in the file
+
+        Returns
+        -------
+        dict
+            chromosomes : list
+                List of [chromosome, length] pairs
+            resolutions : list
+                List of the resolutions
+        """
+        resolutions = sorted(int(name) for name in self.f.keys())
+        return {
+            'chromosomes': [list(c) for c in chromosomes_from_file(self.f, resolutions[0])],
+            'resolutions': resolutions
+        }
+
+    def _index(self):
+        """
+        Bin layout for the resolution of the reader
+        """
+        return ChromosomeIndex(
+            chromosomes_from_file(self.f, self.resolution), self.resolution)
+
+    def get_range(self, chr_id, start, end, limit_chr=None, limit_start=None,
+                  limit_end=None, value_url='', no_links=False):  # pylint: disable=unused-argument
+        """
+        Interactions for a region as a list of dicts
+
+        Returns
+        -------
+        dict
+            results : list
+                List of interactions
+            log : list
+                Always empty
+        """
+        values = read_range(
+            self.f[str(self.resolution)], self._index(),
+            chr_id, start, end, limit_chr, limit_start, limit_end)
+        return {'results': values.records(), 'log': []}
+
+    def get_value(self, pos_x, pos_y):
+        """
+        Value of a single cell
+        """
+        return int(self.f[str(self.resolution)][pos_x, pos_y])
+
+    def close(self):
+        """
+        Close the file
+        """
+        self.f.close()
+
+
+def main():
+    """
+    Write a synthetic adjacency file from the command line
+    """
+    parser = argparse.ArgumentParser(description='Write a synthetic adjacency file')
+    parser.add_argument('path', help='Location of the HDF5 file to write')
+    parser.add_argument('--genome-size', type=int, default=100000000, help='Total length in bp')
+    parser.add_argument('--chromosomes', type=int, default=3, help='Number of chromosomes')
+    parser.add_argument(
+        '--resolution', type=int, action='append',
+        help='Resolution to write, can be given more than once. Defaults to 100000')
+    parser.add_argument(
+        '--density', type=float, default=0.01,
+        help='Fraction of the cells away from the diagonal with an interaction')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--chunk', type=int, default=256, help='Chunk size, 0 for contiguous')
+    parser.add_argument('--compression', default='gzip', help='HDF5 filter, none for none')
+    args = parser.parse_args()
+
+    chromosomes = synthetic_chromosomes(args.genome_size, args.chromosomes)
+    count = write_synthetic(
+        args.path, chromosomes, args.resolution or [100000], args.density, args.seed,
+        (args.chunk, args.chunk) if args.chunk else None,
+        None if args.compression == 'none' else args.compression)
+    print('Wrote', count, 'interactions to', os.path.abspath(args.path))
+
+
+if __name__ == '__main__':
+    main()
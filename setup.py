@@ -21,6 +21,7 @@ setup(
     name='rest',
     packages=['rest'],
     include_package_data=True,
+    python_requires='>=3.7',
     install_requires=[
         'flask', 'flask_restful', 'waitress', 'pylint', 'pytest'
     ],
@@ -0,0 +1,144 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+Fixtures for running rest.app against a synthetic adjacency file
+
+The DM API, the reader and the authorisation decorator are replaced with
+stand-ins when they are not installed, so that the endpoints can be tested
+without them. The stand-ins are only installed once a test asks for the app.
+"""
+
+from __future__ import print_function
+
+import importlib
+import sys
+import types
+
+from functools import wraps
+
+import pytest
+
+CHROMOSOMES = [('chr1', 1000000), ('chr2', 500000)]
+
+RESOLUTIONS = [10000, 100000]
+
+
+def _authorized(func):
+    """
+    Stand-in for mg_rest_util.mg_auth.authorized, any bearer token is the
+    user test
+    """
+    from flask import request  # pylint: disable=import-outside-toplevel
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        """
+        Pass the user to the resource, None without a token
+        """
+        header = request.headers.get('Authorization', '')
+        user_id = {'user_id': 'test'} if header.startswith('Bearer ') else None
+        return func(*args, user_id=user_id, **kwargs)
+    return wrapper
+
+
+class _DMP(object):  # pylint: disable=too-few-public-methods
+    """
+    Stand-in for dmp.dmp that does not know any files
+    """
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def get_file_by_id(self, user_id, file_id):  # pylint: disable=unused-argument
+        """
+        No file can be located
+        """
+        return None
+
+
+def _adjacency(*args, **kwargs):
+    """
+    Stand-in for reader.hdf5_adjacency.adjacency, files are opened through
+    rest.app.use_reader instead
+    """
+    raise IOError('reader.hdf5_adjacency is not installed')
+
+
+def _install(name, **attributes):
+    """
+    Register a stand-in module, and its parent packages, if the module cannot
+    be imported
+
+    Stand-ins have STAND_IN set so that tests of the real modules can skip.
+    """
+    try:
+        importlib.import_module(name)
+        return
+    except ImportError:
+        pass
+
+    parts = name.split('.')
+    for i in range(1, len(parts) + 1):
+        package = '.'.join(parts[:i])
+        if package not in sys.modules:
+            sys.modules[package] = types.ModuleType(package)
+        if i > 1:
+            setattr(sys.modules['.'.join(parts[:i - 1])], parts[i - 1], sys.modules[package])
+    for key, value in attributes.items():
+        setattr(sys.modules[name], key, value)
+    sys.modules[name].STAND_IN = True
+
+
+@pytest.fixture(scope='session')
+def adjacency_app():
+    """
+    The rest.app module, importing it with stand-ins for the DM API, reader
+    and authorisation when they are not installed
+    """
+    _install('dmp', dmp=_DMP)
+    _install('reader.hdf5_adjacency', adjacency=_adjacency)
+    _install('mg_rest_util.mg_auth', authorized=_authorized)
+    return importlib.import_module('rest.app')
+
+
+@pytest.fixture(scope='session')
+def synthetic_path(tmpdir_factory):
+    """
+    Synthetic adjacency file with the chromosomes and resolutions above
+    """
+    from rest.synthetic import write_synthetic  # pylint: disable=import-outside-toplevel
+    path = str(tmpdir_factory.mktemp('synthetic').join('synthetic.hdf5'))
+    write_synthetic(path, CHROMOSOMES, RESOLUTIONS, density=0.05)
+    return path
+
+
+@pytest.fixture
+def client(adjacency_app, synthetic_path, monkeypatch):  # pylint: disable=redefined-outer-name
+    """
+    Flask test client serving the synthetic file for every file id
+
+    The response cache is turned off and the tile cache emptied, tests of
+    the caches install their own.
+    """
+    from rest.synthetic import SyntheticAdjacency  # pylint: disable=import-outside-toplevel
+    monkeypatch.setitem(adjacency_app.APP.config, 'TESTING', True)
+    monkeypatch.setattr(adjacency_app, 'RESPONSE_CACHE', None)
+    adjacency_app.use_reader(
+        lambda user_id, file_id, resolution=None: SyntheticAdjacency(synthetic_path, resolution),
+        lambda user_id, file_id: synthetic_path)
+    adjacency_app.TILE_CACHE.clear()
+    yield adjacency_app.APP.test_client()
+    adjacency_app.HANDLE_POOL.close_all()
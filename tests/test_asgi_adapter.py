@@ -0,0 +1,210 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+from __future__ import print_function
+
+import asyncio
+import json
+import threading
+
+from flask import Flask, Response, request
+
+from rest.asgi_adapter import ASGIAdapter
+
+STATE = {'produced': 0, 'closed': threading.Event()}
+
+def make_app():
+    """
+    Flask app with a plain and a streamed endpoint
+    """
+    flask_app = Flask(__name__)
+
+    @flask_app.route('/mug/api/adjacency/echo', methods=['GET', 'POST'])
+    def echo():  # pylint: disable=unused-variable
+        """
+        Return the query, the authorisation header and the body
+        """
+        return {
+            'args': request.args.to_dict(),
+            'auth': request.headers.get('Authorization'),
+            'body': request.get_data().decode('utf-8')
+        }
+
+    @flask_app.route('/mug/api/adjacency/stream')
+    def stream():  # pylint: disable=unused-variable
+        """
+        Endless body that counts the blocks produced
+        """
+        def blocks():
+            """
+            Produce blocks until closed
+            """
+            try:
+                while True:
+                    STATE['produced'] += 1
+                    yield b'x' * 1024
+            finally:
+                STATE['closed'].set()
+        return Response(blocks(), mimetype='application/tsv')
+
+    return flask_app
+
+def scope(path, method='GET', query=b''):
+    """
+    ASGI HTTP scope for a request
+    """
+    return {
+        'type': 'http', 'method': method, 'path': path, 'query_string': query,
+        'headers': [(b'authorization', b'Bearer teststring'), (b'host', b'localhost')],
+        'server': ('localhost', 5002), 'client': ('127.0.0.1', 40000), 'scheme': 'http'
+    }
+
+def call(adapter, request_scope, body=b'', max_blocks=None):
+    """
+    Run a request through the adapter
+
+    The client disconnects after receiving max_blocks blocks of the body.
+    Returns the messages sent by the adapter.
+    """
+    sent = []
+
+    async def run():
+        """
+        Drive the ASGI callable
+        """
+        disconnect = asyncio.Event()
+        requested = [False]
+
+        async def receive():
+            """
+            The body, then wait for the client to disconnect
+            """
+            if not requested[0]:
+                requested[0] = True
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            await disconnect.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            """
+            Collect the messages, slowly
+            """
+            await asyncio.sleep(0.001)
+            sent.append(message)
+            blocks = sum(1 for m in sent if m.get('more_body'))
+            if max_blocks is not None and blocks >= max_blocks:
+                disconnect.set()
+
+        await asyncio.wait_for(adapter(request_scope, receive, send), 10)
+
+    asyncio.run(run())
+    return sent
+
+def test_request():
+    """
+    Test that the request and response are passed through
+    """
+    adapter = ASGIAdapter(make_app(), max_workers=2)
+    sent = call(
+        adapter, scope('/mug/api/adjacency/echo', 'POST', b'file_id=test&res=10000'), b'[1, 2]')
+    assert sent[0]['status'] == 200
+    assert (b'content-type', b'application/json') in sent[0]['headers']
+
+    body = json.loads(b''.join(m.get('body', b'') for m in sent[1:]).decode('utf-8'))
+    assert body == {
+        'args': {'file_id': 'test', 'res': '10000'},
+        'auth': 'Bearer teststring',
+        'body': '[1, 2]'
+    }
+    assert not sent[-1].get('more_body', False)
+    adapter.shutdown()
+
+def test_disconnect_backpressure():
+    """
+    Test that a streamed body is produced no faster than it is sent and is
+    closed when the client disconnects
+    """
+    STATE['produced'] = 0
+    STATE['closed'].clear()
+    adapter = ASGIAdapter(make_app(), max_workers=2, stream_buffer=2)
+    sent = call(adapter, scope('/mug/api/adjacency/stream'), max_blocks=20)
+
+    assert sent[0]['status'] == 200
+    assert STATE['closed'].wait(5)
+    # The thread waits for the queue, so only a few blocks are produced
+    # beyond those sent
+    assert STATE['produced'] <= 20 + 2 + 3
+    assert adapter.cancelled == 1
+    adapter.shutdown()
+
+def test_busy():
+    """
+    Test that requests beyond the queue limit are turned away
+    """
+    adapter = ASGIAdapter(make_app(), max_workers=1, max_pending=0)
+    sent = call(adapter, scope('/mug/api/adjacency/echo'))
+    assert sent[0]['status'] == 503
+    assert adapter.rejected == 1
+
+    # The body of a refused request is not read
+    received = []
+    sent = []
+
+    async def receive():
+        """
+        Record that the body was asked for
+        """
+        received.append(1)
+        return {'type': 'http.request', 'body': b'x' * 1024, 'more_body': True}
+
+    async def send(message):
+        """
+        Collect the messages
+        """
+        sent.append(message)
+
+    asyncio.run(adapter(scope('/mug/api/adjacency/echo', 'POST'), receive, send))
+    assert sent[0]['status'] == 503
+    assert not received
+    assert adapter.pending == 0
+
+def test_disconnect_before_body():
+    """
+    Test that the slot of a request is released when the client leaves while
+    sending the body
+    """
+    adapter = ASGIAdapter(make_app(), max_workers=1, max_pending=1)
+    messages = iter([
+        {'type': 'http.request', 'body': b'x', 'more_body': True},
+        {'type': 'http.disconnect'}
+    ])
+
+    async def receive():
+        """
+        Part of the body, then the client disconnects
+        """
+        return next(messages)
+
+    async def send(message):
+        """
+        Nothing is expected to be sent
+        """
+        raise AssertionError(message)
+
+    asyncio.run(adapter(scope('/mug/api/adjacency/echo', 'POST'), receive, send))
+    assert adapter.pending == 0
+    adapter.shutdown()
@@ -0,0 +1,74 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+from __future__ import print_function
+
+import numpy as np
+import pytest # pylint: disable=unused-import
+
+from rest.chrom_index import ChromosomeIndex
+
+def get_index():
+    """
+    Index with chromosomes of 26, 13 and 1 bins
+    """
+    return ChromosomeIndex([('chr1', 250000), ('chr2', 125000), ('chrM', 16)], 10000)
+
+def test_coordinate_to_bin():
+    """
+    Test the mapping of genomic positions to bins
+    """
+    index = get_index()
+    assert index.bin_for('chr1', 0) == 0
+    assert index.bin_for('chr2', 15000) == 27
+    assert index.bin_for('chr2', 10 ** 9) == 38
+    assert index.bins_for('chr2', np.array([0, 15000, 10 ** 9])).tolist() == [26, 27, 38]
+    assert index.region_bins('chr2', 10000, 50000) == (27, 31)
+    assert index.region_bins('chrM') == (39, 40)
+
+def test_bin_to_coordinate():
+    """
+    Test the mapping of bins back to chromosomes and start positions
+    """
+    index = get_index()
+    assert index.locate(0) == ('chr1', 0)
+    assert index.locate(25) == ('chr1', 250000)
+    assert index.locate(27) == ('chr2', 10000)
+    assert index.locate(39) == ('chrM', 0)
+
+    codes, starts = index.locate_many(np.array([39, 0, 27]))
+    assert [index.names[c] for c in codes] == ['chrM', 'chr1', 'chr2']
+    assert starts.tolist() == [0, 0, 10000]
+
+def test_missing_chromosome():
+    """
+    Test that unknown chromosomes are not in the index
+    """
+    index = get_index()
+    assert 'chrX' not in index
+    with pytest.raises(KeyError):
+        index.bin_for('chrX', 0)
+
+def test_region_partial_bins():
+    """
+    Test that bins only partly covered by the end of a region are included
+    """
+    index = get_index()
+    assert index.region_bins('chr1', 15000, 25000) == (1, 3)
+    assert index.region_bins('chr1', 0, 5000) == (0, 1)
+    assert index.region_bins('chr2', 10000, 10 ** 9) == (27, 39)
+    assert index.region_bins('chr2', 10000, 10000) == (27, 27)
@@ -0,0 +1,78 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+from __future__ import print_function
+
+import numpy as np
+import pytest # pylint: disable=unused-import
+
+h5py = pytest.importorskip('h5py')
+
+from rest.chunks import chunked, chunk_runs  # pylint: disable=wrong-import-position
+from rest.lru import LRUCache  # pylint: disable=wrong-import-position
+from rest.matrix import read_points  # pylint: disable=wrong-import-position
+
+def get_matrix(tmpdir):
+    """
+    10 x 10 matrix stored in 4 x 4 chunks
+    """
+    h5_file = h5py.File(str(tmpdir.join('test.hdf5')), 'w')
+    matrix = np.arange(100, dtype=np.int32).reshape((10, 10))
+    h5_file.create_dataset('10', data=matrix, chunks=(4, 4), compression='gzip')
+    return h5_file, matrix
+
+def test_chunk_runs():
+    """
+    Test that consecutive chunk columns are merged into single reads
+    """
+    assert chunk_runs([0, 1, 2, 5, 7, 8]) == [[0, 1, 2], [5], [7, 8]]
+    assert chunk_runs([]) == []
+
+def test_chunked_read(tmpdir):
+    """
+    Test that each chunk is only read once across overlapping windows
+    """
+    h5_file, matrix = get_matrix(tmpdir)
+    cache = LRUCache(1 << 20)
+    dset = chunked(h5_file['10'], cache, ('test', 10))
+
+    assert dset[3:6, 2:9].tolist() == matrix[3:6, 2:9].tolist()
+    assert cache.stats()['entries'] == 6
+    assert cache.stats()['misses'] == 6
+
+    assert dset[5:7, 4:6].tolist() == matrix[5:7, 4:6].tolist()
+    assert cache.stats()['hits'] == 1
+    assert dset[9:, :].tolist() == matrix[9:, :].tolist()
+    assert dset[2, [7, 1, 7]].tolist() == [27, 21, 27]
+    assert dset[8, 3] == 83
+
+    pos_x = np.array([0, 9, 4, 4])
+    pos_y = np.array([9, 0, 4, 5])
+    assert read_points(dset, pos_x, pos_y).tolist() == matrix[pos_x, pos_y].tolist()
+    h5_file.close()
+
+def test_chunked_large_read(tmpdir):
+    """
+    Test that reads over the limit bypass the cache
+    """
+    h5_file, matrix = get_matrix(tmpdir)
+    cache = LRUCache(1 << 20)
+    dset = chunked(h5_file['10'], cache, ('test', 10), max_read_bytes=64)
+    assert dset[:, :].tolist() == matrix.tolist()
+    assert cache.stats()['entries'] == 0
+    assert chunked(matrix, cache, ('test', 10)) is matrix
+    h5_file.close()
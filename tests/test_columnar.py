@@ -0,0 +1,151 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+from __future__ import print_function
+
+import numpy as np
+import pytest # pylint: disable=unused-import
+
+from rest import columnar
+from rest.columnar import InteractionColumns, read_range
+from rest.metadata import DatasetMetadata
+
+def get_matrix():
+    """
+    Symmetric matrix for 2 chromosomes of 6 and 4 bins at a resolution of 10
+    """
+    meta = DatasetMetadata([['chr1', 50], ['chr2', 30]], [10])
+    index = meta.index(10)
+    matrix = np.zeros((10, 10), dtype=np.int32)
+    matrix[1, 2] = matrix[2, 1] = 5
+    matrix[2, 7] = matrix[7, 2] = 3
+    matrix[4, 4] = 1
+    return matrix, index
+
+def test_read_range():
+    """
+    Test that the non-zero cells of a region are returned genome wide
+    """
+    matrix, index = get_matrix()
+    values = read_range(matrix, index, 'chr1', 10, 30)
+    assert len(values) == 3
+
+    records = values.records()
+    assert records[0] == {
+        'chrA': 'chr1', 'startA': 10, 'chrB': 'chr1', 'startB': 20,
+        'value': 5, 'pos_x': 1, 'pos_y': 2}
+    assert records[2]['chrB'] == 'chr2'
+    assert records[2]['startB'] == 10
+
+def test_read_range_limit():
+    """
+    Test that the interactions can be limited to a second chromosome
+    """
+    matrix, index = get_matrix()
+    values = read_range(matrix, index, 'chr1', 0, 50, 'chr2', 0, 30)
+    assert values.pos_x.tolist() == [2]
+    assert values.pos_y.tolist() == [7]
+
+def test_read_range_blocks(monkeypatch):
+    """
+    Test that reading the matrix in blocks gives the same result
+    """
+    matrix, index = get_matrix()
+    expected = read_range(matrix, index, 'chr1', 0, 50).records()
+    monkeypatch.setattr(columnar, 'READ_BLOCK_CELLS', 10)
+    assert read_range(matrix, index, 'chr1', 0, 50).records() == expected
+
+def test_from_records():
+    """
+    Test that reader results round trip through the columns
+    """
+    matrix, index = get_matrix()
+    records = read_range(matrix, index, 'chr1', 0, 50).records()
+    values = InteractionColumns.from_records(records)
+    assert values.records() == records
+
+    values.link_base = 'getValue?file_id=test&res=10'
+    assert values.take(values.value > 4).records()[0]['_links'] == {
+        '_self': 'getValue?file_id=test&res=10&pos_x=1&pos_y=2'}
+
+def test_read_range_value_filter():
+    """
+    Test that the value thresholds are applied before the columns are built
+    """
+    matrix, index = get_matrix()
+    values = read_range(matrix, index, 'chr1', 0, 50, min_value=2, max_value=4)
+    assert values.pos_x.tolist() == [2]
+    assert values.pos_y.tolist() == [7]
+    assert values.value.tolist() == [3]
+
+def test_read_range_top_n(monkeypatch):
+    """
+    Test that the top_n selection is ordered by value and is the same when the
+    matrix is read in blocks
+    """
+    matrix, index = get_matrix()
+    values = read_range(matrix, index, 'chr1', 0, 50, top_n=3)
+    assert values.value.tolist() == [5, 5, 3]
+    assert values.pos_x.tolist() == [1, 2, 2]
+
+    monkeypatch.setattr(columnar, 'READ_BLOCK_CELLS', 10)
+    assert read_range(matrix, index, 'chr1', 0, 50, top_n=3).records() == values.records()
+
+    records = read_range(matrix, index, 'chr1', 0, 50).records()
+    in_memory = columnar.filter_values(InteractionColumns.from_records(records), top_n=3)
+    assert in_memory.records() == values.records()
+
+class ChunkedMatrix(object):  # pylint: disable=too-few-public-methods
+    """
+    Matrix with the chunk layout of an HDF5 dataset that counts the number of
+    reads that touch each chunk
+    """
+
+    def __init__(self, matrix, chunks):
+        self.matrix = matrix
+        self.chunks = chunks
+        self.reads = np.zeros((
+            -(-matrix.shape[0] // chunks[0]), -(-matrix.shape[1] // chunks[1])), dtype=np.int32)
+
+    def __getitem__(self, key):
+        rows, cols = key
+        if rows.stop > rows.start and cols.stop > cols.start:
+            self.reads[
+                rows.start // self.chunks[0]:(rows.stop - 1) // self.chunks[0] + 1,
+                cols.start // self.chunks[1]:(cols.stop - 1) // self.chunks[1] + 1] += 1
+        return self.matrix[key]
+
+def test_iter_range_blocks_chunks(monkeypatch):
+    """
+    Test that chunked matrices are read in blocks aligned to the chunks, so
+    that each chunk is read once, and that the interactions are still in row
+    order
+    """
+    matrix, index = get_matrix()
+    expected = read_range(matrix, index, 'chr1', 0, 50).records()
+
+    for block_cells in (1, 8, 12, 30, 1 << 22):
+        monkeypatch.setattr(columnar, 'READ_BLOCK_CELLS', block_cells)
+        chunked = ChunkedMatrix(matrix, (3, 4))
+        assert read_range(chunked, index, 'chr1', 0, 50).records() == expected
+        assert (chunked.reads[:2] == 1).all() and (chunked.reads[2:] == 0).all()
+
+        chunked = ChunkedMatrix(matrix, (3, 4))
+        blocks = list(columnar.iter_range_blocks(chunked, index, (1, 10), (0, 10), (2, 3)))
+        assert [(x, y) for values in blocks for x, y in zip(values.pos_x, values.pos_y)] == [
+            (2, 7), (4, 4), (7, 2)]
+        assert (chunked.reads == 1).all()
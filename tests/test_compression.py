@@ -0,0 +1,118 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+from __future__ import print_function
+
+import gzip
+import io
+
+import pytest
+
+from werkzeug.datastructures import Accept
+from werkzeug.http import parse_accept_header
+
+from rest import compression
+from rest.compression import choose_encoding, compress, iter_compress, peek
+
+def test_choose_encoding():
+    """
+    Test that gzip is chosen when offered and nothing otherwise
+    """
+    accept = parse_accept_header('gzip, deflate', Accept)
+    assert choose_encoding(accept) == 'gzip'
+
+    accept = parse_accept_header('identity', Accept)
+    assert choose_encoding(accept) is None
+
+    accept = parse_accept_header('', Accept)
+    assert choose_encoding(accept) is None
+
+def test_gzip_stream():
+    """
+    Test that a streamed body decompresses to the original blocks
+    """
+    blocks = ['chr1\t100\t200\n' * 100, b'chr2\t300\t400\n' * 100]
+    body = b''.join(iter_compress(iter(blocks), 'gzip', 1))
+    with gzip.GzipFile(fileobj=io.BytesIO(body)) as gz_file:
+        assert gz_file.read() == blocks[0].encode('utf-8') + blocks[1]
+
+    data = b'x' * 10000
+    assert gzip.GzipFile(fileobj=io.BytesIO(compress(data, 'gzip'))).read() == data
+
+def test_zstd_stream():
+    """
+    Test zstd compression when zstandard is installed
+    """
+    zstandard = pytest.importorskip('zstandard')
+    assert compression.available_encodings()[0] == 'zstd'
+
+    data = b'chr1\t100\t200\n' * 1000
+    body = b''.join(iter_compress([data[:5000], data[5000:]], 'zstd'))
+    assert zstandard.ZstdDecompressor().decompressobj().decompress(body) == data
+
+def test_peek():
+    """
+    Test that peek stops at the threshold and keeps the rest of the stream
+    """
+    head, rest, complete = peek(iter([b'ab', b'cd', b'ef']), 3)
+    assert head == [b'ab', b'cd']
+    assert not complete
+    assert list(rest) == [b'ef']
+
+    head, rest, complete = peek(iter([b'ab']), 3)
+    assert head == [b'ab']
+    assert complete
+    assert list(rest) == []
+
+def test_coded_etag():
+    """
+    Test that compressed bodies get their own ETag and that clients holding
+    either form are recognised
+    """
+    assert compression.coded_etag('abc', 'gzip') == 'abc-gzip'
+
+    variants = compression.etag_variants('abc')
+    assert variants[0] == 'abc'
+    assert 'abc-gzip' in variants
+
+def test_compressed_endpoint(client, adjacency_app, monkeypatch):
+    """
+    Test that large bodies are compressed with their own ETag and that
+    If-None-Match accepts the ETag of either form
+    """
+    monkeypatch.setitem(adjacency_app.APP.config, 'ADJACENCY_COMPRESSION', True)
+    monkeypatch.setitem(adjacency_app.APP.config, 'ADJACENCY_COMPRESSION_MIN_BYTES', 16)
+    headers = {'Authorization': 'Bearer teststring', 'Accept': 'application/json'}
+    url = '/mug/api/adjacency/details?file_id=synthetic'
+
+    plain = client.get(url, headers=headers)
+    response = client.get(url, headers=dict(headers, **{'Accept-Encoding': 'gzip'}))
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert gzip.GzipFile(fileobj=io.BytesIO(response.get_data())).read() == plain.get_data()
+
+    etag = response.headers['ETag']
+    assert etag != plain.headers['ETag']
+    assert etag.endswith('-gzip"')
+
+    for held in (etag, plain.headers['ETag'], 'W/' + etag):
+        revalidated = client.get(url, headers=dict(
+            headers, **{'Accept-Encoding': 'gzip', 'If-None-Match': held}))
+        assert revalidated.status_code == 304
+
+    changed = client.get(url, headers=dict(headers, **{'If-None-Match': '"other-gzip"'}))
+    assert changed.status_code == 200
@@ -0,0 +1,105 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+from __future__ import print_function
+
+import pytest # pylint: disable=unused-import
+
+from rest.handle_pool import HandlePool
+
+class DummyHandle(object):
+    """
+    Stand in for the adjacency reader that records how it was opened
+    """
+
+    def __init__(self, user_id, file_id, resolution=None):
+        self.key = (user_id, file_id, resolution)
+        self.closed = False
+
+    def close(self):
+        """
+        Mark the handle as closed
+        """
+        self.closed = True
+
+def test_pool_reuse():
+    """
+    Test that a handle is reused for the same user, file and resolution
+    """
+    pool = HandlePool(DummyHandle, max_size=4)
+
+    with pool.acquire('test', 'file_1', 10000) as handle_a:
+        pass
+    with pool.acquire('test', 'file_1', 10000) as handle_b:
+        pass
+    with pool.acquire('test', 'file_1', 20000) as handle_c:
+        pass
+
+    assert handle_a is handle_b
+    assert handle_a is not handle_c
+    assert handle_c.key == ('test', 'file_1', 20000)
+
+    stats = pool.stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 2
+
+def test_pool_eviction():
+    """
+    Test that the least recently used handle is closed once the pool is full
+    """
+    pool = HandlePool(DummyHandle, max_size=2)
+
+    with pool.acquire('test', 'file_1') as handle_1:
+        pass
+    with pool.acquire('test', 'file_2') as handle_2:
+        pass
+    with pool.acquire('test', 'file_1'):
+        pass
+    with pool.acquire('test', 'file_3'):
+        pass
+
+    assert handle_2.closed is True
+    assert handle_1.closed is False
+    assert pool.stats()['evictions'] == 1
+    assert pool.stats()['size'] == 2
+
+def test_pool_idle_timeout():
+    """
+    Test that idle handles are closed once the timeout has passed
+    """
+    pool = HandlePool(DummyHandle, max_size=4, idle_timeout=0)
+
+    with pool.acquire('test', 'file_1') as handle_1:
+        pass
+    with pool.acquire('test', 'file_2'):
+        assert handle_1.closed is True
+
+def test_pool_failed_open():
+    """
+    Test that a handle that fails to open is not kept in the pool
+    """
+    def opener(user_id, file_id):
+        """
+        Opener that always fails
+        """
+        raise IOError(user_id + ':' + file_id)
+
+    pool = HandlePool(opener)
+    with pytest.raises(IOError):
+        with pool.acquire('test', 'missing'):
+            pass
+    assert pool.stats()['size'] == 0
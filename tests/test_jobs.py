@@ -0,0 +1,179 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+from __future__ import print_function
+
+import io
+import time
+
+from concurrent import futures
+
+import numpy as np
+import pytest # pylint: disable=unused-import
+
+h5py = pytest.importorskip('h5py')
+
+from rest import jobs  # pylint: disable=wrong-import-position
+
+CHROMOSOMES = [('chr1', 50), ('chr2', 30)]
+
+def start_job(tmpdir, fmt, max_bytes=None, chromosomes=None):
+    """
+    Run an export in the current process and return its status
+    """
+    src_path = str(tmpdir.join('test.hdf5'))
+    matrix = np.zeros((10, 10), dtype=np.int32)
+    matrix[1, 2] = matrix[2, 1] = 5
+    matrix[2, 7] = matrix[7, 2] = 3
+    matrix[4, 4] = 1
+    with h5py.File(src_path, 'w') as src_file:
+        src_file.create_dataset('10', data=matrix)
+
+    spool_dir = str(tmpdir.mkdir('spool'))
+    job_id = 'job' + fmt
+    jobs.write_status(spool_dir, job_id, {'job_id': job_id, 'format': fmt, 'status': 'queued'})
+    jobs.run_export(
+        spool_dir, job_id, src_path, chromosomes or CHROMOSOMES, 10, fmt, max_bytes=max_bytes)
+    return spool_dir, jobs.read_status(spool_dir, job_id)
+
+def test_export_tsv(tmpdir):
+    """
+    Test that the whole genome is written as TSV
+    """
+    spool_dir, status = start_job(tmpdir, 'tsv')
+    assert status['status'] == 'done'
+    assert status['interaction_count'] == 5
+    with open(spool_dir + '/jobtsv.tsv') as tsv_file:
+        rows = tsv_file.read().splitlines()
+    assert rows[0] == 'chr1\t10\tchr1\t20\t5'
+    assert rows[2] == 'chr1\t20\tchr2\t10\t3'
+
+def test_export_npy(tmpdir):
+    """
+    Test that the .npy header is filled in with the final number of rows
+    """
+    spool_dir, status = start_job(tmpdir, 'npy')
+    assert status['status'] == 'done'
+    values = np.load(spool_dir + '/jobnpy.npy')
+    assert len(values) == 5
+    assert values['value'].tolist() == [5, 5, 3, 1, 3]
+
+def test_export_hdf5(tmpdir):
+    """
+    Test that the pixels of the upper triangle are indexed by row
+    """
+    spool_dir, status = start_job(tmpdir, 'hdf5')
+    assert status['status'] == 'done'
+    with h5py.File(spool_dir + '/jobhdf5.hdf5', 'r') as cool_file:
+        assert cool_file['pixels/bin1_id'][:].tolist() == [1, 2, 4]
+        assert cool_file['pixels/bin2_id'][:].tolist() == [2, 7, 4]
+        offsets = cool_file['indexes/bin1_offset'][:]
+        assert offsets[2] == 1
+        assert offsets[-1] == 3
+
+def test_export_spool_limit(tmpdir):
+    """
+    Test that an export fails and is removed once it exceeds the spool limit
+    """
+    spool_dir, status = start_job(tmpdir, 'tsv', max_bytes=10)
+    assert status['status'] == 'failed'
+    assert sorted(tmpdir.join('spool').listdir()) == [tmpdir.join('spool', 'jobtsv.json')]
+    assert jobs.ExportJobs(spool_dir).status('test', 'jobtsv') is None
+
+def test_export_layout_mismatch(tmpdir):
+    """
+    Test that an export fails when the matrix does not have a bin per
+    resolution of each chromosome
+    """
+    _, status = start_job(tmpdir, 'tsv', chromosomes=CHROMOSOMES + [('chrX', 10)])
+    assert status['status'] == 'failed'
+    assert 'bin per resolution' in status['error']
+
+class HeldPool(object):  # pylint: disable=too-few-public-methods
+    """
+    Executor that holds on to the jobs instead of running them
+    """
+
+    def __init__(self):
+        self.futures = []
+        self.max_bytes = []
+
+    def submit(self, *args):
+        """
+        Record the limit of the job and return a future that is never run
+        """
+        self.max_bytes.append(args[-1])
+        self.futures.append(futures.Future())
+        return self.futures[-1]
+
+def test_spool_reservation(tmpdir, monkeypatch):
+    """
+    Test that each job reserves its share of the spool until it finishes
+    """
+    export_jobs = jobs.ExportJobs(str(tmpdir), max_workers=2, max_spool_bytes=1000)
+    pool = HeldPool()
+    monkeypatch.setattr(export_jobs, '_pool', lambda: pool)
+
+    export_jobs.submit('test', 'test.hdf5', CHROMOSOMES, 10, 'tsv')
+    export_jobs.submit('test', 'test.hdf5', CHROMOSOMES, 10, 'tsv')
+    with pytest.raises(jobs.SpoolFull):
+        export_jobs.submit('test', 'test.hdf5', CHROMOSOMES, 10, 'tsv')
+
+    pool.futures[0].set_result(None)
+    export_jobs.submit('test', 'test.hdf5', CHROMOSOMES, 10, 'tsv')
+    assert pool.max_bytes[:2] == [500, 500] and 0 < pool.max_bytes[2] <= 500
+
+    tmpdir.join('finished.tsv').write('x' * 400)
+    pool.futures[1].set_result(None)
+    with pytest.raises(jobs.SpoolFull):
+        export_jobs.submit('test', 'test.hdf5', CHROMOSOMES, 10, 'tsv')
+
+def test_export_endpoint(client, adjacency_app, tmpdir, monkeypatch):
+    """
+    Test that an export run by a spawned worker can be followed to completion
+    and downloaded, and that malformed requests are refused
+    """
+    export_jobs = jobs.ExportJobs(str(tmpdir.join('spool')), max_workers=1)
+    monkeypatch.setattr(adjacency_app, 'EXPORT_JOBS', export_jobs)
+    headers = {'Authorization': 'Bearer teststring', 'Accept': 'application/json'}
+    url = '/mug/api/adjacency/export'
+    try:
+        response = client.post(
+            url, headers=headers, json={'file_id': 'synthetic', 'res': 100000, 'format': 'npy'})
+        assert response.status_code == 202
+
+        status = response.get_json()
+        deadline = time.time() + 60
+        while status['status'] not in ('done', 'failed') and time.time() < deadline:
+            time.sleep(0.1)
+            status = client.get(status['_links']['_self'], headers=headers).get_json()
+        assert status['status'] == 'done'
+
+        download = client.get(status['_links']['_download'], headers=headers)
+        assert download.status_code == 200
+        assert len(np.load(io.BytesIO(download.get_data()))) == status['interaction_count']
+
+        for body in (
+                {'file_id': 'synthetic', 'res': [1], 'format': 'npy'},
+                {'file_id': 'synthetic', 'res': 1e400, 'format': 'npy'},
+                {'file_id': 'synthetic', 'res': 12345, 'format': 'npy'},
+                {'file_id': 'synthetic', 'res': 100000, 'format': 'xls'},
+                [1, 2]):
+            result = client.post(url, headers=headers, json=body).get_json()
+            assert result['status_code'] in (400, 404)
+    finally:
+        export_jobs.shutdown()
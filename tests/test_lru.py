@@ -0,0 +1,61 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+from __future__ import print_function
+
+import pytest # pylint: disable=unused-import
+
+from rest.lru import LRUCache
+
+def test_lru_size_budget():
+    """
+    Test that the least recently used values are evicted to stay in budget
+    """
+    cache = LRUCache(10)
+    cache.put('a', 'A', 4)
+    cache.put('b', 'B', 4)
+    assert cache.get('a') == 'A'
+    cache.put('c', 'C', 4)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 'A'
+    assert cache.get('c') == 'C'
+
+    stats = cache.stats()
+    assert stats['bytes'] == 8
+    assert stats['evictions'] == 1
+    assert stats['hits'] == 3
+    assert stats['misses'] == 1
+    assert stats['hit_rate'] == 0.75
+
+def test_lru_oversized():
+    """
+    Test that values larger than the budget are not stored
+    """
+    cache = LRUCache(10)
+    cache.put('a', 'A', 11)
+    assert cache.get('a') is None
+    assert cache.stats()['bytes'] == 0
+
+def test_lru_ttl():
+    """
+    Test that entries expire after their time to live
+    """
+    cache = LRUCache(10, ttl=-1)
+    cache.put('a', 'A', 1)
+    assert cache.get('a') is None
+    assert cache.stats()['bytes'] == 0
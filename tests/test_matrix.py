@@ -0,0 +1,150 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+from __future__ import print_function
+
+import base64
+import io
+
+import numpy as np
+import pytest # pylint: disable=unused-import
+
+from rest.chrom_index import ChromosomeIndex
+from rest.columnar import read_range
+from rest import matrix as matrix_module
+from rest.matrix import matrix_from_columns, read_matrix, read_points
+
+def get_matrix():
+    """
+    Genome wide matrix of 8 bins
+    """
+    return np.arange(64, dtype=np.int32).reshape((8, 8)) % 5
+
+def test_read_matrix():
+    """
+    Test that a block is read with its bin offsets
+    """
+    matrix = get_matrix()
+    block = read_matrix(matrix, (2, 4), (5, 8))
+    assert block.shape == (2, 3)
+    assert block.row_offset == 2
+    assert block.col_offset == 5
+
+    block_dict = block.to_dict()
+    data = np.frombuffer(
+        base64.b64decode(block_dict['data']), dtype=block_dict['dtype'])
+    assert data.reshape(block_dict['shape']).tolist() == matrix[2:4, 5:8].tolist()
+
+    assert np.load(io.BytesIO(block.to_npy())).tolist() == matrix[2:4, 5:8].tolist()
+
+def test_matrix_from_columns():
+    """
+    Test that a block built from interactions matches the direct read
+    """
+    matrix = get_matrix()
+    index = ChromosomeIndex([('chr1', 75)], 10)
+    values = read_range(matrix, index, 'chr1', 20, 40, 'chr1', 50, 80)
+    block = matrix_from_columns(values, (2, 4), (5, 8))
+    assert block.data.tolist() == matrix[2:4, 5:8].tolist()
+
+def test_read_points(monkeypatch):
+    """
+    Test that batches of bin pairs are returned in the requested order
+    """
+    matrix = np.arange(400, dtype=np.int32).reshape((20, 20))
+    pos_x = np.array([19, 0, 5, 5, 0, 12])
+    pos_y = np.array([0, 19, 5, 3, 19, 7])
+    expected = matrix[pos_x, pos_y].tolist()
+
+    assert read_points(matrix, pos_x, pos_y).tolist() == expected
+
+    monkeypatch.setattr(matrix_module, 'READ_BLOCK_CELLS', 1)
+    assert read_points(matrix, pos_x, pos_y).tolist() == expected
+
+def test_read_points_hdf5(tmpdir):
+    """
+    Test that batches of bin pairs can be read from a chunked HDF5 dataset
+    """
+    h5py = pytest.importorskip('h5py')
+    matrix = np.arange(400, dtype=np.int32).reshape((20, 20))
+    pos_x = np.array([19, 0, 5, 5, 0, 12])
+    pos_y = np.array([0, 19, 5, 3, 19, 7])
+
+    with h5py.File(str(tmpdir.join('test.hdf5')), 'w') as h5_file:
+        dset = h5_file.create_dataset('10', data=matrix, chunks=(4, 4))
+        assert read_points(dset, pos_x, pos_y).tolist() == matrix[pos_x, pos_y].tolist()
+
+def test_get_value_post(client, synthetic_path):
+    """
+    Test batched values from JSON and .npy bodies and that malformed bodies,
+    including numbers too large for an integer, are refused
+    """
+    h5py = pytest.importorskip('h5py')
+    with h5py.File(synthetic_path, 'r') as h5_file:
+        expected = h5_file['10000'][:]
+
+    url = '/mug/api/adjacency/getValue'
+    headers = {'Authorization': 'Bearer teststring', 'Accept': 'application/json'}
+    body = {'file_id': 'synthetic', 'res': 10000, 'pos_x': [1, 50, 120], 'pos_y': [2, 60, 3]}
+    values = client.post(url, headers=headers, json=body).get_json()['values']
+    assert [v['value'] for v in values] == [
+        int(expected[1, 2]), int(expected[50, 60]), int(expected[120, 3])]
+
+    npy = io.BytesIO()
+    np.save(npy, np.array([[1, 2], [50, 60]], dtype=np.int64))
+    values = client.post(
+        url + '?file_id=synthetic&res=10000', headers=headers,
+        data=npy.getvalue(), content_type='application/x-npy').get_json()['values']
+    assert [v['value'] for v in values] == [int(expected[1, 2]), int(expected[50, 60])]
+
+    result = client.post(url, headers=headers, json=[1, 2]).get_json()
+    assert result['error'] == 'MissingParameters'
+
+    for data in (b'', b'garbage', npy.getvalue()[:20]):
+        result = client.post(
+            url + '?file_id=synthetic&res=10000', headers=headers,
+            data=data, content_type='application/x-npy').get_json()
+        assert result['error'] == 'IncorrectParameterType'
+
+    for key, value in (('res', 1e400), ('pos_x', [10 ** 30, 1, 2]), ('pos_y', [1, 2, 'a'])):
+        result = client.post(url, headers=headers, json=dict(body, **{key: value})).get_json()
+        assert result['error'] == 'IncorrectParameterType'
+
+    result = client.post(url, headers=headers, json=dict(body, res=12345)).get_json()
+    assert result['error'] == 'Resolution Not Available'
+
+def test_get_matrix_endpoint(client, synthetic_path):
+    """
+    Test that the dense block returned by getMatrix matches the matrix in the
+    file
+    """
+    h5py = pytest.importorskip('h5py')
+    result = client.get(
+        '/mug/api/adjacency/getMatrix?file_id=synthetic&chr=chr1&start=20000&end=80000'
+        '&res=10000&limit_chr=chr2&limit_start=0&limit_end=50000',
+        headers={'Authorization': 'Bearer teststring', 'Accept': 'application/json'}).get_json()
+    block = result['matrix']
+    values = np.frombuffer(
+        base64.b64decode(block['data']), dtype=block['dtype']).reshape(block['shape'])
+
+    with h5py.File(synthetic_path, 'r') as h5_file:
+        expected = h5_file['10000'][
+            block['row_offset']:block['row_offset'] + block['shape'][0],
+            block['col_offset']:block['col_offset'] + block['shape'][1]]
+    assert block['row_offset'] == 2
+    assert block['col_offset'] == 101
+    assert (values == expected).all()
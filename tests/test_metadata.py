@@ -0,0 +1,128 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+from __future__ import print_function
+
+import os
+import tempfile
+
+import pytest # pylint: disable=unused-import
+
+from rest.metadata import DatasetMetadata, MetadataCache
+
+DETAILS = {
+    'chromosomes': [['chr1', 250000], ['chr2', 125000]],
+    'resolutions': [10000, 100000]
+}
+
+def test_metadata_index():
+    """
+    Test that the bin index is built once for each resolution
+    """
+    meta = DatasetMetadata(DETAILS['chromosomes'], DETAILS['resolutions'])
+    index = meta.index(10000)
+    assert index is meta.index(10000)
+    assert index.names == ['chr1', 'chr2']
+    assert index.first_bins.tolist() == [0, 26]
+    assert index.bin_count == 39
+
+def test_metadata_cache():
+    """
+    Test that the details are only loaded again once the file changes
+    """
+    loads = []
+    def loader():
+        """
+        Count the number of times that the details are loaded
+        """
+        loads.append(1)
+        return DETAILS
+
+    tmp_fd, tmp_path = tempfile.mkstemp()
+    os.close(tmp_fd)
+    try:
+        cache = MetadataCache(lambda user_id, file_id: tmp_path)
+        meta_a = cache.get('test', 'file_1', loader)
+        meta_b = cache.get('test', 'file_1', loader)
+        assert meta_a is meta_b
+        assert len(loads) == 1
+        assert meta_a.last_modified is not None
+
+        with open(tmp_path, 'w') as tmp_handle:
+            tmp_handle.write('modified')
+        meta_c = cache.get('test', 'file_1', loader)
+        assert len(loads) == 2
+        assert meta_c.etag != meta_a.etag
+    finally:
+        os.unlink(tmp_path)
+
+def test_metadata_cache_unknown_path():
+    """
+    Test that files that cannot be located are still cached
+    """
+    cache = MetadataCache(lambda user_id, file_id: None)
+    cache.get('test', 'file_1', lambda: DETAILS)
+    cache.get('test', 'file_1', lambda: DETAILS)
+    assert cache.stats() == {'size': 1, 'hits': 1, 'misses': 1}
+
+def test_metadata_cache_locations():
+    """
+    Test that locations are bounded, expire and that failed look ups are
+    retried
+    """
+    lookups = []
+    def locator(user_id, file_id):
+        """
+        Count the look ups, file_0 cannot be located
+        """
+        lookups.append(file_id)
+        return None if file_id == 'file_0' else '/data/' + file_id
+
+    cache = MetadataCache(locator, location_size=2)
+    assert cache.file_identity('test', 'file_0') == (('test', 'file_0'), None)
+    assert cache.file_identity('test', 'file_0') == (('test', 'file_0'), None)
+    assert lookups.count('file_0') == 2
+
+    for file_id in ('file_1', 'file_2', 'file_1', 'file_3', 'file_1'):
+        assert cache.file_identity('test', file_id)[0] == '/data/' + file_id
+    assert lookups.count('file_1') == 1
+    assert lookups.count('file_2') == 1
+
+    cache.file_identity('test', 'file_2')
+    assert lookups.count('file_2') == 2
+
+    cache = MetadataCache(locator, location_ttl=-1)
+    cache.file_identity('test', 'file_1')
+    cache.file_identity('test', 'file_1')
+    assert lookups.count('file_1') == 3
+
+def test_details_endpoint(client):
+    """
+    Test that the details of a file are returned and can be revalidated with
+    their ETag
+    """
+    headers = {'Authorization': 'Bearer teststring', 'Accept': 'application/json'}
+    url = '/mug/api/adjacency/details?file_id=synthetic'
+    response = client.get(url, headers=headers)
+    details = response.get_json()
+    assert details['resolutions'] == [10000, 100000]
+    assert details['chromosomes'] == [
+        {'chromosome': 'chr1', 'length': 1000000}, {'chromosome': 'chr2', 'length': 500000}]
+
+    revalidated = client.get(url, headers=dict(
+        headers, **{'If-None-Match': response.headers['ETag']}))
+    assert revalidated.status_code == 304
@@ -0,0 +1,97 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+from __future__ import print_function
+
+import time
+
+from rest.metrics import Gauge, Histogram, Registry, RequestTimer, timed_blocks
+
+def test_histogram():
+    """
+    Test that observations are counted in cumulative buckets
+    """
+    histogram = Histogram('latency_seconds', 'Latency', ('endpoint',), buckets=(0.1, 1.0))
+    histogram.observe(0.05, 'values')
+    histogram.observe(0.5, 'values')
+    histogram.observe(5.0, 'values')
+    histogram.observe(0.1, 'tile')
+
+    samples = histogram.samples()
+    assert samples[('values',)] == ([1, 2, 3], 3, 5.55)
+    assert samples[('tile',)][0] == [1, 1, 1]
+
+    lines = histogram.render()
+    assert '# TYPE latency_seconds histogram' in lines
+    assert 'latency_seconds_bucket{endpoint="values",le="1.0"} 2' in lines
+    assert 'latency_seconds_bucket{endpoint="values",le="+Inf"} 3' in lines
+    assert 'latency_seconds_count{endpoint="tile"} 1' in lines
+
+def test_gauge_registry():
+    """
+    Test that gauges are read when the metrics are rendered
+    """
+    sizes = {'chunks': 10}
+    registry = Registry()
+    registry.register(Gauge(
+        'cache_bytes', 'Cache size',
+        lambda: dict(((name,), size) for name, size in sizes.items()), ('cache',)))
+    registry.register(Gauge('in_flight', 'Reads', lambda: 2))
+
+    text = registry.render()
+    assert 'cache_bytes{cache="chunks"} 10.0\n' in text
+    assert 'in_flight 2.0\n' in text
+
+    sizes['chunks'] = 20
+    assert 'cache_bytes{cache="chunks"} 20.0\n' in registry.render()
+
+def test_request_timer():
+    """
+    Test that nested spans are only counted for the inner phase
+    """
+    timer = RequestTimer()
+    with timer.span('read'):
+        with timer.span('open'):
+            time.sleep(0.02)
+        time.sleep(0.01)
+
+    assert timer.phases['open'] >= 0.02
+    assert timer.phases['read'] >= 0.01
+    assert timer.phases['read'] + timer.phases['open'] <= timer.elapsed()
+
+    blocks = list(timed_blocks(iter([b'a', b'b']), timer, 'stream'))
+    assert blocks == [b'a', b'b']
+    assert 'stream' in timer.phases
+
+def test_metrics_endpoint(client, adjacency_app, monkeypatch):
+    """
+    Test that requests are timed and that only validated resolutions are used
+    as labels
+    """
+    monkeypatch.setitem(adjacency_app.APP.config, 'ADJACENCY_METRICS', True)
+    headers = {'Authorization': 'Bearer teststring', 'Accept': 'application/json'}
+    url = '/mug/api/adjacency/getValue?file_id=synthetic&pos_x=1&pos_y=2&res='
+    for resolution in ('10000', '54321'):
+        response = client.get(url + resolution, headers=headers)
+        response.get_data()
+        response.close()
+
+    response = client.get('/mug/api/adjacency/metrics', headers=headers)
+    assert response.status_code == 200
+    text = response.get_data(as_text=True)
+    assert 'adjacency_request_seconds_count{endpoint="value",resolution="10000"' in text
+    assert 'resolution="54321"' not in text
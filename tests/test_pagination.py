@@ -0,0 +1,140 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+from __future__ import print_function
+
+import numpy as np
+import pytest # pylint: disable=unused-import
+
+from rest import columnar
+from rest.chrom_index import ChromosomeIndex
+from rest.columnar import page_slice, range_bins, read_range, read_range_page
+from rest.pagination import InvalidCursor, decode_cursor, encode_cursor
+from rest.pagination import partition_cursors, query_fingerprint
+
+def get_matrix():
+    """
+    Random sparse matrix for 2 chromosomes of 10 bins
+    """
+    index = ChromosomeIndex([('chr1', 95), ('chr2', 95)], 10)
+    random = np.random.RandomState(1)
+    matrix = random.randint(0, 3, size=(20, 20)) * (random.rand(20, 20) > 0.5)
+    return matrix, index
+
+def test_cursor_round_trip():
+    """
+    Test that cursors decode to the position they were built from
+    """
+    fingerprint = query_fingerprint('test', 10, 'chr1', 0, 100)
+    cursor = encode_cursor(fingerprint, 4, 7, 10)
+    assert decode_cursor(cursor, fingerprint) == (4, 7, 10)
+
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor, query_fingerprint('test', 10, 'chr1', 0, 200))
+    with pytest.raises(InvalidCursor):
+        decode_cursor('not a cursor', fingerprint)
+
+def test_pages(monkeypatch):
+    """
+    Test that paging through a region returns every interaction once
+    """
+    monkeypatch.setattr(columnar, 'READ_BLOCK_CELLS', 30)
+    matrix, index = get_matrix()
+    expected = read_range(matrix, index, 'chr1', 0, 100).records()
+
+    x_bins, y_bins = range_bins(index, 'chr1', 0, 100)
+    pages = []
+    position = None
+    while True:
+        values, position = read_range_page(matrix, index, x_bins, y_bins, position, 7)
+        assert len(values) <= 7
+        pages.extend(values.records())
+        if position is None:
+            break
+    assert pages == expected
+
+def test_partitions():
+    """
+    Test that partition cursors cover the rows without overlap
+    """
+    matrix, index = get_matrix()
+    expected = read_range(matrix, index, 'chr1', 0, 100).records()
+    fingerprint = query_fingerprint('test')
+
+    x_bins, y_bins = range_bins(index, 'chr1', 0, 100)
+    pages = []
+    for cursor in partition_cursors(fingerprint, x_bins, y_bins[0], 3):
+        row, column, end_row = decode_cursor(cursor, fingerprint)
+        values, position = read_range_page(
+            matrix, index, (x_bins[0], end_row), y_bins, (row, column), 1000)
+        assert position is None
+        pages.extend(values.records())
+    assert pages == expected
+
+def test_page_slice():
+    """
+    Test paging through interactions that are already in memory
+    """
+    matrix, index = get_matrix()
+    values = read_range(matrix, index, 'chr1', 0, 100)
+    page, position = page_slice(values, 5)
+    assert page.records() == values.records()[:5]
+
+    page, _ = page_slice(values, 5, position)
+    assert page.records() == values.records()[5:10]
+
+def test_paging_endpoint(client):
+    """
+    Test that paging through getInteractions, directly or over partitions,
+    returns the same interactions as a single request and that page sizes
+    and partition counts below 1 are refused
+    """
+    headers = {'Authorization': 'Bearer teststring', 'Accept': 'application/json'}
+    url = (
+        '/mug/api/adjacency/getInteractions?file_id=synthetic'
+        '&chr=chr1&start=0&end=300000&res=10000')
+    expected = client.get(url, headers=headers).get_json()['values']
+    assert len(expected) > 10
+
+    def follow(next_url):
+        """
+        All of the interactions from a page and the pages after it
+        """
+        values = []
+        while next_url is not None:
+            page = client.get(next_url, headers=headers).get_json()
+            assert 0 < len(page['values']) <= 7 or page['cursor'] is None
+            values.extend(page['values'])
+            next_url = page['_links'].get('_next')
+        return values
+
+    assert follow(url + '&page_size=7') == expected
+
+    plan = client.get(url + '&page_size=7&partitions=3', headers=headers).get_json()
+    assert len(plan['cursors']) == 3
+    values = []
+    for cursor in plan['cursors']:
+        values.extend(follow(url + '&page_size=7&cursor=' + cursor))
+    assert values == expected
+
+    for args in ('&page_size=0', '&page_size=-1', '&partitions=0', '&partitions=-2',
+                 '&page_size=abc'):
+        result = client.get(url + args, headers=headers).get_json()
+        assert result['error'] == 'IncorrectParameterType'
+
+    result = client.get(url + '&page_size=7&cursor=garbage', headers=headers).get_json()
+    assert result['error'] == 'InvalidCursor'
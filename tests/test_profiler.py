@@ -0,0 +1,83 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+from __future__ import print_function
+
+import json
+import os
+import sys
+import time
+
+from rest.profiler import Profile, ProfileStore, SamplingProfiler, collapse
+
+def slow_function():
+    """
+    Keep the thread busy so that it is sampled
+    """
+    finish = time.time() + 0.1
+    while time.time() < finish:
+        pass
+
+def test_collapse():
+    """
+    Test that stacks are collapsed from the root to the current frame
+    """
+    stack = collapse(sys._getframe())  # pylint: disable=protected-access
+    assert stack.split(';')[-1].startswith('test_collapse (test_profiler.py:')
+
+def test_sampling_profiler():
+    """
+    Test that the profiled thread is sampled until it is stopped
+    """
+    profiler = SamplingProfiler(interval=0.001)
+    profile = profiler.start()
+    slow_function()
+    profiler.stop(profile)
+
+    assert profile.samples > 0
+    assert any('slow_function' in stack for stack in profile.stacks)
+
+    samples = profile.samples
+    time.sleep(0.02)
+    assert profile.samples == samples
+
+    line = profile.collapsed().splitlines()[0]
+    assert int(line.rsplit(' ', 1)[1]) > 0
+
+def test_profile_store(tmpdir):
+    """
+    Test that profiles are written with their details and the oldest are
+    removed
+    """
+    store = ProfileStore(str(tmpdir), max_files=2)
+    paths = []
+    for count in range(3):
+        profile = Profile(0)
+        profile.stacks['main;read'] = count + 1
+        paths.append(store.write(profile, {'args': {'res': ['10000']}}))
+        os.utime(paths[-1], (count, count))
+        os.utime(paths[-1][:-len('.folded')] + '.json', (count, count))
+
+    assert not os.path.isfile(paths[0])
+    assert os.path.isfile(paths[2])
+    with open(paths[2]) as stacks_file:
+        assert stacks_file.read() == 'main;read 3\n'
+    with open(paths[2][:-len('.folded')] + '.json') as details_file:
+        details = json.load(details_file)
+    assert details['args'] == {'res': ['10000']}
+    assert details['samples'] == 3
+    assert len(store.profiles()) == 2
@@ -0,0 +1,64 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+from __future__ import print_function
+
+import numpy as np
+import pytest # pylint: disable=unused-import
+
+h5py = pytest.importorskip('h5py')
+
+from rest import pyramid  # pylint: disable=wrong-import-position
+from rest.metadata import DatasetMetadata  # pylint: disable=wrong-import-position
+
+CHROMOSOMES = [('chr1', 95), ('chr2', 42)]
+
+def test_build_pyramid(tmpdir, monkeypatch):
+    """
+    Test that each level sums the values of the finer level per chromosome
+    """
+    monkeypatch.setattr(pyramid, 'BUILD_BLOCK_CELLS', 50)
+    src_path = str(tmpdir.join('test.hdf5'))
+    matrix = np.random.RandomState(0).randint(0, 5, size=(15, 15)).astype(np.int32)
+    with h5py.File(src_path, 'w') as src_file:
+        src_file.create_dataset('10', data=matrix)
+        built = pyramid.build_pyramid(
+            src_file, pyramid.pyramid_path(src_path), CHROMOSOMES, 10, levels=2)
+    assert built == [20, 40]
+
+    # chr1 has bins 0-9 and chr2 bins 10-14 at 10, at 20 chr1 has 5 bins
+    # (0-4) and chr2 has 3 bins (5-7)
+    groups = [[0, 1], [2, 3], [4, 5], [6, 7], [8, 9], [10, 11], [12, 13], [14]]
+    expected = np.array([
+        [matrix[np.ix_(a, b)].sum() for b in groups] for a in groups])
+
+    with h5py.File(pyramid.pyramid_path(src_path), 'r') as pyramid_file:
+        assert pyramid.pyramid_levels(pyramid_file, 10) == [20, 40]
+        assert pyramid_file['20'][:].tolist() == expected.tolist()
+        assert pyramid_file['40'][:].sum() == matrix.sum()
+
+def test_plan_level():
+    """
+    Test that the finest level within the budget is chosen
+    """
+    meta = DatasetMetadata(CHROMOSOMES, [10])
+    plan = lambda budget: pyramid.plan_level(
+        meta, [10, 20, 40], budget, 'chr1', 0, 80, 'chr1', 0, 80)
+    assert plan(64) == 10
+    assert plan(16) == 20
+    assert plan(4) == 40
+    assert plan(1) == 40
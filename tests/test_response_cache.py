@@ -0,0 +1,135 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+from __future__ import print_function
+
+import json
+import os
+import time
+
+import pytest # pylint: disable=unused-import
+
+from rest.response_cache import CachedResponse, ResponseCache
+
+HEADERS = [('Content-Type', 'application/json')]
+
+def test_response_cache_disk(tmpdir):
+    """
+    Test that responses evicted from memory are served from the disk tier
+    """
+    cache = ResponseCache(10, disk_dir=str(tmpdir.join('cache')))
+    cache.put(('a',), CachedResponse(b'0123456789', HEADERS))
+    cache.put(('b',), CachedResponse(b'abcdefghij', HEADERS))
+    assert cache.memory.stats()['entries'] == 1
+
+    entry = cache.get(('a',))
+    assert entry.body == b'0123456789'
+    assert entry.headers == HEADERS
+    assert cache.get(('c',)) is None
+
+    stats = cache.stats()
+    assert stats['disk']['entries'] == 2
+    assert stats['disk']['hits'] == 1
+    assert stats['disk']['misses'] == 1
+    assert stats['memory']['misses'] == 2
+
+    # A new process only has the disk tier
+    assert ResponseCache(10, disk_dir=str(tmpdir.join('cache'))).get(('b',)).body == b'abcdefghij'
+
+def test_response_cache_disk_limits(tmpdir):
+    """
+    Test that the disk tier is kept within its budget and expires entries
+    """
+    cache = ResponseCache(100, ttl=60, disk_dir=str(tmpdir.join('cache')), disk_max_bytes=400)
+    for key in range(5):
+        cache.put((key,), CachedResponse(b'x' * 100, HEADERS))
+    assert cache.stats()['disk']['bytes'] <= 400
+
+    cache.memory.clear()
+    cache.put(('old',), CachedResponse(b'old', HEADERS, created=time.time() - 120))
+    cache.memory.clear()
+    assert cache.get(('old',)) is None
+    assert cache.get((4,)).body == b'x' * 100
+
+def test_response_cache_disk_format(tmpdir):
+    """
+    Test that the disk tier holds the headers as JSON and the body as it is,
+    and that damaged entries are treated as misses
+    """
+    cache_dir = tmpdir.join('cache')
+    cache = ResponseCache(100, disk_dir=str(cache_dir))
+    cache.put(('a',), CachedResponse(b'{"values": []}\n', HEADERS, created=1.0))
+    cache.put(('b',), CachedResponse(b'', HEADERS))
+
+    entry_file = cache_dir.join(ResponseCache.digest(('a',)) + '.resp')
+    header, body = entry_file.read_binary().split(b'\n', 1)
+    assert json.loads(header.decode('utf-8')) == {
+        'headers': [['Content-Type', 'application/json']], 'created': 1.0}
+    assert body == b'{"values": []}\n'
+
+    cache.memory.clear()
+    assert cache.get(('a',)).body == b'{"values": []}\n'
+    assert cache.get(('b',)).headers == HEADERS
+
+    cache.memory.clear()
+    entry_file.write_binary(b'\x80\x04garbage')
+    assert cache.get(('a',)) is None
+
+def test_response_cache_disk_errors(tmpdir, monkeypatch):
+    """
+    Test that entries that cannot be written to disk are only kept in memory
+    and that the disk tier is not listed on every write
+    """
+    tmpdir.join('file').write('')
+    cache = ResponseCache(100, disk_dir=str(tmpdir.join('file', 'cache')), disk_max_bytes=400)
+    cache.put(('a',), CachedResponse(b'abc', HEADERS))
+    assert cache.get(('a',)).body == b'abc'
+
+    listed = []
+    listdir = os.listdir
+    monkeypatch.setattr(os, 'listdir', lambda path: listed.append(path) or listdir(path))
+    cache = ResponseCache(100, disk_dir=str(tmpdir.join('cache')), disk_max_bytes=4000)
+    for key in range(10):
+        cache.put((key,), CachedResponse(b'x' * 10, HEADERS))
+    assert len(listed) == 1
+
+    for key in range(10, 40):
+        cache.put((key,), CachedResponse(b'x' * 100, HEADERS))
+    assert 1 < len(listed) < 30
+    assert cache.stats()['disk']['bytes'] <= 4000
+
+def test_response_cache_endpoint(client, adjacency_app, monkeypatch):
+    """
+    Test that repeated queries are served from the response cache and that
+    error messages are not cached
+    """
+    monkeypatch.setattr(adjacency_app, 'RESPONSE_CACHE', ResponseCache(1 << 20))
+    headers = {'Authorization': 'Bearer teststring', 'Accept': 'application/json'}
+    url = (
+        '/mug/api/adjacency/getInteractions?file_id=synthetic'
+        '&chr=chr1&start=0&end=300000&res=')
+
+    first = client.get(url + '10000', headers=headers)
+    second = client.get(url + '10000', headers=headers)
+    assert 'X-Adjacency-Cache' not in first.headers
+    assert second.headers['X-Adjacency-Cache'] == 'hit'
+    assert second.get_data() == first.get_data()
+
+    for _ in range(2):
+        response = client.get(url + '12345', headers=headers)
+        assert 'X-Adjacency-Cache' not in response.headers
+    assert adjacency_app.RESPONSE_CACHE.stats()['memory']['entries'] == 1
@@ -0,0 +1,164 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+from __future__ import print_function
+
+import io
+import json
+
+import numpy as np
+import pytest # pylint: disable=unused-import
+
+from rest.columnar import InteractionColumns
+from rest.serializers import interaction_dtype, iter_arrow, iter_npy, iter_tsv, iter_values_json
+from rest.serializers import values_json
+
+VALUES = [
+    {'chrA': 'chr1', 'startA': 100000, 'chrB': 'chr1', 'startB': 110000, 'value': 3},
+    {'chrA': 'chr1', 'startA': 100000, 'chrB': 'chr2', 'startB': 20000, 'value': 1},
+    {'chrA': 'chr1', 'startA': 110000, 'chrB': 'chr2', 'startB': 0, 'value': 7}
+]
+
+def test_tsv_blocks():
+    """
+    Test that the TSV rows are yielded in blocks of the requested size
+    """
+    blocks = list(iter_tsv(VALUES, block_size=2))
+    assert len(blocks) == 2
+    assert blocks[0].count('\n') == 2
+    assert blocks[1] == 'chr1\t110000\tchr2\t0\t7\n'
+
+def test_tsv_empty():
+    """
+    Test that an empty result produces an empty body
+    """
+    assert ''.join(iter_tsv([])) == ''
+
+def test_tsv_columns():
+    """
+    Test that columns produce the same TSV as the list of interactions
+    """
+    values = InteractionColumns.from_records(
+        [dict(v, pos_x=0, pos_y=0) for v in VALUES])
+    assert ''.join(iter_tsv(values, block_size=2)) == ''.join(iter_tsv(VALUES))
+
+def test_npy():
+    """
+    Test that the .npy body can be loaded by NumPy
+    """
+    values = InteractionColumns.from_records(
+        [dict(v, pos_x=0, pos_y=0) for v in VALUES])
+    body = b''.join(iter_npy(values, block_size=2))
+    array = np.load(io.BytesIO(body))
+    assert array['startB'].tolist() == [110000, 20000, 0]
+    assert [values.chromosomes[c] for c in array['chrB']] == ['chr1', 'chr2', 'chr2']
+
+def test_npy_chromosome_codes():
+    """
+    Test that the chromosome codes are widened for tables that do not fit in
+    16 bits
+    """
+    values = InteractionColumns.from_records(
+        [dict(v, pos_x=0, pos_y=0) for v in VALUES])
+    assert interaction_dtype(values)['chrA'] == np.dtype('<u2')
+
+    names = ['scaffold' + str(i) for i in range(70000)]
+    values = InteractionColumns(
+        names, [69999, 1], [0, 10], [65536, 2], [20, 30], np.array([4, 5]), [0, 1], [2, 3])
+    array = np.load(io.BytesIO(b''.join(iter_npy(values, block_size=1))))
+    assert array['chrA'].dtype == np.dtype('<u4')
+    assert [names[c] for c in array['chrB']] == ['scaffold65536', 'scaffold2']
+
+def test_arrow():
+    """
+    Test that the Arrow stream can be read back by pyarrow
+    """
+    pyarrow = pytest.importorskip('pyarrow')
+    values = InteractionColumns.from_records(
+        [dict(v, pos_x=0, pos_y=0) for v in VALUES])
+    body = b''.join(iter_arrow(values, block_size=2, metadata={'resolution': '10000'}))
+    table = pyarrow.ipc.open_stream(body).read_all()
+    assert table.num_rows == 3
+    assert table.column('chrB').to_pylist() == ['chr1', 'chr2', 'chr2']
+    assert table.schema.metadata[b'resolution'] == b'10000'
+
+def test_values_json():
+    """
+    Test that the JSON for a set of columns is only encoded once for each set
+    of links
+    """
+    values = InteractionColumns.from_records([
+        dict(value, pos_x=i, pos_y=i + 1) for i, value in enumerate(VALUES)])
+    encoded = values_json(values)
+    assert json.loads(encoded) == values.records()
+    assert values_json(values) is encoded
+
+    linked = values.with_links('getValue?file_id=test&res=10')
+    assert values.link_base is None
+    assert '_links' in json.loads(values_json(linked))[0]
+    assert len(values.encoded) == 2
+
+def test_values_json_columnar():
+    """
+    Test that the interactions encoded straight from the columns match the
+    records, including across blocks and for the fallback encodings
+    """
+    values = InteractionColumns.from_records([
+        dict(value, pos_x=i * 1000, pos_y=i) for i, value in enumerate(VALUES)])
+    values.chromosomes[1] = 'chr"2'
+    expected = values.records()
+    for accelerated in (True, False):
+        body = b''.join(iter_values_json(values, block_size=2, accelerated=accelerated))
+        assert json.loads(body) == expected
+
+    values.value = values.value.astype(np.float64) / 2
+    assert json.loads(b''.join(iter_values_json(values, block_size=2))) == values.records()
+    assert json.loads(b''.join(iter_values_json(values.take(values.value > 10)))) == []
+
+def test_npy_response(client):
+    """
+    Test the .npy representation of getInteractions through the app, and the
+    errors for bad parameters and missing authorisation
+    """
+    url = (
+        '/mug/api/adjacency/getInteractions?file_id=synthetic'
+        '&chr=chr1&start=0&end=300000&limit_chr=chr2&res=10000')
+    headers = {'Authorization': 'Bearer teststring'}
+    expected = client.get(url, headers=dict(headers, Accept='application/json')).get_json()
+    assert len(expected['values']) > 0
+
+    response = client.get(url, headers=dict(headers, Accept='application/x-npy'))
+    assert response.status_code == 200
+    array = np.load(io.BytesIO(response.get_data()), allow_pickle=False)
+    chromosomes = json.loads(response.headers['X-Adjacency-Chromosomes'])
+    assert [
+        {'chrA': chromosomes[r['chrA']], 'startA': int(r['startA']),
+         'chrB': chromosomes[r['chrB']], 'startB': int(r['startB']), 'value': int(r['value'])}
+        for r in array
+    ] == [
+        {k: v[k] for k in ('chrA', 'startA', 'chrB', 'startB', 'value')}
+        for v in expected['values']
+    ]
+
+    for res, error in (('12345', 'Resolution Not Available'), ('abc', 'IncorrectParameterType')):
+        result = client.get(
+            url.replace('res=10000', 'res=' + res),
+            headers=dict(headers, Accept='application/json')).get_json()
+        assert result['error'] == error
+
+    result = client.get(url, headers={'Accept': 'application/json'}).get_json()
+    assert result['error'] == 'Forbidden'
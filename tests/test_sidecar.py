@@ -0,0 +1,73 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+from __future__ import print_function
+
+import os
+
+import numpy as np
+import pytest # pylint: disable=unused-import
+
+h5py = pytest.importorskip('h5py')
+
+from rest import sidecar  # pylint: disable=wrong-import-position
+
+def test_mapped_matrix(tmpdir, monkeypatch):
+    """
+    Test that the sidecar holds the matrix and is only used while it is newer
+    than the adjacency file
+    """
+    monkeypatch.setattr(sidecar, 'EXPORT_BLOCK_CELLS', 20)
+    src_path = str(tmpdir.join('test.hdf5'))
+    matrix = np.arange(100, dtype=np.int32).reshape((10, 10))
+    with h5py.File(src_path, 'w') as src_file:
+        src_file.create_dataset('10', data=matrix)
+        map_path = sidecar.export_sidecar(src_file, src_path, 10)
+    os.utime(src_path, (0, 0))
+
+    maps = sidecar.MappedMatrices()
+    mapped = maps.get(src_path, 10)
+    assert isinstance(mapped, np.memmap)
+    assert not mapped.flags.writeable
+    assert mapped[2:4, 3:5].tolist() == matrix[2:4, 3:5].tolist()
+    assert maps.get(src_path, 10) is mapped
+    assert maps.get(src_path, 100) is None
+
+    os.utime(map_path, (0, 0))
+    os.utime(src_path, None)
+    assert maps.get(src_path, 10) is None
+
+def test_sidecar_too_large(tmpdir, monkeypatch):
+    """
+    Test that a sidecar above the limit or larger than the free space is
+    refused without writing anything
+    """
+    src_path = str(tmpdir.join('test.hdf5'))
+    with h5py.File(src_path, 'w') as src_file:
+        src_file.create_dataset('10', data=np.zeros((10, 10), dtype=np.int32))
+        assert sidecar.sidecar_bytes(src_file['10']) == 400
+
+        with pytest.raises(sidecar.SidecarTooLarge):
+            sidecar.export_sidecar(src_file, src_path, 10, max_bytes=399)
+
+        usage = sidecar.shutil.disk_usage(str(tmpdir))
+        monkeypatch.setattr(
+            sidecar.shutil, 'disk_usage', lambda path: usage._replace(free=100))
+        with pytest.raises(sidecar.SidecarTooLarge):
+            sidecar.export_sidecar(src_file, src_path, 10)
+
+    assert tmpdir.listdir() == [tmpdir.join('test.hdf5')]
@@ -0,0 +1,83 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+from __future__ import print_function
+
+import threading
+
+import pytest
+
+from rest.singleflight import SingleFlight
+
+def test_single_flight():
+    """
+    Test that concurrent calls with the same key share one computation
+    """
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    runs = []
+
+    def compute():
+        """
+        Block until every caller has joined
+        """
+        runs.append(1)
+        started.set()
+        release.wait(5)
+        return object()
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do('key', compute)))
+    leader.start()
+    started.wait(5)
+
+    followers = [
+        threading.Thread(target=lambda: results.append(flight.do('key', compute)))
+        for _ in range(3)
+    ]
+    for follower in followers:
+        follower.start()
+    while flight.stats()['shared'] < 3:
+        pass
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+
+    assert len(runs) == 1
+    assert len(results) == 4
+    assert all(result is results[0] for result in results)
+    assert flight.stats() == {'in_flight': 0, 'calls': 4, 'shared': 3}
+
+    flight.do('key', compute)
+    assert len(runs) == 2
+
+def test_single_flight_error():
+    """
+    Test that the exception is raised and the key is released
+    """
+    flight = SingleFlight()
+
+    def fail():
+        """
+        Computation that fails
+        """
+        raise KeyError('chr1')
+
+    with pytest.raises(KeyError):
+        flight.do('key', fail)
+    assert flight.do('key', lambda: 1) == 1
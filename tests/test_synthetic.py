@@ -0,0 +1,152 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+from __future__ import print_function
+
+import numpy as np
+import pytest
+
+from rest.chrom_index import ChromosomeIndex
+from rest.columnar import hdf5_dataset, read_range
+from rest.synthetic import SyntheticAdjacency, synthetic_block, synthetic_chromosomes
+from rest.synthetic import write_synthetic
+
+CHROMOSOMES = [('chr1', 2000000), ('chr2', 1000000)]
+
+def test_synthetic_chromosomes():
+    """
+    Test that the genome is split into chromosomes of decreasing length
+    """
+    chromosomes = synthetic_chromosomes(6000000, 3)
+    assert [c[0] for c in chromosomes] == ['chr1', 'chr2', 'chr3']
+    assert [c[1] for c in chromosomes] == [3000000, 2000000, 1000000]
+
+def test_synthetic_block():
+    """
+    Test that the matrix is symmetric and the same when written in blocks
+    """
+    index = ChromosomeIndex(CHROMOSOMES, 10000)
+    matrix = synthetic_block(index, 0, index.bin_count, 0.05)
+    assert matrix.shape == (index.bin_count, index.bin_count)
+    assert (matrix == matrix.T).all()
+    assert (matrix[10:20] == synthetic_block(index, 10, 20, 0.05)).all()
+
+    # Interactions are denser along the diagonal
+    assert np.count_nonzero(np.diag(matrix)) > np.count_nonzero(matrix[0, 100:])
+
+def test_write_synthetic(tmpdir):
+    """
+    Test that the file can be read with the reader interface
+    """
+    path = str(tmpdir.join('synthetic.hdf5'))
+    count = write_synthetic(path, CHROMOSOMES, [10000, 100000], density=0.05)
+    assert count > 0
+
+    reader = SyntheticAdjacency(path, 10000)
+    try:
+        details = reader.get_details()
+        assert details['resolutions'] == [10000, 100000]
+        assert details['chromosomes'] == [['chr1', 2000000], ['chr2', 1000000]]
+
+        results = reader.get_range('chr1', 0, 200000, 'chr2', 0, 500000)
+        assert results['log'] == []
+        for interaction in results['results']:
+            assert interaction['chrA'] == 'chr1'
+            assert interaction['chrB'] == 'chr2'
+            assert reader.get_value(
+                interaction['pos_x'], interaction['pos_y']) == interaction['value']
+    finally:
+        reader.close()
+
+def test_layout_matches_reader():
+    """
+    Test the bin layout of ChromosomeIndex, which the synthetic files are
+    written with, against reader.hdf5_adjacency and its test file
+    """
+    hdf5_adjacency = pytest.importorskip('reader.hdf5_adjacency')
+    if getattr(hdf5_adjacency, 'STAND_IN', False):
+        pytest.skip('reader.hdf5_adjacency is not installed')
+    reader = hdf5_adjacency.adjacency('test', '', 10000)
+    dset = hdf5_dataset(reader, 10000)
+    if dset is None:
+        pytest.skip('The reader does not expose the HDF5 file')
+
+    details = reader.get_details()
+    index = ChromosomeIndex(details['chromosomes'], 10000)
+    assert dset.shape == (index.bin_count, index.bin_count)
+
+    def interactions(results):
+        """
+        Interactions in a form that does not depend on the reader
+        """
+        return sorted(
+            (r['chrA'], int(r['startA']), r['chrB'], int(r['startB']), int(r['value']))
+            for r in results)
+
+    expected = reader.get_range('chr1', 100000, 200000, limit_chr='chr2')['results']
+    assert len(expected) > 0
+    values = read_range(dset, index, 'chr1', 100000, 200000, 'chr2')
+    assert interactions(values.records()) == interactions(expected)
+
+class PaddedAdjacency(SyntheticAdjacency):
+    """
+    Reader that lists a chromosome that its matrices do not have bins for
+    """
+
+    def get_details(self):
+        details = SyntheticAdjacency.get_details(self)
+        details['chromosomes'].append(['chrX', 10000])
+        return details
+
+    def get_range(self, chr_id, start, end, limit_chr=None, limit_start=None,
+                  limit_end=None, value_url='', no_links=False):
+        return {'results': [{
+            'chrA': 'chr1', 'startA': 0, 'chrB': 'chr1', 'startB': 10000,
+            'value': 7, 'pos_x': 0, 'pos_y': 1
+        }], 'log': []}
+
+def test_layout_mismatch(client, adjacency_app, synthetic_path, tmpdir):
+    """
+    Test that matrices that do not have the shape expected from the
+    chromosomes are not read directly and that the reader is used instead
+    """
+    h5py = pytest.importorskip('h5py')
+    with h5py.File(synthetic_path, 'r') as h5_file:
+        details = SyntheticAdjacency(synthetic_path, 10000).get_details()
+        index = ChromosomeIndex(details['chromosomes'], 10000)
+
+        class Handle(object):  # pylint: disable=too-few-public-methods
+            """
+            Reader exposing the HDF5 file
+            """
+            f = h5_file  # pylint: disable=invalid-name
+
+        assert hdf5_dataset(Handle(), 10000, index).shape == (index.bin_count, index.bin_count)
+        padded = ChromosomeIndex(details['chromosomes'] + [['chrX', 10000]], 10000)
+        assert hdf5_dataset(Handle(), 10000, padded) is None
+
+    padded_path = str(tmpdir.join('padded.hdf5'))
+    with open(synthetic_path, 'rb') as src, open(padded_path, 'wb') as dst:
+        dst.write(src.read())
+    adjacency_app.use_reader(
+        lambda user_id, file_id, resolution=None: PaddedAdjacency(padded_path, resolution),
+        lambda user_id, file_id: padded_path)
+
+    result = client.get(
+        '/mug/api/adjacency/getInteractions?file_id=padded&chr=chr1&start=0&end=50000&res=10000',
+        headers={'Authorization': 'Bearer teststring', 'Accept': 'application/json'}).get_json()
+    assert [(v['startB'], v['value']) for v in result['values']] == [(10000, 7)]
@@ -0,0 +1,79 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+from __future__ import print_function
+
+import os
+
+import pytest # pylint: disable=unused-import
+
+h5py = pytest.importorskip('h5py')
+
+from rest.pyramid import build_pyramid, pyramid_path  # pylint: disable=wrong-import-position
+
+# Chromosomes of the synthetic file served by the client fixture
+CHROMOSOMES = [('chr1', 1000000), ('chr2', 500000)]
+
+HEADERS = {'Authorization': 'Bearer teststring', 'Accept': 'application/json'}
+
+BASE = '/mug/api/adjacency/tile/synthetic/'
+
+def test_tile(client):
+    """
+    Test that a tile holds its part of the matrix, is private to the user and
+    can be revalidated
+    """
+    response = client.get(BASE + '10000/chr2/0/0', headers=HEADERS)
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'private, max-age=3600'
+    assert 'Authorization' in response.vary
+
+    tile = response.get_json()
+    assert tile['chr'] == 'chr2'
+    assert tile['matrix']['row_offset'] == 101
+
+    etag = response.headers['ETag']
+    response = client.get(
+        BASE + '10000/chr2/0/0', headers=dict(HEADERS, **{'If-None-Match': etag}))
+    assert response.status_code == 304
+    assert 'Authorization' in response.vary
+
+    response = client.get(BASE + '10000/chr2/9/9', headers=HEADERS)
+    assert response.get_json()['error'] == 'TileOutOfRange'
+    response = client.get(BASE + '12345/chr2/0/0', headers=HEADERS)
+    assert response.get_json()['status_code'] == 400
+
+def test_tile_pyramid(client, synthetic_path):
+    """
+    Test that tiles of the zoom levels change their ETag when the pyramid
+    sidecar is rebuilt
+    """
+    with h5py.File(synthetic_path, 'r') as src_file:
+        build_pyramid(src_file, pyramid_path(synthetic_path), CHROMOSOMES, 10000, 1)
+    try:
+        response = client.get(BASE + '20000/chr1/0/0', headers=HEADERS)
+        assert response.status_code == 200
+        assert response.get_json()['resolution'] == 20000
+        etag = response.headers['ETag']
+
+        os.utime(pyramid_path(synthetic_path), (0, 0))
+        response = client.get(
+            BASE + '20000/chr1/0/0', headers=dict(HEADERS, **{'If-None-Match': etag}))
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+    finally:
+        os.remove(pyramid_path(synthetic_path))